@@ -1,35 +1,66 @@
 import cv2
 import numpy as np
 import os
+import sys
+import ast
 import time
 import csv
 import threading
 import queue
 import glob
-from ultralytics import YOLO
 from math import tan, radians, cos, pi
-from scipy.spatial.transform import Rotation as R
-from util.extract_gps import get_lat_lon_alt, get_exif_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "duzenenmisSerbest"))
+from shape_detector.detector import SekilTespitEdici
+from gps.exif import get_lat_lon_alt, get_exif_data
 
 # ==== CONFIGURATION ====
 watch_folder = "./files/images"
 output_csv = "./files/detections/detections.csv"
 output_dir = "./files/output_tiles"
-model = YOLO("yolo12x.pt")
+
+# ==== MODEL ====
+# Smaller models (e.g. "yolo12s.pt", "yolo12n.pt") are several times faster on a CPU.
+# A model exported with `yolo export model=yolo12s.pt format=onnx dynamic=True` runs on ONNX Runtime.
+MODEL_PATH = "yolo12x.pt"
+INFERENCE_BACKEND = "auto"   # "ultralytics", "onnx", or "auto" (by the extension of MODEL_PATH)
+ONNX_INT8 = False            # Quantize the ONNX model's weights to 8 bit (saved next to it as *.int8.onnx)
+ONNX_THREADS = 0             # ONNX Runtime threads (0 = one per core)
+NMS_IOU_THRESHOLD = 0.45     # Per-tile NMS of the ONNX backend
 
 CONFIDENCE_THRESHOLD = 0.3
-ROWS, COLS = 8, 12
+ROWS, COLS = 8, 12       # Tile grid if the altitude is unknown (or ADAPTIVE_TILING is off)
+ADAPTIVE_TILING = True   # Choose the tile size from the ground sample distance
+MODEL_INPUT_SIZE = 640   # Side of the model input the tiles are resized to
+OBJECT_SIZE_M = 1.5      # Typical size of the searched objects on the ground, in meters
+OBJECT_PIXELS = 64       # Object size in model input pixels the model detects best
+MIN_TILE_SIZE = 320      # Smallest tile side, in image pixels
+TILE_OVERLAP = 0.2      # Tiles are enlarged by this share of their size, so objects on a border are whole in one tile
+BATCH_SIZE = 16         # Tiles passed to the model in one call
+MERGE_THRESHOLD = 0.5   # Boxes of one class covering more than this share of the smaller box are the same object
 HFOV_DEG = 78
 HOME_ALTITUDE = 72.0
 YAW_DEG = 0.0
 EARTH_RADIUS = 6378137
 
+# ==== CASCADE ====
+# Cheap first stage: the model only runs on tiles with target colors or enough edges
+CASCADE = False
+CASCADE_SCALE = 0.25         # The color and edge masks are computed on the image downscaled by this factor
+CASCADE_COLOR_SHARE = 0.001  # Min. share of red/blue pixels (see shape_detector) in a tile
+CASCADE_EDGE_SHARE = 0.04    # Min. share of edge pixels in a tile; None to gate on color only
+CANNY_LOW, CANNY_HIGH = 100, 200
 
-processed_files = set()
-image_queue = queue.Queue()
-capture_alt = 0.0
+# ==== WORKERS ====
+DECODE_WORKERS = 2      # Threads reading the images and their EXIF data
+INFERENCE_WORKERS = 1   # Threads running the model; with Ultralytics each loads its own copy of the model
+# With ONNX Runtime, set ONNX_THREADS to about (cores / INFERENCE_WORKERS)
 
-os.makedirs(output_dir, exist_ok=True)
+
+processed_files = set()
+image_queue = queue.Queue()                                    # ImageContext objects to decode
+inference_queue = queue.Queue(maxsize=2 * INFERENCE_WORKERS)   # Decoded images; bounded to limit memory
+write_queue = queue.Queue()                                    # Processed images, in any order
 
 CLASS_NAMES = {
     "person", "car", "motorcycle", "airplane", "bus", "boat",
@@ -37,9 +68,190 @@ CLASS_NAMES = {
     "bed", "tennis racket", "suitcase", "skis"
 }
 
+# ==== INFERENCE BACKENDS ====
+# predict(tiles) returns one (N, 6) array of x1, y1, x2, y2, conf, cls per tile, in tile pixels.
+
+class UltralyticsBackend:
+    # An Ultralytics model keeps per-call state, so it must not be used by two threads at once
+    thread_safe = False
+
+    def __init__(self, path):
+        from ultralytics import YOLO
+        self.model = YOLO(path)
+        self.names = self.model.names
+
+    def predict(self, tiles):
+        return [det.boxes.data.cpu().numpy() for det in self.model(tiles, verbose=False)]
+
+
+class OnnxBackend:
+    thread_safe = True
+
+    def __init__(self, path, int8=False):
+        import onnxruntime as ort
+        if int8:
+            path = quantize_int8(path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        # Models exported without dynamic=True take a fixed batch size
+        self.batch_size = batch if isinstance(batch, int) else None
+        self.input_size = (
+            width if isinstance(width, int) else MODEL_INPUT_SIZE,
+            height if isinstance(height, int) else MODEL_INPUT_SIZE
+        )
+        # Ultralytics stores the class names in the model's metadata
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        self.names = ast.literal_eval(names) if names else {}
+
+    def letterbox(self, tile):
+        # Resize keeping the aspect ratio and pad to the input size, as Ultralytics does
+        input_w, input_h = self.input_size
+        h, w = tile.shape[:2]
+        ratio = min(input_w / w, input_h / h)
+        new_w, new_h = round(w * ratio), round(h * ratio)
+        pad_x, pad_y = (input_w - new_w) // 2, (input_h - new_h) // 2
+        canvas = np.full((input_h, input_w, 3), 114, np.uint8)
+        canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(tile, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+        return blob, (ratio, pad_x, pad_y)
+
+    def postprocess(self, prediction, transform):
+        # YOLOv8-12 output: (4 + classes, anchors) with center x, center y, width, height and class scores
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        mask = conf >= CONFIDENCE_THRESHOLD
+        xywh, conf, cls = prediction[mask, :4], conf[mask], cls[mask]
+        if not len(conf):
+            return np.zeros((0, 6), np.float32)
+
+        ratio, pad_x, pad_y = transform
+        boxes = np.empty((len(conf), 4), np.float32)
+        boxes[:, 0] = (xywh[:, 0] - xywh[:, 2] / 2 - pad_x) / ratio
+        boxes[:, 1] = (xywh[:, 1] - xywh[:, 3] / 2 - pad_y) / ratio
+        boxes[:, 2] = (xywh[:, 0] + xywh[:, 2] / 2 - pad_x) / ratio
+        boxes[:, 3] = (xywh[:, 1] + xywh[:, 3] / 2 - pad_y) / ratio
+        rects = np.column_stack([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]])
+        keep = cv2.dnn.NMSBoxesBatched(
+            rects.tolist(), conf.tolist(), cls.tolist(), CONFIDENCE_THRESHOLD, NMS_IOU_THRESHOLD
+        )
+        keep = np.array(keep, dtype=int).reshape(-1)
+        return np.column_stack([boxes[keep], conf[keep], cls[keep]]).astype(np.float32)
+
+    def predict(self, tiles):
+        results = []
+        step = self.batch_size or len(tiles)
+        for start in range(0, len(tiles), step):
+            blobs, transforms = zip(*(self.letterbox(tile) for tile in tiles[start:start + step]))
+            count = len(blobs)
+            if self.batch_size and count < self.batch_size:
+                # A fixed batch size must be met exactly (e.g. the last batch); blank tiles fill it up
+                blobs += (np.zeros_like(blobs[0]),) * (self.batch_size - count)
+            output = self.session.run(None, {self.input_name: np.stack(blobs)})[0]
+            for prediction, transform in zip(output[:count], transforms):
+                results.append(self.postprocess(prediction, transform))
+        return results
+
+
+def quantize_int8(path):
+    quantized = os.path.splitext(path)[0] + ".int8.onnx"
+    if not os.path.exists(quantized):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"[INFO] Quantizing {path} to {quantized}...")
+        quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+    return quantized
+
+
+def load_backend():
+    backend_name = INFERENCE_BACKEND
+    if backend_name == "auto":
+        backend_name = "onnx" if MODEL_PATH.endswith(".onnx") else "ultralytics"
+    print(f"[INFO] Loading model {MODEL_PATH} ({backend_name})...")
+    start = time.time()
+    if backend_name == "onnx":
+        backend = OnnxBackend(MODEL_PATH, int8=ONNX_INT8)
+    elif backend_name == "ultralytics":
+        backend = UltralyticsBackend(MODEL_PATH)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend_name}")
+    # The first inference allocates and optimizes; do it before the first image arrives
+    backend.predict([np.zeros((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), np.uint8)])
+    print(f"[INFO] Model ready in {time.time() - start:.1f}s")
+    return backend
+
+
+_shared_backend = None
+_backend_lock = threading.Lock()
+_thread_backend = threading.local()
+
+def get_backend():
+    # The model is loaded on first use, not at import, and warmed up once.
+    # Thread-safe backends are shared by the inference workers, the others loaded per worker.
+    global _shared_backend
+    backend = getattr(_thread_backend, "backend", None)
+    if backend is None:
+        with _backend_lock:
+            backend = _shared_backend or load_backend()
+            if backend.thread_safe:
+                _shared_backend = backend
+        _thread_backend.backend = backend
+    return backend
+
 # ==== HELPER FUNCTIONS ====
 
-def pixel_to_gps(x, y, x_offset, y_offset, image_width, image_height, yaw_deg, pitch_deg, roll_deg):
+class ImageContext:
+    # Everything known about one image, so that several images can be processed at once
+    def __init__(self, seq, path):
+        self.seq = seq            # Order in which the image was found; results are written in this order
+        self.path = path
+        self.img = None
+        self.lat = None           # Drone position when the image was taken
+        self.lon = None
+        self.altitude = 0.0       # Above the home altitude
+        self.results = []
+        self.error = None
+
+
+color_detector = SekilTespitEdici()
+
+def region_sum(integral, x0, y0, x1, y1):
+    return integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+
+def select_tiles(img, tiles):
+    small = cv2.resize(img, None, fx=CASCADE_SCALE, fy=CASCADE_SCALE, interpolation=cv2.INTER_AREA)
+    h, w = small.shape[:2]
+    # Integral images give the number of mask pixels in any tile in constant time
+    color_sum = cv2.integral(color_detector.hedef_renk_maskesi(small) // 255)
+    if CASCADE_EDGE_SHARE is not None:
+        edges = cv2.Canny(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), CANNY_LOW, CANNY_HIGH)
+        edge_sum = cv2.integral(edges // 255)
+
+    selected = []
+    for tile in tiles:
+        _, _, x0, y0, x1, y1 = tile
+        sx0, sy0 = int(x0 * CASCADE_SCALE), int(y0 * CASCADE_SCALE)
+        sx1, sy1 = min(w, int(x1 * CASCADE_SCALE)), min(h, int(y1 * CASCADE_SCALE))
+        area = max(1, (sx1 - sx0) * (sy1 - sy0))
+        if region_sum(color_sum, sx0, sy0, sx1, sy1) / area >= CASCADE_COLOR_SHARE:
+            selected.append(tile)
+        elif CASCADE_EDGE_SHARE is not None and region_sum(edge_sum, sx0, sy0, sx1, sy1) / area >= CASCADE_EDGE_SHARE:
+            selected.append(tile)
+    return selected
+
+
+def pixel_to_gps(ctx, x, y, x_offset, y_offset, image_width, image_height, yaw_deg, pitch_deg, roll_deg):
+    # Imported on first use, like the model backends, so the module imports without scipy
+    from scipy.spatial.transform import Rotation as R
+
     # Combine offsets for full image position
     x_full = x + x_offset
     y_full = y + y_offset
@@ -70,119 +282,244 @@ def pixel_to_gps(x, y, x_offset, y_offset, image_width, image_height, yaw_deg, p
 
     # Project to ground plane
     if ray_world[2] == 0:
-        return start_lat, start_lon  # No valid intersection
+        return ctx.lat, ctx.lon  # No valid intersection
 
-    scale = -capture_alt / ray_world[2]  # Negate if Z points down
+    scale = -ctx.altitude / ray_world[2]  # Negate if Z points down
     ground_point = ray_world * scale
 
     offset_east = ground_point[0]
     offset_north = ground_point[1]
 
     dlat = offset_north / EARTH_RADIUS * (180 / pi)
-    dlon = offset_east / (EARTH_RADIUS * cos(pi * start_lat / 180)) * (180 / pi)
-
-    return start_lat + dlat, start_lon + dlon
-
-
-def process_image(path):
-    global start_lat, start_lon, capture_alt
-
-    print(f"\n[INFO] Reading image: {path}")
-    img = cv2.imread(path)
-    if img is None:
+    dlon = offset_east / (EARTH_RADIUS * cos(pi * ctx.lat / 180)) * (180 / pi)
+
+    return ctx.lat + dlat, ctx.lon + dlon
+
+
+def tile_grid(image_width, image_height, altitude):
+    # Rows and columns that show OBJECT_SIZE_M objects at OBJECT_PIXELS in the model input
+    if not ADAPTIVE_TILING or altitude <= 0:
+        return ROWS, COLS
+    gsd = 2 * altitude * tan(radians(HFOV_DEG) / 2) / image_width  # meters per pixel
+    tile_size = max(MIN_TILE_SIZE, OBJECT_SIZE_M / gsd * MODEL_INPUT_SIZE / OBJECT_PIXELS)
+    rows = max(1, round(image_height / tile_size))
+    cols = max(1, round(image_width / tile_size))
+    print(f"[INFO] GSD: {gsd * 100:.1f} cm/px, tile size: {tile_size:.0f} px, grid: {rows}x{cols}")
+    return rows, cols
+
+
+def make_tiles(image_width, image_height, rows, cols, overlap):
+    # Grid cells enlarged by the overlap on every side; the last row/column reaches the image edge
+    tile_w, tile_h = image_width // cols, image_height // rows
+    pad_x, pad_y = int(tile_w * overlap / 2), int(tile_h * overlap / 2)
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            x0 = max(0, col * tile_w - pad_x)
+            y0 = max(0, row * tile_h - pad_y)
+            x1 = image_width if col == cols - 1 else min(image_width, (col + 1) * tile_w + pad_x)
+            y1 = image_height if row == rows - 1 else min(image_height, (row + 1) * tile_h + pad_y)
+            tiles.append((row, col, x0, y0, x1, y1))
+    return tiles
+
+
+def merge_boxes(boxes, threshold):
+    # Cross-tile NMS on (x1, y1, x2, y2, conf, cls) rows in full-image coordinates.
+    # The overlap is measured against the smaller box, so the part of an object
+    # cut off at a tile edge is suppressed by the whole object from the next tile.
+    areas = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-6)
+    order = np.argsort(-boxes[:, 4], kind="stable")
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        inter_w = np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(boxes[best, 0], boxes[rest, 0])
+        inter_h = np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(boxes[best, 1], boxes[rest, 1])
+        inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+        overlap = inter / np.minimum(areas[best], areas[rest])
+        duplicate = (overlap > threshold) & (boxes[rest, 5] == boxes[best, 5])
+        order = rest[~duplicate]
+    return keep
+
+
+def load_image(ctx):
+    print(f"\n[INFO] Reading image: {ctx.path}")
+    ctx.img = cv2.imread(ctx.path)
+    if ctx.img is None:
         raise ValueError("Failed to load image.")
 
-    print("[INFO] Extracting GPS data...")
-    exif = get_exif_data(path)
-    start_lat, start_lon, alt = get_lat_lon_alt(exif)
-    print(f"[INFO] GPS Origin: ({start_lat:.6f}, {start_lon:.6f})")
-    capture_alt = alt - HOME_ALTITUDE  # Adjust altitude to home level
-    print(f"[INFO] Altitude: {capture_alt} m")
+    exif = get_exif_data(ctx.path)
+    ctx.lat, ctx.lon, alt = get_lat_lon_alt(exif)
+    if ctx.lat is None or ctx.lon is None or alt is None:
+        raise ValueError("No GPS data in the EXIF metadata.")
+    ctx.altitude = alt - HOME_ALTITUDE  # Adjust altitude to home level
+    print(f"[INFO] {os.path.basename(ctx.path)}: GPS Origin: ({ctx.lat:.6f}, {ctx.lon:.6f}), Altitude: {ctx.altitude} m")
 
-    h, w, _ = img.shape
-    tile_h, tile_w = h // ROWS, w // COLS
-    results = []
 
-    print("[INFO] Splitting image into tiles and detecting objects...")
-    for row in range(ROWS):
-        for col in range(COLS):
-            tile = img[row*tile_h:(row+1)*tile_h, col*tile_w:(col+1)*tile_w]
-            det = model(tile, verbose=False)[0]
-
-            for box in det.boxes.data.tolist():
+def process_image(ctx):
+    img = ctx.img
+    h, w, _ = img.shape
+    rows, cols = tile_grid(w, h, ctx.altitude)
+    tiles = make_tiles(w, h, rows, cols, TILE_OVERLAP)
+    if CASCADE:
+        total = len(tiles)
+        tiles = select_tiles(img, tiles)
+        print(f"[INFO] Cascade: {len(tiles)} of {total} tiles contain target colors or edges")
+    backend = get_backend()
+    boxes = []
+    box_tiles = []
+
+    print(f"[INFO] Splitting image into {len(tiles)} tiles and detecting objects...")
+    for start in range(0, len(tiles), BATCH_SIZE):
+        batch = tiles[start:start + BATCH_SIZE]
+        # One model call per batch instead of one per tile
+        dets = backend.predict([img[y0:y1, x0:x1] for _, _, x0, y0, x1, y1 in batch])
+
+        for (row, col, x0, y0, _, _), det in zip(batch, dets):
+            for box in det.tolist():
                 x1, y1, x2, y2, conf, cls = box
-                class_name = model.names[int(cls)]
 
-                #if conf < CONFIDENCE_THRESHOLD or class_name not in CLASS_NAMES:
+                #if conf < CONFIDENCE_THRESHOLD or backend.names[int(cls)] not in CLASS_NAMES:
                  #   continue
                 if conf < CONFIDENCE_THRESHOLD:
                     continue
-                
-                cx = int((x1 + x2) / 2)
-                cy = int((y1 + y2) / 2)
-                lat, lon = pixel_to_gps(cx, cy, col * tile_w, row * tile_h, w, h, YAW_DEG, 0, 0)
 
-                results.append([class_name, round(conf, 2), lat, lon, row, col])
+                # Tile to full image coordinates
+                boxes.append([x1 + x0, y1 + y0, x2 + x0, y2 + y0, conf, cls])
+                box_tiles.append((row, col))
 
-    print(f"[INFO] Detected {len(results)} objects.")
-    return results
+    results = []
+    if boxes:
+        boxes = np.array(boxes)
+        for i in merge_boxes(boxes, MERGE_THRESHOLD):
+            x1, y1, x2, y2, conf, cls = boxes[i]
+            class_name = backend.names[int(cls)]
+            row, col = box_tiles[i]
 
-# ==== WORKER THREAD ====
+            cx = int((x1 + x2) / 2)
+            cy = int((y1 + y2) / 2)
+            lat, lon = pixel_to_gps(ctx, cx, cy, 0, 0, w, h, YAW_DEG, 0, 0)
 
-def image_worker():
-    while True:
-        path = image_queue.get()
-        if path is None:
-            print("[INFO] Worker thread received stop signal.")
-            break
+            results.append([class_name, round(float(conf), 2), lat, lon, row, col])
 
-        try:
-            print(f"[INFO] Processing file from queue: {os.path.basename(path)}")
-            results = process_image(path)
+    print(f"[INFO] Detected {len(results)} objects in {os.path.basename(ctx.path)}.")
+    ctx.results = results
 
-            with open(output_csv, "a", newline="") as f:
-                writer = csv.writer(f)
-                for row in results:
-                    writer.writerow(row)
-                f.flush()
-            print(f"[SUCCESS] Results written to {output_csv} for {os.path.basename(path)}")
+# ==== WORKER THREADS ====
 
+def decode_worker():
+    while True:
+        ctx = image_queue.get()
+        if ctx is None:
+            break
+        try:
+            load_image(ctx)
         except Exception as e:
-            print(f"[ERROR] Failed to process {path}: {e}")
+            ctx.error = e
+        if ctx.error is None:
+            inference_queue.put(ctx)
+        else:
+            write_queue.put(ctx)
+
+
+def inference_worker():
+    try:
+        get_backend()
+    except Exception as e:
+        print(f"[ERROR] Failed to load model {MODEL_PATH}: {e}")
+    while True:
+        ctx = inference_queue.get()
+        if ctx is None:
+            break
+        try:
+            process_image(ctx)
+        except Exception as e:
+            ctx.error = e
+        ctx.img = None  # Not needed anymore; free it before the image waits for its turn to be written
+        write_queue.put(ctx)
 
-        image_queue.task_done()
 
-# ==== SETUP CSV HEADER ====
-if not os.path.exists(output_csv):
-    print(f"[INFO] Creating output CSV: {output_csv}")
-    with open(output_csv, "w", newline="") as f:
+def write_results(ctx):
+    if ctx.error is not None:
+        print(f"[ERROR] Failed to process {ctx.path}: {ctx.error}")
+        return
+    with open(output_csv, "a", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(
-            ["Class", "Confidence", "Latitude", "Longitude", "TileRow", "TileCol"]
-        )
-
-# ==== START WORKER THREAD ====
-t_image_worker = threading.Thread(target=image_worker, daemon=True)
-t_image_worker.start()
+        for row in ctx.results:
+            writer.writerow(row)
+        f.flush()
+    print(f"[SUCCESS] Results written to {output_csv} for {os.path.basename(ctx.path)}")
 
-print(f"[READY] Watching folder: {watch_folder}")
-print(f"[INFO] Absolute path: {os.path.abspath(watch_folder)}")
 
-# ==== MAIN MONITOR LOOP ====
-try:
+def result_writer():
+    # Images finish in any order; they are written in the order they were found
+    finished = {}
+    next_seq = 0
     while True:
-        all_images = sorted(glob.glob(os.path.join(watch_folder, "*.jpg")))
-        new_images = [f for f in all_images if f not in processed_files]
-
-        for img_path in new_images:
-            print(f"[NEW] Found new image: {img_path}")
-            processed_files.add(img_path)
-            image_queue.put(img_path)
-
-        time.sleep(1)
-
-except KeyboardInterrupt:
-    print("\n[INFO] Shutting down...")
-    image_queue.put(None)
-    t_image_worker.join()
-    print("[DONE] All images processed. Exiting.")
+        ctx = write_queue.get()
+        if ctx is None:
+            break
+        finished[ctx.seq] = ctx
+        while next_seq in finished:
+            write_results(finished.pop(next_seq))
+            next_seq += 1
+    print("[INFO] Writer thread received stop signal.")
+
+# ==== MAIN ====
+# Importing the module (e.g. in the tests) has no side effects; running it watches the folder
+
+def main():
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Setup CSV header
+    if not os.path.exists(output_csv):
+        print(f"[INFO] Creating output CSV: {output_csv}")
+        with open(output_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["Class", "Confidence", "Latitude", "Longitude", "TileRow", "TileCol"]
+            )
+
+    # Start worker threads
+    decode_threads = [threading.Thread(target=decode_worker, daemon=True) for _ in range(DECODE_WORKERS)]
+    inference_threads = [threading.Thread(target=inference_worker, daemon=True) for _ in range(INFERENCE_WORKERS)]
+    t_result_writer = threading.Thread(target=result_writer, daemon=True)
+    for t in decode_threads + inference_threads + [t_result_writer]:
+        t.start()
+
+    print(f"[READY] Watching folder: {watch_folder}")
+    print(f"[INFO] Absolute path: {os.path.abspath(watch_folder)}")
+
+    # Main monitor loop
+    next_seq = 0
+    try:
+        while True:
+            all_images = sorted(glob.glob(os.path.join(watch_folder, "*.jpg")))
+            new_images = [f for f in all_images if f not in processed_files]
+
+            for img_path in new_images:
+                print(f"[NEW] Found new image: {img_path}")
+                processed_files.add(img_path)
+                image_queue.put(ImageContext(next_seq, img_path))
+                next_seq += 1
+
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        print("\n[INFO] Shutting down...")
+        # Stop the stages one after another, so every queued image is still written
+        for _ in decode_threads:
+            image_queue.put(None)
+        for t in decode_threads:
+            t.join()
+        for _ in inference_threads:
+            inference_queue.put(None)
+        for t in inference_threads:
+            t.join()
+        write_queue.put(None)
+        t_result_writer.join()
+        print("[DONE] All images processed. Exiting.")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,83 @@ CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(CONFIG_DIR)
 
 WATCH_FOLDER = os.path.join(BASE_DIR, "files", "images")
+# All folders watched in folder mode; subfolders (e.g. per-flight DCIM/100XXXXX) are included
+WATCH_FOLDERS = [WATCH_FOLDER]
+WATCH_RECURSIVE = True
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')  # Compared case-insensitively
+SETTLE_SECONDS = 2.0       # Files modified more recently may still be being written
+SCAN_KNOWN_NAMES = 10000   # Max. file names the scanner remembers per directory (the newest ones)
+SCAN_FORGET_SECONDS = 600.0  # Names of directories unchanged for this long are forgotten
 OUTPUT_CSV = os.path.join(BASE_DIR, "files", "detections", "detections.csv")
+# Additional outputs, selected with --outputs in main.py
+OUTPUT_SQLITE = os.path.join(BASE_DIR, "files", "detections", "detections.sqlite3")
+OUTPUT_PARQUET_DIR = os.path.join(BASE_DIR, "files", "detections", "parquet")
+OUTPUT_NDJSON = os.path.join(BASE_DIR, "files", "detections", "detections.ndjson")
+# SQLite journal of completed images, used to resume folder mode after a restart
+JOURNAL_DB = os.path.join(BASE_DIR, "files", "detections", "processed_files.sqlite3")
 
 
+# ==== FOLDER MODE PIPELINE PARAMETERS ====
+JOB_QUEUE_SIZE = 64        # Max. images waiting to be read; a full queue throttles the watcher
+STAGE_QUEUE_SIZE = 8       # Max. items waiting between two pipeline stages
+PIPELINE_IO_THREADS = 2    # Threads reading image files and EXIF data from disk
+
+# Job scheduling under backlog (see file_watcher/scheduler.py)
+SCHEDULING_POLICY = 'fifo' # 'fifo', 'newest' or 'newest_backfill'
+MAX_BACKLOG_AGE = None     # Seconds an image may wait in the queue; None for no limit
+STALE_ACTION = 'defer'     # What to do with older images: 'defer' or 'drop'
+BACKFILL_EVERY = 4         # With 'newest_backfill', every N-th job is the oldest one
+
+# ==== RESULT WRITER PARAMETERS ====
+WRITER_QUEUE_SIZE = 1024   # Max. submissions waiting for the writer thread
+WRITER_BATCH_ROWS = 256    # Commit when this many detections are buffered...
+WRITER_MAX_DELAY = 1.0     # ...or when the oldest one has waited this many seconds
+FSYNC_POLICY = 'commit'    # 'commit', 'interval' or 'never'
+FSYNC_INTERVAL = 5.0       # Seconds between syncs with the 'interval' policy
+PARQUET_PART_ROWS = 50000  # A Parquet part file is closed (and readable) at this many rows...
+PARQUET_PART_SECONDS = 60.0  # ...or at the first commit this many seconds after it was started
+
+# ==== INGEST SERVICE PARAMETERS ====
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_MAX_PENDING = 32                      # Requests waiting for a worker before 503 is returned
+SERVICE_MAX_REQUEST_BYTES = 64 * 1024 * 1024  # Largest accepted image
+SERVICE_READ_TIMEOUT = 30.0                   # Seconds to wait for a client to send its request
+
+# ==== LIVE VIDEO PARAMETERS ====
+LIVE_TARGET_FPS = 10.0       # Frames per second the detection should process
+LIVE_TARGET_LATENCY = None   # Max. processing seconds per frame (default: 1 / LIVE_TARGET_FPS)
+LIVE_MIN_SCALE = 0.25        # Smallest processing scale the governor may choose
+LIVE_MAX_SCALE = 1.0         # Largest processing scale (1.0 = full resolution)
+LIVE_MAX_STRIDE = 8          # Process at most every Nth frame
+LIVE_REUSE_BUFFERS = False   # Reuse preallocated frame and mask arrays instead of allocating them per frame
+LIVE_DETECT_PROCESSES = 0    # Detect in this many processes reading frames from shared memory (0 = in threads)
+LIVE_PROCESS_QUEUE = 2       # Frames in work per detection process, so a process never waits for the next one
+PREVIEW_MAX_FPS = 10.0       # Max. frames per second drawn by the MJPEG preview and the recording
+PREVIEW_JPEG_QUALITY = 70    # JPEG quality of the MJPEG preview
+
+# ==== FRAME RECORDING PARAMETERS ====
+RECORD_ENCODING = 'jpg'      # 'raw', 'png' (lossless) or 'jpg'
+RECORD_JPEG_QUALITY = 90     # JPEG quality of recorded frames
+RECORD_QUEUE_FRAMES = 60     # Frames waiting to be written before new ones are skipped
+
+# ==== OFFLINE VIDEO PARAMETERS ====
+OFFLINE_CHUNK_SECONDS = 30.0  # Length of the video chunks processed in parallel
+OFFLINE_SAMPLE_FPS = None     # Frames per second of video to process (None = every frame)
+
+# ==== TARGET AGGREGATION PARAMETERS (VIDEO MODES) ====
+TARGET_GATE_METERS = 5.0        # Max. distance of a sighting from a target to be merged into it
+TARGET_MIN_SIGHTINGS = 5        # Sightings needed before a target is written
+TARGET_REFINE_METERS = 1.0      # A target is written again when its position moves this much
+TARGET_CANDIDATE_SECONDS = 3.0  # Unconfirmed targets not seen for this long are dropped
+TARGET_FORGET_SECONDS = 600.0   # Confirmed targets not seen for this long are forgotten
+
+# ==== METRICS PARAMETERS ====
+METRICS_HOST = "0.0.0.0"
+METRICS_PORT = None          # e.g. 9100 to serve http://<host>:9100/metrics
+METRICS_FILE = None          # e.g. "files/metrics.prom" to rewrite the metrics into a file
+METRICS_FILE_INTERVAL = 5.0  # Seconds between rewrites of the metrics file
+
 # ==== CAMERA AND GPS PARAMETERS ====
 HFOV_DEGREES = 78.0      # Horizontal Field of View
 HOME_ALTITUDE = 72.0     # Altitude of the drone's home point in meters
@@ -47,6 +121,13 @@ HEXAGON_EPSILON_FACTOR = 0.03
 # Kernel size for morphological operations
 MORPHOLOGICAL_KERNEL = np.ones((5, 5), np.uint8)
 
+# ==== YUV DETECTION PARAMETERS ====
+# Frames delivered as I420/NV12 are classified with a lookup table derived
+# from the HSV ranges above, indexed by (luma level, U, V)
+YUV_LUMA_LEVELS = 32
+# Kernel for the morphological operations on the quarter-resolution chroma masks
+YUV_MORPHOLOGICAL_KERNEL = np.ones((3, 3), np.uint8)
+
 # ==== SHAPE VALIDATION PARAMETERS ====
 # Minimum solidity (ratio of contour area to its convex hull area)
 MIN_SOLIDITY = 0.90
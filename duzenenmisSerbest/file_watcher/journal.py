@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent, crash-safe journal of processed image files.
+
+Completed files are recorded on disk (SQLite) by path, size and modification
+time, so a restart does not queue the whole folder again. Lookups go straight
+to the database, which keeps memory usage bounded no matter how many files
+have been processed.
+
+Writing results follows a small write-ahead protocol:
+1. begin():    the files and the current output positions (e.g. the CSV size)
+               are recorded as 'pending'.
+2. The result rows are written and flushed to the output file.
+3. complete(): the pending entries are moved to 'processed' in one transaction.
+
+If the program dies between 1 and 3, recover() hands the saved positions back
+at the next start so the partially written rows can be cut off, and the files
+are processed again. This way a file is either fully in the output and marked
+as processed, or neither.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+def file_signature(path):
+    """
+    Builds the journal entry of a file from its current state on disk.
+    Args:
+        path (str): The path to the file.
+    Returns:
+        dict: {'path', 'size', 'mtime_ns'}, or None if the file cannot be read.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+class ProcessedFileJournal:
+    """
+    Append-only on-disk record of completed files. Safe to share between threads.
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly where needed
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("PRAGMA cache_size=-2048")  # At most ~2 MB of page cache
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "positions TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def is_processed(self, entry):
+        """
+        Checks whether a file with exactly this path, size and mtime was completed.
+        A file that was rewritten since then counts as new.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns FROM processed WHERE path = ?", (entry['path'],)
+            ).fetchone()
+        return row is not None and row[0] == entry['size'] and row[1] == entry['mtime_ns']
+
+    def begin(self, entries, positions):
+        """
+        Records that results for the given files are about to be written.
+        Args:
+            entries (list): Journal entries as returned by file_signature().
+            positions (dict): Output positions before the write, e.g. {'csv': 1024}.
+        """
+        encoded_positions = json.dumps(positions)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pending (path, size, mtime_ns, positions) VALUES (?, ?, ?, ?)",
+                    [(e['path'], e['size'], e['mtime_ns'], encoded_positions) for e in entries]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def complete(self, entries):
+        """
+        Atomically marks the given files as processed and clears their pending state.
+        Must be called only after their result rows are flushed to the output.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "DELETE FROM pending WHERE path = ?", [(e['path'],) for e in entries]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO processed (path, size, mtime_ns) VALUES (?, ?, ?)",
+                    [(e['path'], e['size'], e['mtime_ns']) for e in entries]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def abort(self, entries):
+        """
+        Clears the pending state of files whose write failed and was rolled back;
+        they are not marked as processed.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "DELETE FROM pending WHERE path = ?", [(e['path'],) for e in entries]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def recover(self, rollback):
+        """
+        Rolls back writes interrupted by a crash. Must be called once at startup,
+        before any worker is started.
+        Args:
+            rollback (callable): Called once with the earliest saved positions
+                                 (dict) so the caller can truncate its outputs.
+        Returns:
+            int: The number of files whose results were rolled back.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT positions FROM pending").fetchall()
+            if not rows:
+                return 0
+
+            # Keep the smallest position of every output across all pending entries
+            earliest = {}
+            for (encoded_positions,) in rows:
+                for name, position in json.loads(encoded_positions).items():
+                    earliest[name] = min(position, earliest.get(name, position))
+
+            rollback(earliest)
+            self._conn.execute("DELETE FROM pending")
+        return len(rows)
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
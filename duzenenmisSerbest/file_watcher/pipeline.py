@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+"""
+Staged processing pipeline of folder mode.
+
+    job_queue -> read (I/O threads) -> detect (process pool) -> georef -> write
+
+Every stage has its own concurrency and the stages are connected by bounded
+queues, so disk I/O overlaps with computation and the memory usage stays
+capped even when thousands of images arrive at once. When a later stage falls
+behind, the earlier ones block on their full output queue; in the end the
+watcher blocks on the full job queue, which throttles scanning.
+
+- read:   Reads the file contents and the EXIF GPS data (I/O bound, threads).
+- detect: Decodes the image and detects the shapes (CPU bound, processes).
+- georef: Converts the pixel positions to GPS coordinates (single thread).
+- write:  Hands the records to the DetectionWriter, which appends them to the
+          outputs and updates the journal in group commits.
+
+Only images that were processed, or that have no usable GPS data, are
+recorded as completed in the journal. An image whose reading or detection
+failed (e.g. a worker process was killed) is released without a journal
+entry, so it is processed again at the next start. A process pool broken by
+a dying worker is replaced by a new one.
+
+Throughput, the discovery-to-output latency of every image and the busy time
+of the detection processes are recorded in the metrics registry.
+"""
+
+import os
+import sys
+import time
+import queue
+import heapq
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import HOME_ALTITUDE, STAGE_QUEUE_SIZE, PIPELINE_IO_THREADS
+from gps.exif import get_exif_data, get_lat_lon_alt
+from gps.calculator import pixel_to_gps
+from file_watcher.watcher import job_queue, queued_files
+from file_watcher.pool import init_pool_worker, detect_encoded_image, run_timed
+from metrics.registry import registry, rate_gauge, latency_quantile_gauges
+
+# Set by stop_pipeline(); jobs still waiting in job_queue are left for the next run
+stop_event = threading.Event()
+
+images_done = registry.counter('detector_images_total', "Images processed and committed in folder mode.")
+images_failed = registry.counter('detector_images_failed_total', "Images whose processing failed; retried at the next start.")
+detections_found = registry.counter('detector_detections_total', "Shapes detected.", {'mode': 'folder'})
+image_latency = registry.histogram(
+    'detector_latency_seconds', "Time from discovery (folder) or capture (video) until the results are committed.",
+    {'mode': 'folder'}
+)
+detect_busy = registry.counter('detector_worker_busy_seconds_total', "Time the detection workers spent working.", {'stage': 'detect'})
+rate_gauge(images_done, 'detector_images_per_second', "Images committed per second (last 10 s).")
+rate_gauge(detections_found, 'detector_detections_per_second', "Shapes detected per second (last 10 s).")
+latency_quantile_gauges(image_latency, 'detector_latency_quantile_seconds', "Latency percentiles of the last minute.")
+
+def stop_pipeline():
+    """
+    Asks the pipeline to stop. Images that are already being processed are
+    finished and written; the others are not marked as processed in the
+    journal, so they are picked up again at the next start.
+    """
+    stop_event.set()
+
+def _read_telemetry(image_path, data):
+    """
+    Extracts the drone position from the EXIF data of an image.
+    Returns:
+        tuple: (latitude, longitude, flight_altitude), or None if missing.
+    """
+    exif_data = get_exif_data(data)
+    if not exif_data:
+        print(f"[WARNING] Could not read EXIF data or format not supported: {os.path.basename(image_path)}")
+        return None
+
+    drone_lat, drone_lon, drone_alt = get_lat_lon_alt(exif_data)
+    if drone_lat is None or drone_lon is None or drone_alt is None:
+        print(f"[WARNING] GPS data is missing or could not be read: {os.path.basename(image_path)}")
+        return None
+
+    # Calculate altitude above ground level
+    flight_altitude = drone_alt - HOME_ALTITUDE
+    print(f"  -> {os.path.basename(image_path)} GPS: ({drone_lat:.6f}, {drone_lon:.6f}), Altitude: {flight_altitude:.2f}m")
+    return drone_lat, drone_lon, flight_altitude
+
+def _read_stage(next_job, read_queue, write_queue):
+    """
+    Stage 1 (I/O thread): reads the file and its EXIF GPS data.
+    Images without usable GPS data skip detection and go straight to the writer,
+    which records them as processed. Images that could not be read go to the
+    writer as failed (records None).
+    """
+    while True:
+        item = next_job()
+        if item is None:
+            break
+
+        seq, job = item
+        image_path = job['path']
+        print(f"\n[PROCESSING] File: {os.path.basename(image_path)}")
+
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+            telemetry = _read_telemetry(image_path, data)
+        except Exception as e:
+            print(f"[ERROR] Could not read {os.path.basename(image_path)}: {e}")
+            write_queue.put((seq, job, None))
+            continue
+
+        if telemetry is None:
+            write_queue.put((seq, job, []))
+        else:
+            read_queue.put((seq, job, data, telemetry))
+
+def _start_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_pool_worker)
+
+def _detect_stage(executor, workers, read_queue, georef_queue, write_queue, in_flight):
+    """
+    Stage 2 (dispatcher thread): hands the images to the process pool.
+    The semaphore limits the number of images being decoded or detected at once.
+    If a worker process dies, the pool is broken: the images in work fail (see
+    _georef_stage) and the pool is replaced before the next image is sent.
+    Shuts the last pool down when the stage ends.
+    """
+    try:
+        while True:
+            item = read_queue.get()
+            if item is None:
+                break
+
+            seq, job, data, telemetry = item
+            in_flight.acquire()
+            try:
+                try:
+                    future = executor.submit(run_timed, detect_encoded_image, data)
+                except BrokenProcessPool:
+                    print("[ERROR] A detection process died; starting a new process pool.")
+                    executor.shutdown(wait=False)
+                    executor = _start_pool(workers)
+                    future = executor.submit(run_timed, detect_encoded_image, data)
+            except Exception as e:
+                print(f"[CRITICAL ERROR] Could not send {job['name']} to the detection processes: {e}")
+                in_flight.release()
+                write_queue.put((seq, job, None))
+                continue
+
+            future.add_done_callback(
+                lambda done, seq=seq, job=job, telemetry=telemetry: georef_queue.put((seq, job, telemetry, done))
+            )
+    finally:
+        # Waits for the running detections and their callbacks
+        executor.shutdown()
+
+def _georeference(job, detections, image_width, image_height, telemetry):
+    """
+    Builds the detection records of an image from its detections and its drone position.
+    """
+    drone_lat, drone_lon, flight_altitude = telemetry
+    timestamp = time.time()
+    filename = job['name']
+    records = []
+    for detection in detections:
+        center_x, center_y = detection['merkez']
+
+        # Calculate GPS coordinate for the center pixel of the detected shape
+        latitude, longitude = pixel_to_gps(
+            center_x, center_y, image_width, image_height,
+            drone_lat, drone_lon, flight_altitude
+        )
+
+        print(f"    -> {filename}: {detection['renk'].upper()} {detection['sekil'].upper()} @ ({center_x},{center_y}) -> GPS: ({latitude:.7f}, {longitude:.7f})")
+
+        records.append((timestamp, filename, detection['sekil'], detection['renk'], latitude, longitude))
+    return records
+
+def _georef_stage(georef_queue, write_queue, in_flight):
+    """
+    Stage 3 (single thread): collects the detection results and calculates
+    the GPS coordinates of the detected shapes. Images whose detection failed
+    go to the writer as failed (records None).
+    """
+    while True:
+        item = georef_queue.get()
+        if item is None:
+            break
+
+        seq, job, telemetry, future = item
+        image_path = job['path']
+        records = None
+        try:
+            (detections, image_width, image_height), busy_seconds = future.result()
+            detect_busy.inc(busy_seconds)
+            if detections is None:
+                print(f"[ERROR] Could not load image: {image_path}")
+            elif not detections:
+                print(f"  -> {os.path.basename(image_path)}: No shapes were detected.")
+                records = []
+            else:
+                print(f"  -> {os.path.basename(image_path)}: Detections: {len(detections)} shapes")
+                records = _georeference(job, detections, image_width, image_height, telemetry)
+        except Exception as e:
+            print(f"[CRITICAL ERROR] An unexpected error occurred while processing {os.path.basename(image_path)}: {e}")
+        finally:
+            in_flight.release()
+
+        write_queue.put((seq, job, records))
+
+def _write_one(writer, job, records):
+    """
+    Submits the records of one image; its job is released once they are committed.
+    Files without results are recorded too, so they are not retried on restart.
+    Failed files (records None) are released without being recorded.
+    """
+    if records is None:
+        print(f"[ERROR] {job['name']} failed; it will be processed again at the next start.")
+        queued_files.discard(job['path'])
+        job_queue.task_done()
+        images_failed.inc()
+        return
+
+    def release_job():
+        queued_files.discard(job['path'])
+        job_queue.task_done()
+        images_done.inc()
+        detections_found.inc(len(records))
+        if 'discovered_at' in job:
+            image_latency.observe(time.time() - job['discovered_at'])
+
+    writer.submit(records, [job], release_job)
+
+def _write_stage(writer, write_queue, ordered):
+    """
+    Stage 4 (single thread): passes the results on to the DetectionWriter.
+    In ordered mode, results are held back until all images queued before
+    them are submitted.
+    """
+    waiting = []  # Heap of (seq, job, records) that arrived ahead of their turn
+    next_seq = 0
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+
+        if not ordered:
+            _write_one(writer, item[1], item[2])
+            continue
+
+        heapq.heappush(waiting, item)
+        while waiting and waiting[0][0] == next_seq:
+            _, job, records = heapq.heappop(waiting)
+            _write_one(writer, job, records)
+            next_seq += 1
+
+def image_processing_worker(writer, workers=1, io_threads=PIPELINE_IO_THREADS, ordered=False):
+    """
+    Runs the folder mode pipeline until stop_pipeline() is called.
+    Designed to run in a daemon thread.
+    Args:
+        writer (DetectionWriter): Writer of the results; completed files are
+                                  recorded in its journal.
+        workers (int): Number of decode/detect worker processes.
+        io_threads (int): Number of file reading threads.
+        ordered (bool): If True, results are written in the order the images
+                        were queued; otherwise as soon as each one is ready.
+    """
+    read_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    georef_queue = queue.Queue()  # Bounded by the in_flight semaphore
+    write_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    registry.gauge(
+        'detector_worker_utilization', "Share of time the detection workers were busy (last 10 s, 0..1).",
+        {'stage': 'detect'}, lambda: detect_busy.rate() / workers
+    )
+
+    # Jobs are numbered when they leave the job queue, so the writer can restore the order
+    job_lock = threading.Lock()
+    job_numbers = itertools.count()
+
+    def next_job():
+        with job_lock:
+            while not stop_event.is_set():
+                try:
+                    job = job_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                return next(job_numbers), job
+        return None
+
+    readers = [
+        threading.Thread(target=_read_stage, args=(next_job, read_queue, write_queue), daemon=True)
+        for _ in range(io_threads)
+    ]
+    georef_thread = threading.Thread(target=_georef_stage, args=(georef_queue, write_queue, in_flight), daemon=True)
+    writer_thread = threading.Thread(target=_write_stage, args=(writer, write_queue, ordered), daemon=True)
+
+    executor = _start_pool(workers)
+    print(f"[INFO] Pipeline started: {io_threads} reader threads, {workers} detection processes.")
+    for thread in readers + [georef_thread, writer_thread]:
+        thread.start()
+
+    dispatcher = threading.Thread(
+        target=_detect_stage, args=(executor, workers, read_queue, georef_queue, write_queue, in_flight),
+        daemon=True
+    )
+    dispatcher.start()
+
+    # Shut the stages down front to back, each after its input is drained.
+    # The dispatcher ends after the running detections and their callbacks.
+    for thread in readers:
+        thread.join()
+    read_queue.put(None)
+    dispatcher.join()
+    georef_queue.put(None)
+    georef_thread.join()
+    write_queue.put(None)
+    writer_thread.join()
+    print("[INFO] Pipeline stopped.")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Process-side functions of the folder mode pipeline.
+
+Image decoding and shape detection run in a pool of worker processes, each
+with its own SekilTespitEdici instance, so they are not limited to a single
+core by the GIL. The workers receive the encoded file contents, which are
+much smaller to send between processes than decoded images.
+"""
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shape_detector.detector import SekilTespitEdici
+
+# Detector of the current worker process, created once by init_pool_worker()
+_shape_detector = None
+
+def init_pool_worker(reuse_buffers=False, single_threaded=False):
+    """
+    Initializer of each worker process: creates the process' own detector.
+    Used by all process pools (folder mode, ingest service, offline and live video).
+    Args:
+        reuse_buffers (bool): Reuse the detector's intermediate images; for
+                              processes that detect frames one after another.
+        single_threaded (bool): Turn off OpenCV's own threads, for pools whose
+                                processes already keep every core busy.
+    """
+    global _shape_detector
+    if single_threaded:
+        cv2.setNumThreads(1)
+    _shape_detector = SekilTespitEdici(reuse_buffers=reuse_buffers)
+
+def worker_detector():
+    """Returns the detector of the current worker process (see init_pool_worker)."""
+    return _shape_detector
+
+def detect_encoded_image(data):
+    """
+    Decodes an image file's contents and detects red triangles and blue hexagons.
+    Runs inside a worker process.
+    Args:
+        data (bytes): The encoded image (e.g. JPEG file contents).
+    Returns:
+        tuple: (detections, image_width, image_height); detections is None
+               if the image could not be decoded.
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None, 0, 0
+
+    image_height, image_width, _ = image.shape
+    red_triangles = _shape_detector.kirmizi_ucgenleri_bul(image)
+    blue_hexagons = _shape_detector.mavi_altigenleri_bul(image)
+    return red_triangles + blue_hexagons, image_width, image_height
+
+def run_timed(function, *args):
+    """
+    Calls a function in the worker process and measures how long it ran,
+    for the worker utilization metric.
+    Returns:
+        tuple: (result, busy_seconds)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental directory scanner for folder mode.
+
+Cameras write into DCIM/100XXXXX style subfolders holding tens of thousands
+of files, so listing everything on every scan gets slower with every flight.
+DirectoryScanner watches several root folders (recursively, if wanted) with
+os.scandir and remembers, per directory, the names it already reported:
+
+- A directory whose modification time has not changed since the last scan
+  has no new or removed files, so its file list is not read at all; only
+  its known subdirectories are visited.
+- In a changed directory, the names are listed (without stat() calls, as
+  os.scandir gets the entry types from the directory itself), and only the
+  names not reported before are stat()ed and reported. Names that are gone
+  are forgotten, so a file created again under the same name is new.
+- Files modified less than SETTLE_SECONDS ago may still be being written.
+  They are not reported (or remembered) yet, and their directory is scanned
+  again next time.
+
+The number of stat() calls of a scan therefore depends on the number of
+directories and of new files, not on the number of files already processed.
+A file rewritten in place under a known name is not reported again.
+
+The remembered names are bounded, so the memory does not grow with every
+file ever seen:
+
+- A directory keeps at most SCAN_KNOWN_NAMES names, the ones with the newest
+  modification times.
+- A directory unchanged for SCAN_FORGET_SECONDS forgets all its names.
+
+Instead of the forgotten names, a directory keeps a floor: a modification
+time newer than all of them. Unknown files older than the floor are taken as
+reported. They cost a stat() when the directory changes and are remembered
+again as far as the limit allows, so only directories with more files than
+the limit keep paying for them. A file that appears with a time older than
+the floor (e.g. copied with its original time) is missed.
+"""
+
+import os
+import sys
+import time
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import IMAGE_EXTENSIONS, SETTLE_SECONDS, SCAN_KNOWN_NAMES, SCAN_FORGET_SECONDS
+
+class DirectoryScanner:
+    """
+    Finds new image files below one or more root folders.
+    """
+
+    def __init__(self, roots, recursive=True, extensions=IMAGE_EXTENSIONS, settle_seconds=SETTLE_SECONDS,
+                 known_limit=SCAN_KNOWN_NAMES, forget_seconds=SCAN_FORGET_SECONDS):
+        """
+        Args:
+            roots (list): The folders to watch.
+            recursive (bool): Whether to scan subfolders too.
+            extensions (tuple): Lowercase file extensions to report, e.g. ('.jpg',).
+            settle_seconds (float): Min. age of a file's mtime before it is reported.
+            known_limit (int): Max. names remembered per directory.
+            forget_seconds (float): Directories unchanged for this long forget their names.
+        """
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.recursive = recursive
+        self.extensions = tuple(extensions)
+        self.settle_ns = int(settle_seconds * 1e9)
+        self.known_limit = known_limit
+        self.forget_ns = int(forget_seconds * 1e9)
+        # Directory path -> {'mtime_ns', 'known' (name -> mtime_ns), 'floor_ns', 'changed_ns', 'dirty', 'subdirs'}
+        self._directories = {}
+
+    def scan(self):
+        """
+        Scans all roots once.
+        Returns:
+            list: Journal entries (see file_signature) of the files found since
+                  the last scan, with an extra 'name' key holding the path relative
+                  to its root.
+        """
+        now_ns = time.time_ns()
+        found = []
+        for root in self.roots:
+            pending = [root]
+            while pending:
+                directory = pending.pop()
+                subdirs = self._scan_directory(root, directory, now_ns, found)
+                if self.recursive:
+                    pending.extend(subdirs)
+        return found
+
+    def _scan_directory(self, root, directory, now_ns, found):
+        """
+        Scans one directory, appending its new files to 'found'.
+        Returns:
+            list: The subdirectories to visit.
+        """
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            # Removed or not accessible (anymore); forget it and everything below it
+            self._forget(directory)
+            return []
+
+        state = self._directories.get(directory)
+        # A directory modified just now may change again within the same mtime tick
+        recently_modified = now_ns - mtime_ns < self.settle_ns
+        if state is not None and state['mtime_ns'] == mtime_ns and not state['dirty'] and not recently_modified:
+            if state['known'] and now_ns - state['changed_ns'] >= self.forget_ns:
+                self._forget_names(state, len(state['known']))
+            return state['subdirs']
+
+        known = state['known'] if state is not None else {}
+        floor_ns = state['floor_ns'] if state is not None else None
+        present = set()
+        unsettled = False
+        subdirs = []
+        new_files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    name = entry.name
+                    if not name.lower().endswith(self.extensions):
+                        continue
+                    present.add(name)
+                    if name in known:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if now_ns - stat.st_mtime_ns < self.settle_ns:
+                        # Probably still being written; look at it again next scan
+                        unsettled = True
+                        continue
+                    known[name] = stat.st_mtime_ns
+                    if floor_ns is not None and stat.st_mtime_ns < floor_ns:
+                        # Older than a forgotten name, so reported before
+                        continue
+                    new_files.append({
+                        'path': entry.path,
+                        'name': os.path.relpath(entry.path, root),
+                        'size': stat.st_size,
+                        'mtime_ns': stat.st_mtime_ns,
+                    })
+        except OSError:
+            self._forget(directory)
+            return []
+
+        # Files removed since the last scan
+        for name in [name for name in known if name not in present]:
+            del known[name]
+
+        new_files.sort(key=lambda f: f['path'])
+        found.extend(new_files)
+        state = {
+            'mtime_ns': mtime_ns,
+            'known': known,
+            'floor_ns': floor_ns,
+            'changed_ns': now_ns,
+            'dirty': unsettled,
+            'subdirs': subdirs,
+        }
+        if len(known) > self.known_limit:
+            self._forget_names(state, len(known) - self.known_limit)
+        self._directories[directory] = state
+        return subdirs
+
+    def _forget_names(self, state, count):
+        """
+        Forgets about the 'count' oldest names of a directory. All forgotten
+        names are older than the new floor; names as old as the oldest
+        remaining one are kept, so there may be a few more left.
+        """
+        known = state['known']
+        mtimes = sorted(known.values())
+        floor_ns = mtimes[count] if count < len(mtimes) else mtimes[-1] + 1
+        for name in [name for name, mtime_ns in known.items() if mtime_ns < floor_ns]:
+            del known[name]
+        if state['floor_ns'] is None or floor_ns > state['floor_ns']:
+            state['floor_ns'] = floor_ns
+
+    def _forget(self, directory):
+        state = self._directories.pop(directory, None)
+        if state is not None:
+            for subdir in state['subdirs']:
+                self._forget(subdir)
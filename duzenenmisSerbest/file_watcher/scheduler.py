@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+Job queue with selectable scheduling policies for folder mode.
+
+When the pipeline falls behind during a live mission, a plain FIFO queue
+hands out the oldest images first and the operators only see stale results.
+SchedulingQueue is a drop-in replacement for queue.Queue that supports:
+
+- 'fifo':            Oldest image first (the original behaviour).
+- 'newest':          Most recently captured image (file mtime) first.
+- 'newest_backfill': Newest first, but every BACKFILL_EVERY-th job is taken
+                     from the oldest end, so old images are still processed
+                     in the background instead of starving.
+
+Optionally, jobs that have been waiting longer than max_age seconds are
+either deferred (moved to a backfill lane that is only served when no fresh
+job is waiting, or by the backfill share above) or dropped for this run.
+Dropped images are not marked in the journal, so they are processed at the
+next start, e.g. in a post-flight run.
+
+Each job is a dict with at least 'path', 'mtime_ns' and 'discovered_at'
+(time.time() when the watcher found the file).
+"""
+
+import os
+import sys
+import time
+import heapq
+import queue
+from collections import deque
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import BACKFILL_EVERY
+
+SCHEDULING_POLICIES = ('fifo', 'newest', 'newest_backfill')
+STALE_ACTIONS = ('defer', 'drop')
+
+class SchedulingQueue(queue.Queue):
+    """
+    A queue.Queue whose get() order is decided by a scheduling policy.
+    The maxsize limit applies to the fresh jobs only; deferred jobs do not
+    block the watcher, so new images can still get in under a backlog.
+    """
+
+    def __init__(self, maxsize=0, policy='fifo', max_age=None, stale_action='defer'):
+        super().__init__(maxsize)
+        self.configure(policy, max_age, stale_action)
+
+    def configure(self, policy='fifo', max_age=None, stale_action='defer'):
+        """
+        Selects the scheduling policy. Must be called before jobs are queued.
+        Args:
+            policy (str): One of SCHEDULING_POLICIES.
+            max_age (float): Max. seconds a job may wait before stale_action
+                             is applied; None for no limit.
+            stale_action (str): One of STALE_ACTIONS.
+        """
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        if stale_action not in STALE_ACTIONS:
+            raise ValueError(f"Unknown stale action: {stale_action}")
+        with self.mutex:
+            self.policy = policy
+            self.max_age = max_age
+            self.stale_action = stale_action
+
+    # ---- queue.Queue internals, always called with self.mutex held ----
+
+    def _init(self, maxsize):
+        # Entries are [key, seq, job]; a served or expired entry gets job=None
+        # and is skipped lazily by both structures below.
+        self._heap = []              # Fresh jobs, ordered by the policy
+        self._arrivals = deque()     # The same entries in arrival order (oldest first)
+        self._deferred = deque()     # Jobs that exceeded max_age, oldest first
+        self._fresh_count = 0
+        self._seq = 0
+        self._get_count = 0
+        self._dropped = []           # Dropped jobs waiting for task_done()
+        self.dropped_total = 0
+
+    def _qsize(self):
+        return self._fresh_count + len(self._deferred)
+
+    def _put(self, job):
+        key = -job['mtime_ns'] if self.policy != 'fifo' else self._seq
+        entry = [key, self._seq, job]
+        self._seq += 1
+        heapq.heappush(self._heap, entry)
+        self._arrivals.append(entry)
+        self._fresh_count += 1
+
+    def _get(self):
+        self._get_count += 1
+        backfill_turn = self.policy == 'newest_backfill' and self._get_count % BACKFILL_EVERY == 0
+
+        if self._deferred and (self._fresh_count == 0 or backfill_turn):
+            return self._deferred.popleft()
+        if backfill_turn:
+            return self._take(self._oldest_entry())
+
+        while self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+        return self._take(heapq.heappop(self._heap))
+
+    def _take(self, entry):
+        job = entry[2]
+        entry[2] = None
+        self._fresh_count -= 1
+
+        # Drop the accumulated dead entries once they outnumber the live ones
+        if len(self._heap) > 2 * self._fresh_count + 64:
+            self._heap = [e for e in self._heap if e[2] is not None]
+            heapq.heapify(self._heap)
+            self._arrivals = deque(e for e in self._arrivals if e[2] is not None)
+        return job
+
+    def _oldest_entry(self):
+        while self._arrivals[0][2] is None:
+            self._arrivals.popleft()
+        return self._arrivals[0]
+
+    def _expire(self, now):
+        """Applies the stale action to fresh jobs that waited longer than max_age."""
+        if self.max_age is None:
+            return
+        while self._fresh_count:
+            entry = self._oldest_entry()
+            if now - entry[2]['discovered_at'] <= self.max_age:
+                break
+            job = self._take(entry)
+            if self.stale_action == 'defer':
+                self._deferred.append(job)
+            else:
+                self._dropped.append(job)
+                self.dropped_total += 1
+
+    def _release_dropped(self):
+        """Finishes dropped jobs outside the mutex (task_done() acquires it)."""
+        with self.mutex:
+            dropped, self._dropped = self._dropped, []
+        for job in dropped:
+            print(f"[SKIPPED] Dropped stale image, left for the next run: {os.path.basename(job['path'])}")
+            self.task_done()
+
+    # ---- public interface ----
+
+    def put(self, job, block=True, timeout=None):
+        """
+        Same as queue.Queue.put, except that only fresh jobs count towards maxsize
+        and stale jobs are expired while waiting for a free slot.
+        """
+        with self.not_full:
+            if self.maxsize > 0:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while True:
+                    self._expire(time.time())
+                    if self._fresh_count < self.maxsize:
+                        break
+                    if not block:
+                        raise queue.Full
+                    remaining = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
+                    if remaining <= 0:
+                        raise queue.Full
+                    self.not_full.wait(remaining)
+            self._put(job)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        self._release_dropped()
+
+    def get(self, block=True, timeout=None):
+        with self.mutex:
+            self._expire(time.time())
+        self._release_dropped()
+        return super().get(block, timeout)
+
+    def stats(self):
+        """
+        Returns the current state of the backlog.
+        Returns:
+            dict: {'fresh', 'deferred', 'dropped', 'oldest_age'}; oldest_age is
+                  the waiting time in seconds of the oldest queued job (0 if empty).
+        """
+        now = time.time()
+        with self.mutex:
+            oldest = None
+            if self._deferred:
+                oldest = self._deferred[0]['discovered_at']
+            if self._fresh_count:
+                discovered_at = self._oldest_entry()[2]['discovered_at']
+                oldest = discovered_at if oldest is None else min(oldest, discovered_at)
+            return {
+                'fresh': self._fresh_count,
+                'deferred': len(self._deferred),
+                'dropped': self.dropped_total,
+                'oldest_age': 0.0 if oldest is None else now - oldest,
+            }
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+Online geo-clustering of repeated detections into targets.
+
+In video modes the same target is detected in every frame it is visible in,
+each time at a slightly different position. TargetAggregator merges these
+sightings into one target per physical object, using a metric grid (cells
+of TARGET_GATE_METERS) to find the nearby targets of the same shape and
+color, and keeps a running mean and covariance of each target's position.
+A sighting joins the nearest confirmed target within TARGET_GATE_METERS,
+otherwise the nearest unconfirmed one within it.
+
+A record is emitted for a target only when it is confirmed (seen at least
+TARGET_MIN_SIGHTINGS times) and again when its mean position has moved by
+more than TARGET_REFINE_METERS since the last emitted one. The latest record
+of a target id is therefore its best position estimate.
+
+With tag_sources, the filename column of a target record also names the
+sources (the filenames of the sightings, e.g. the stream names) the target
+was seen in: 'target-<id>@nadir+oblique'.
+"""
+
+import os
+import sys
+import itertools
+from math import radians, cos, pi, sqrt, floor
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    EARTH_RADIUS, TARGET_GATE_METERS, TARGET_MIN_SIGHTINGS, TARGET_REFINE_METERS,
+    TARGET_CANDIDATE_SECONDS, TARGET_FORGET_SECONDS
+)
+from metrics.registry import registry
+
+targets_confirmed = registry.counter('detector_targets_confirmed_total', "Targets confirmed by the aggregator.")
+target_records = registry.counter('detector_target_records_total', "Target records written (confirmations and refinements).")
+
+class _Target:
+    """Running statistics of one target's position in local meters (north, east)."""
+
+    def __init__(self, target_id, shape, color, north, east, timestamp, source):
+        self.id = target_id
+        self.shape = shape
+        self.color = color
+        self.count = 1
+        self.north, self.east = north, east
+        # Sums of squared deviations (Welford), for the covariance
+        self.m2_nn = self.m2_ee = self.m2_ne = 0.0
+        self.first_seen = self.last_seen = timestamp
+        self.cell = None
+        self.emitted_at = None  # (north, east) of the last emitted record
+        self.sources = [source]  # In order of the first sighting
+
+    def add(self, north, east, timestamp, source):
+        self.count += 1
+        if source not in self.sources:
+            self.sources.append(source)
+        d_north = north - self.north
+        d_east = east - self.east
+        self.north += d_north / self.count
+        self.east += d_east / self.count
+        self.m2_nn += d_north * (north - self.north)
+        self.m2_ee += d_east * (east - self.east)
+        self.m2_ne += d_north * (east - self.east)
+        self.last_seen = timestamp
+
+    def covariance(self):
+        """
+        Returns:
+            tuple: (var_north, var_east, cov_north_east) in square meters.
+        """
+        if self.count < 2:
+            return 0.0, 0.0, 0.0
+        n = self.count - 1
+        return self.m2_nn / n, self.m2_ee / n, self.m2_ne / n
+
+class TargetAggregator:
+    """
+    Merges detection records into target records. Not thread-safe; use one
+    aggregator per producer.
+    """
+
+    def __init__(self, gate_m=TARGET_GATE_METERS, min_sightings=TARGET_MIN_SIGHTINGS,
+                 refine_m=TARGET_REFINE_METERS, candidate_seconds=TARGET_CANDIDATE_SECONDS,
+                 forget_seconds=TARGET_FORGET_SECONDS, tag_sources=False):
+        """
+        Args:
+            gate_m (float): Max. distance of a sighting from a target's mean to belong to it.
+            min_sightings (int): Sightings needed to confirm a target.
+            refine_m (float): Movement of the mean that causes a new record.
+            candidate_seconds (float): Unconfirmed targets not seen for this long are dropped.
+            forget_seconds (float): Confirmed targets not seen for this long are forgotten.
+            tag_sources (bool): If True, the filename of a target record lists the
+                                sources the target was seen in.
+        """
+        self.gate_m = gate_m
+        self.min_sightings = min_sightings
+        self.refine_m = refine_m
+        self.candidate_seconds = candidate_seconds
+        self.forget_seconds = forget_seconds
+        self.tag_sources = tag_sources
+        self.confirmed = 0
+        self._origin = None  # (latitude, longitude) of the local metric frame
+        self._meters_per_deg_lat = EARTH_RADIUS * pi / 180
+        self._meters_per_deg_lon = None
+        self._targets = {}
+        self._grid = {}      # (row, col) -> set of target ids
+        self._ids = itertools.count(1)
+        self._last_prune = None
+
+    def _to_local(self, latitude, longitude):
+        if self._origin is None:
+            self._origin = (latitude, longitude)
+            self._meters_per_deg_lon = self._meters_per_deg_lat * cos(radians(latitude))
+        return ((latitude - self._origin[0]) * self._meters_per_deg_lat,
+                (longitude - self._origin[1]) * self._meters_per_deg_lon)
+
+    def _to_global(self, north, east):
+        return (self._origin[0] + north / self._meters_per_deg_lat,
+                self._origin[1] + east / self._meters_per_deg_lon)
+
+    def _cell(self, north, east):
+        return floor(north / self.gate_m), floor(east / self.gate_m)
+
+    def _place(self, target):
+        cell = self._cell(target.north, target.east)
+        if cell != target.cell:
+            if target.cell is not None:
+                self._grid[target.cell].discard(target.id)
+                if not self._grid[target.cell]:
+                    del self._grid[target.cell]
+            self._grid.setdefault(cell, set()).add(target.id)
+            target.cell = cell
+
+    def _nearest(self, shape, color, north, east):
+        """
+        Returns the closest target of the given kind within the gate.
+        Confirmed targets come first, so a candidate formed by outlying sightings
+        next to a target cannot take over that target's sightings.
+        """
+        row, col = self._cell(north, east)
+        best, best_key = None, None
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                for target_id in self._grid.get((row + d_row, col + d_col), ()):
+                    target = self._targets[target_id]
+                    if target.shape != shape or target.color != color:
+                        continue
+                    distance = sqrt((target.north - north) ** 2 + (target.east - east) ** 2)
+                    if distance > self.gate_m:
+                        continue
+                    key = (target.emitted_at is None, distance)
+                    if best is None or key < best_key:
+                        best, best_key = target, key
+        return best
+
+    def _record(self, target, timestamp):
+        latitude, longitude = self._to_global(target.north, target.east)
+        var_north, var_east, _ = target.covariance()
+        sigma = sqrt(var_north + var_east)
+        state = "confirmed" if target.emitted_at is None else "refined"
+        name = f"target-{target.id}"
+        if self.tag_sources:
+            name += "@" + "+".join(target.sources)
+        print(f"[TARGET] {name} {state}: {target.color.upper()} {target.shape.upper()} "
+              f"@ ({latitude:.7f}, {longitude:.7f}) ±{sigma:.1f}m, {target.count} sightings")
+        target.emitted_at = (target.north, target.east)
+        target_records.inc()
+        return (timestamp, name, target.shape, target.color, latitude, longitude)
+
+    def add(self, records):
+        """
+        Adds detection records, in time order.
+        Args:
+            records (list): (timestamp, filename, shape, color, latitude, longitude) tuples.
+        Returns:
+            list: Target records in the same format to write, with 'target-<id>'
+                  (tagged with the sources if tag_sources) as filename; empty
+                  if no target was confirmed or refined.
+        """
+        emitted = []
+        for timestamp, source, shape, color, latitude, longitude in records:
+            north, east = self._to_local(latitude, longitude)
+            target = self._nearest(shape, color, north, east)
+            if target is None:
+                target = _Target(next(self._ids), shape, color, north, east, timestamp, source)
+                self._targets[target.id] = target
+            else:
+                target.add(north, east, timestamp, source)
+            self._place(target)
+
+            if target.count < self.min_sightings:
+                continue
+            if target.emitted_at is None:
+                self.confirmed += 1
+                targets_confirmed.inc()
+                emitted.append(self._record(target, timestamp))
+            elif sqrt((target.north - target.emitted_at[0]) ** 2
+                      + (target.east - target.emitted_at[1]) ** 2) > self.refine_m:
+                emitted.append(self._record(target, timestamp))
+
+        if records:
+            self._prune(records[-1][0])
+        return emitted
+
+    def _prune(self, now):
+        """Drops stale candidates and long unseen targets, at most once per second."""
+        if self._last_prune is not None and now - self._last_prune < 1.0:
+            return
+        self._last_prune = now
+        for target in list(self._targets.values()):
+            idle = now - target.last_seen
+            if idle > self.forget_seconds or (target.emitted_at is None and idle > self.candidate_seconds):
+                self._remove(target)
+
+    def _remove(self, target):
+        del self._targets[target.id]
+        self._grid[target.cell].discard(target.id)
+        if not self._grid[target.cell]:
+            del self._grid[target.cell]
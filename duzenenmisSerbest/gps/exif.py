@@ -11,7 +11,7 @@ def get_exif_data(image_path):
     """
     Extracts EXIF data from an image file.
     Args:
-        image_path (str): The path to the image file.
+        image_path (str or bytes): The path to the image file, or its contents.
     Returns:
         dict: A dictionary containing the EXIF data, or None on error.
     """
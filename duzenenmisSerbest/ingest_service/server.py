@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio ingest service: detection requests over HTTP on TCP or a UNIX socket.
+
+Instead of writing images to the watch folder and waiting for the next scan,
+a ground station can post the image bytes directly and get the detections
+back as JSON. Nothing is written to the filesystem.
+
+    POST /detect?lat=41.0082&lon=28.9784&alt=150.0
+        Body: the encoded image (JPEG/PNG).
+        lat/lon/alt are the drone position (alt above sea level, like EXIF);
+        if they are missing, the GPS data in the image's EXIF is used.
+        Response: {"width", "height", "detections": [{"type", "color", "x", "y",
+                   "latitude", "longitude"}]}; latitude/longitude are null
+                   if no position is known.
+    GET /health
+        Response: {"status", "in_flight", "waiting"}
+
+Decoding, detection and GPS calculation run in a process pool. At most
+'workers' requests are processed at once; up to 'max_pending' more wait in
+line, and any further request is answered immediately with 503 and a
+Retry-After header, so a burst degrades into short rejections instead of
+ever-growing latency.
+
+Clients such as curl send large bodies only after a '100 Continue' answer to
+their 'Expect: 100-continue' header (or after a timeout of about a second).
+The answer is sent right away, unless the request would be rejected anyway
+(too large, or too many pending requests): then the rejection is sent
+instead, without waiting for the body.
+"""
+
+import os
+import sys
+import json
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    HOME_ALTITUDE, SERVICE_MAX_PENDING, SERVICE_MAX_REQUEST_BYTES, SERVICE_READ_TIMEOUT
+)
+from gps.exif import get_exif_data, get_lat_lon_alt
+from gps.calculator import pixel_to_gps
+from file_watcher.pool import init_pool_worker, detect_encoded_image
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 417: "Expectation Failed", 422: "Unprocessable Entity", 503: "Service Unavailable",
+    500: "Internal Server Error",
+}
+
+def process_request(data, position):
+    """
+    Detects the shapes in an encoded image and calculates their GPS coordinates.
+    Runs inside a worker process.
+    Args:
+        data (bytes): The encoded image.
+        position (tuple): (latitude, longitude, altitude) of the drone, or None
+                          to read it from the image's EXIF data.
+    Returns:
+        dict: The response body, or None if the image could not be decoded.
+    """
+    detections, image_width, image_height = detect_encoded_image(data)
+    if detections is None:
+        return None
+
+    if position is None:
+        drone_lat, drone_lon, drone_alt = get_lat_lon_alt(get_exif_data(data))
+        if drone_lat is not None and drone_lon is not None and drone_alt is not None:
+            position = (drone_lat, drone_lon, drone_alt)
+
+    results = []
+    for detection in detections:
+        center_x, center_y = detection['merkez']
+        latitude = longitude = None
+        if position is not None:
+            drone_lat, drone_lon, drone_alt = position
+            latitude, longitude = pixel_to_gps(
+                center_x, center_y, image_width, image_height,
+                drone_lat, drone_lon, drone_alt - HOME_ALTITUDE
+            )
+        results.append({
+            'type': detection['sekil'],
+            'color': detection['renk'],
+            'x': center_x,
+            'y': center_y,
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+    return {'width': image_width, 'height': image_height, 'detections': results}
+
+def _parse_position(query):
+    """
+    Reads lat/lon/alt from the query string.
+    Returns:
+        tuple: (latitude, longitude, altitude), or None if not all are given.
+    Raises:
+        ValueError: If a value is not a number.
+    """
+    params = parse_qs(query)
+    if not all(key in params for key in ('lat', 'lon', 'alt')):
+        return None
+    return float(params['lat'][0]), float(params['lon'][0]), float(params['alt'][0])
+
+class IngestServer:
+    """
+    Serves detection requests with bounded concurrency and a bounded waiting line.
+    """
+
+    def __init__(self, workers=1, max_pending=SERVICE_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self.in_flight = 0
+        self.waiting = 0
+
+    def _overloaded(self):
+        return self.waiting >= self.max_pending
+
+    async def _detect(self, target, body):
+        try:
+            position = _parse_position(urlsplit(target).query)
+        except ValueError:
+            return 400, {'error': "lat, lon and alt must be numbers"}
+        if not body:
+            return 400, {'error': "The request body must contain the image"}
+
+        if self._overloaded():
+            return 503, {'error': "Too many pending requests, retry later"}
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, process_request, body, position)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        if result is None:
+            return 422, {'error': "The image could not be decoded"}
+        return 200, result
+
+    async def _route(self, method, target, body):
+        path = urlsplit(target).path
+        if path == '/detect':
+            if method != 'POST':
+                return 405, {'error': "Use POST"}
+            return await self._detect(target, body)
+        if path == '/health':
+            return 200, {'status': 'ok', 'in_flight': self.in_flight, 'waiting': self.waiting}
+        return 404, {'error': f"Unknown path: {path}"}
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def handle_client(self, reader, writer):
+        """Serves the requests of one connection (HTTP/1.1 keep-alive)."""
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), SERVICE_READ_TIMEOUT)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), SERVICE_READ_TIMEOUT)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode('latin-1').split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != 'close'
+                length = int(headers.get('content-length', 0))
+                if length > SERVICE_MAX_REQUEST_BYTES:
+                    await self._respond(writer, 413, {'error': "Image too large"}, False)
+                    break
+                if 'expect' in headers:
+                    # The body was not sent yet, so a rejection closes the connection
+                    if headers['expect'].lower() != '100-continue':
+                        await self._respond(writer, 417, {'error': "Only 'Expect: 100-continue' is supported"}, False)
+                        break
+                    if urlsplit(target).path == '/detect' and self._overloaded():
+                        await self._respond(writer, 503, {'error': "Too many pending requests, retry later"}, False)
+                        break
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    await writer.drain()
+                body = await asyncio.wait_for(reader.readexactly(length), SERVICE_READ_TIMEOUT)
+
+                try:
+                    status, payload = await self._route(method, target, body)
+                except Exception as e:
+                    print(f"[ERROR] Request failed: {e}")
+                    status, payload = 500, {'error': str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            # Malformed request, client gone or idle for too long
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=None, port=None, unix_socket=None):
+        """
+        Starts the pool and serves until cancelled.
+        Listens on the UNIX socket if one is given, otherwise on host:port.
+        """
+        self._slots = asyncio.Semaphore(self.workers)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_pool_worker) as executor:
+            self._executor = executor
+            if unix_socket:
+                server = await asyncio.start_unix_server(self.handle_client, path=unix_socket)
+                print(f"[STARTED] Ingest service listening on unix:{unix_socket}")
+            else:
+                server = await asyncio.start_server(self.handle_client, host, port)
+                print(f"[STARTED] Ingest service listening on http://{host}:{port}")
+            print(f"[INFO] {self.workers} detection processes, up to {self.max_pending} waiting requests.")
+            async with server:
+                await server.serve_forever()
+
+def run_service(host, port, unix_socket=None, workers=1, max_pending=SERVICE_MAX_PENDING):
+    """
+    Runs the ingest service in the current thread until interrupted.
+    """
+    server = IngestServer(workers, max_pending)
+    asyncio.run(server.serve(host, port, unix_socket))
@@ -4,76 +4,160 @@
 Red Triangle and Blue Hexagon Detection System - Main Starter
 
 This script is the main entry point that starts the entire system.
-It can run in two different modes:
+It can run in four different modes:
 1. 'folder': Monitors a specified directory for new images,
              reads their GPS data, and saves the results to a CSV file.
 2. 'webcam': Captures a live video stream from a local camera or an RTSP network stream,
              detects shapes, and displays the results in real-time.
+3. 'service': Accepts images over HTTP (TCP or a UNIX socket) and returns
+              the detections as JSON, without touching the filesystem.
+4. 'video':   Processes a recorded flight video file faster than real time,
+              decoding chunks of it in parallel.
 
 Usage Examples:
 # To run in folder monitoring mode:
 python main.py --mod folder
 
+# To process the folder with 8 worker processes, writing results in input order:
+python main.py --mod folder --workers 8 --ordered
+
+# To watch the DCIM folders of two mounted camera cards, including their subfolders:
+python main.py --mod folder --watch_folders /media/cam1/DCIM /media/cam2/DCIM
+
+# To also write the detections to a spatially indexed SQLite database and NDJSON:
+python main.py --mod folder --outputs csv sqlite ndjson
+
+# To process the newest images first during a mission, deferring ones older than 30 s:
+python main.py --mod folder --schedule newest_backfill --max_age 30 --on_stale defer
+
 # To run with a local camera (e.g., /dev/video0):
 python main.py --mod webcam --camera_index 0
 
+# To process 5 frames per second with at most 150 ms per frame (e.g. on a Raspberry Pi):
+python main.py --mod webcam --camera_index 0 --target_fps 5 --target_latency 0.15
+
+# To run on a companion computer without a display, watching the annotated stream in a browser:
+python main.py --mod webcam --rtsp_url "rtsp://192.168.144.25:8554/main.264" --headless --preview_port 8081
+
+# To detect only in the central 1280x720 region of a 1920x1080 camera, scaled to 640x360 in GStreamer:
+python main.py --mod webcam --camera_index 0 --sensor_size 1920x1080 --crop 320,180,1280,720 --process_size 640x360
+
+# To detect directly on the decoder's NV12 frames, without converting them to BGR:
+python main.py --mod webcam --rtsp_url "rtsp://192.168.144.25:8554/main.264" --pixel_format NV12
+
+# To record the camera frames with their telemetry, and replay them later as fast as possible:
+python main.py --mod webcam --camera_index 0 --headless --record_frames files/flight.frames
+python main.py --mod webcam --replay files/flight.frames --replay_speed max --headless
+
+# To try the live mode without a camera, with a GStreamer test pattern or a recorded video:
+python main.py --mod webcam --test_source
+python main.py --mod webcam --test_source flight.mp4
+
 # To run with an RTSP network stream:
 python main.py --mod webcam --rtsp_url "rtsp://192.168.144.25:8554/main.264"
+
+# To process a nadir and an oblique camera with 2 shared detection threads:
+python main.py --mod webcam --sources nadir=0 oblique=rtsp://192.168.144.25:8554/main.264 --workers 2
+
+# To detect a 4K camera in 4 processes that read the frames from shared memory:
+python main.py --mod webcam --camera_index 0 --sensor_size 3840x2160 --detect_processes 4
+
+# To analyze a recorded flight video with 8 processes, 5 frames per second of video:
+python main.py --mod video --video_file flight.mp4 --workers 8 --sample_fps 5
+
+# To serve detection requests on port 8080 with 4 worker processes:
+python main.py --mod service --port 8080 --workers 4
+curl --data-binary @IMG_0001.jpg "http://127.0.0.1:8080/detect?lat=41.0082&lon=28.9784&alt=150"
+
+# To expose queue depth, throughput and latency metrics for Prometheus on port 9100:
+python main.py --mod folder --metrics_port 9100
+curl http://127.0.0.1:9100/metrics
 """
 
 import os
 import sys
 import threading
-import csv
 import argparse
 
 # Add the project root directory to Python's import path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from config import OUTPUT_CSV, WATCH_FOLDER
-from file_watcher.watcher import image_processing_worker, folder_watcher, job_queue
-from video_processor import start_video_stream
+from config import (
+    OUTPUT_CSV, WATCH_FOLDER, WATCH_FOLDERS, WATCH_RECURSIVE, JOURNAL_DB, PIPELINE_IO_THREADS,
+    SCHEDULING_POLICY, MAX_BACKLOG_AGE, STALE_ACTION, FSYNC_POLICY,
+    SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_PENDING, METRICS_PORT, METRICS_FILE,
+    LIVE_TARGET_FPS, LIVE_TARGET_LATENCY, LIVE_MIN_SCALE, LIVE_REUSE_BUFFERS, LIVE_DETECT_PROCESSES,
+    OFFLINE_CHUNK_SECONDS, OFFLINE_SAMPLE_FPS, RECORD_ENCODING
+)
+from file_watcher.watcher import folder_watcher, job_queue
+from file_watcher.scheduler import SCHEDULING_POLICIES, STALE_ACTIONS
+from file_watcher.journal import ProcessedFileJournal
+from file_watcher.pipeline import image_processing_worker, stop_pipeline
+from result_writer.sinks import SINK_TYPES, open_sinks
+from result_writer.writer import DetectionWriter, FSYNC_POLICIES
+from video_processor import LiveStream, start_video_stream, SIMULATED_DRONE_LAT, SIMULATED_DRONE_LON, SIMULATED_DRONE_ALT
+from video_stream.offline import process_video_file
+from video_stream.preview import MjpegPreview, RecordingPreview
+from video_stream.recording import RECORD_ENCODINGS, ReplayCapture
+from video_stream.gstreamer import (
+    PIXEL_FORMATS, FrameGeometry, create_source_pipeline
+)
+from ingest_service.server import run_service
+from metrics.exporter import start_metrics
 
 def prepare_system():
     """
-    Prepares the necessary directories and the output CSV file for the program.
-    This is especially required for 'folder' mode.
+    Prepares the necessary directories for the program.
+    The output CSV file and its header are created by the CSV sink.
     """
     os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
     os.makedirs(WATCH_FOLDER, exist_ok=True)
 
-    if not os.path.exists(OUTPUT_CSV) or os.stat(OUTPUT_CSV).st_size == 0:
-        with open(OUTPUT_CSV, "w", newline="", encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["timestamp", "filename", "type", "color", "latitude", "longitude"])
-        print(f"[INFO] Output file created with header: {OUTPUT_CSV}")
-
-def create_gstreamer_pipeline(camera_index=0, width=1280, height=720, framerate=30):
+def open_journal(sinks):
     """
-    Creates a GStreamer pipeline string for capturing video from a V4L2 device.
+    Opens the processed-file journal and rolls back output rows of images
+    whose write was interrupted by a crash, so these images are processed again
+    instead of appearing twice in the output.
     """
-    return (
-        f"v4l2src device=/dev/video{camera_index} ! "
-        f"video/x-raw, width={width}, height={height}, framerate={framerate}/1 ! "
-        "videoconvert ! "
-        "video/x-raw, format=BGR ! "
-        "appsink"
-    )
+    journal = ProcessedFileJournal(JOURNAL_DB)
+
+    def rollback_outputs(positions):
+        for sink in sinks:
+            if sink.name in positions:
+                sink.rollback(positions[sink.name])
+
+    rolled_back = journal.recover(rollback_outputs)
+    if rolled_back:
+        print(f"[INFO] Rolled back incomplete results of {rolled_back} file(s) from the last run.")
+    return journal
 
-def create_rtsp_pipeline(url):
+def parse_size(text):
+    """Parses a 'WIDTHxHEIGHT' command-line value."""
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, e.g. 1280x720, got '{text}'")
+    return width, height
+
+def parse_region(text):
+    """Parses a 'LEFT,TOP,WIDTH,HEIGHT' command-line value."""
+    try:
+        left, top, width, height = (int(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected LEFT,TOP,WIDTH,HEIGHT, e.g. 320,0,1280,1080, got '{text}'")
+    return left, top, width, height
+
+def parse_source(text):
     """
-    Creates a GStreamer pipeline string for capturing video from an RTSP stream.
-    This is based on the user-provided working pipeline.
+    Parses a '[NAME=]SOURCE' command-line value.
+    Returns:
+        tuple: (name or None, source)
     """
-    return (
-        f"rtspsrc location={url} latency=41 udp-reconnect=1 timeout=0 do-retransmission=false ! "
-        f"application/x-rtp ! "
-        f"decodebin3 ! "
-        f"queue max-size-buffers=1 leaky=2 ! "
-        f"videoconvert ! "
-        f"video/x-raw,format=BGR ! "
-        f"appsink sync=false"
-    )
+    name, separator, source = text.partition("=")
+    # A '=' in the query of a URL does not start with a plain name
+    if separator and name.isidentifier():
+        return name, source
+    return None, text
 
 def main():
     """
@@ -85,9 +169,9 @@ def main():
     parser.add_argument(
         '--mod',
         type=str,
-        choices=['folder', 'webcam'],
+        choices=['folder', 'webcam', 'service', 'video'],
         required=True,
-        help="Choose the operating mode: 'folder' or 'webcam'."
+        help="Choose the operating mode: 'folder', 'webcam', 'service' or 'video'."
     )
     parser.add_argument(
         '--camera_index',
@@ -101,39 +185,377 @@ def main():
         default=None,
         help="URL of the RTSP stream to use instead of a local camera."
     )
+    parser.add_argument(
+        '--sources',
+        type=parse_source,
+        nargs='+',
+        default=None,
+        metavar='[NAME=]SOURCE',
+        help="Several sources to process at once in webcam mode: camera indices, RTSP URLs, "
+             "video files or 'videotestsrc', optionally named (e.g. nadir=0 oblique=rtsp://...). "
+             "The name is written in the filename column of their detections."
+    )
+    parser.add_argument(
+        '--test_source',
+        type=str,
+        nargs='?',
+        const='',
+        default=None,
+        help="Use a GStreamer test pattern, or the given video file played in real time, "
+             "instead of a camera in webcam mode."
+    )
+    parser.add_argument(
+        '--sensor_size',
+        type=parse_size,
+        default=(1280, 720),
+        help="Resolution delivered by the video source, WIDTHxHEIGHT (default: 1280x720)."
+    )
+    parser.add_argument(
+        '--process_size',
+        type=parse_size,
+        default=None,
+        help="Resolution the frames are scaled to inside GStreamer before detection, WIDTHxHEIGHT."
+    )
+    parser.add_argument(
+        '--crop',
+        type=parse_region,
+        default=None,
+        help="Region of interest in sensor pixels, LEFT,TOP,WIDTH,HEIGHT, cropped inside GStreamer."
+    )
+    parser.add_argument(
+        '--watch_folders',
+        type=str,
+        nargs='+',
+        default=WATCH_FOLDERS,
+        help="Folders to watch in folder mode (default: WATCH_FOLDERS in config.py)."
+    )
+    parser.add_argument(
+        '--no_recursive',
+        action='store_true',
+        default=not WATCH_RECURSIVE,
+        help="Do not watch the subfolders of the watch folders."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Number of decode/detection processes in folder, service and video mode, "
+             "or detection threads shared by all sources in webcam mode (default: 1)."
+    )
+    parser.add_argument(
+        '--io_threads',
+        type=int,
+        default=PIPELINE_IO_THREADS,
+        help=f"Number of file reading threads in folder mode (default: {PIPELINE_IO_THREADS})."
+    )
+    parser.add_argument(
+        '--ordered',
+        action='store_true',
+        help="In folder mode, write results in the order the images were found."
+    )
+    parser.add_argument(
+        '--schedule',
+        type=str,
+        choices=SCHEDULING_POLICIES,
+        default=SCHEDULING_POLICY,
+        help="Order in which queued images are processed in folder mode when there is a backlog."
+    )
+    parser.add_argument(
+        '--max_age',
+        type=float,
+        default=MAX_BACKLOG_AGE,
+        help="Max. seconds an image may wait in the queue before --on_stale is applied."
+    )
+    parser.add_argument(
+        '--on_stale',
+        type=str,
+        choices=STALE_ACTIONS,
+        default=STALE_ACTION,
+        help="'defer': process images older than --max_age only when the queue is idle, "
+             "'drop': skip them in this run (they are processed at the next start)."
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default=SERVICE_HOST,
+        help=f"Address the service and the MJPEG preview listen on (default: {SERVICE_HOST})."
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=SERVICE_PORT,
+        help=f"TCP port of the service (default: {SERVICE_PORT})."
+    )
+    parser.add_argument(
+        '--unix_socket',
+        type=str,
+        default=None,
+        help="Path of a UNIX socket to serve on instead of TCP."
+    )
+    parser.add_argument(
+        '--max_pending',
+        type=int,
+        default=SERVICE_MAX_PENDING,
+        help="Requests that may wait for a free worker before the service answers 503."
+    )
+    parser.add_argument(
+        '--outputs',
+        type=str,
+        nargs='+',
+        choices=list(SINK_TYPES),
+        default=['csv'],
+        help="Outputs to write the detections to (default: csv). "
+             "'sqlite' adds a spatial index, 'parquet' requires pyarrow."
+    )
+    parser.add_argument(
+        '--fsync',
+        type=str,
+        choices=FSYNC_POLICIES,
+        default=FSYNC_POLICY,
+        help="When written results are synced to disk: on every group 'commit', "
+             "at an 'interval', or 'never' (left to the OS). In folder mode, groups that "
+             "complete images are always synced, so the journal never gets ahead of the outputs."
+    )
+    parser.add_argument(
+        '--target_fps',
+        type=float,
+        default=LIVE_TARGET_FPS,
+        help=f"Frames per second to process in webcam mode (default: {LIVE_TARGET_FPS:g})."
+    )
+    parser.add_argument(
+        '--target_latency',
+        type=float,
+        default=LIVE_TARGET_LATENCY,
+        help="Max. processing seconds per frame in webcam mode (default: 1 / --target_fps)."
+    )
+    parser.add_argument(
+        '--min_scale',
+        type=float,
+        default=LIVE_MIN_SCALE,
+        help=f"Smallest processing scale the webcam mode may reduce frames to (default: {LIVE_MIN_SCALE:g})."
+    )
+    parser.add_argument(
+        '--pixel_format',
+        type=str,
+        choices=PIXEL_FORMATS,
+        default='BGR',
+        help="Format the webcam pipeline delivers. I420/NV12 skip the conversion to BGR "
+             "and are detected on directly, at full scale (default: BGR)."
+    )
+    parser.add_argument(
+        '--reuse_buffers',
+        action='store_true',
+        default=LIVE_REUSE_BUFFERS,
+        help="In webcam mode, read frames into preallocated arrays and reuse the detector's "
+             "intermediate images instead of allocating them for every frame."
+    )
+    parser.add_argument(
+        '--detect_processes',
+        type=int,
+        default=LIVE_DETECT_PROCESSES,
+        help="In webcam mode, detect in this many processes that read the frames from shared "
+             "memory, instead of in --workers threads (default: 0, threads)."
+    )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help="In webcam mode, do not open a window or draw the detections (no display needed)."
+    )
+    parser.add_argument(
+        '--preview_port',
+        type=int,
+        default=None,
+        help="In webcam mode, stream the annotated frames as MJPEG at http://<host>:<port>/."
+    )
+    parser.add_argument(
+        '--record',
+        type=str,
+        default=None,
+        help="In webcam mode, record the annotated frames to this MP4 file."
+    )
+    parser.add_argument(
+        '--record_frames',
+        type=str,
+        default=None,
+        help="In webcam mode, record every captured frame with its capture time and telemetry "
+             "to this file, for --replay. With several sources, the source name is added to the file name."
+    )
+    parser.add_argument(
+        '--record_encoding',
+        type=str,
+        choices=RECORD_ENCODINGS,
+        default=RECORD_ENCODING,
+        help=f"How --record_frames stores the frames; png is lossless (default: {RECORD_ENCODING})."
+    )
+    parser.add_argument(
+        '--replay',
+        type=parse_source,
+        nargs='+',
+        default=None,
+        metavar='[NAME=]FILE',
+        help="In webcam mode, replay recordings made with --record_frames instead of live sources. "
+             "Use the --pixel_format, --sensor_size, --crop and --process_size of the recording."
+    )
+    parser.add_argument(
+        '--replay_speed',
+        type=str,
+        choices=['original', 'max'],
+        default='original',
+        help="Replay at the recorded pace, or as fast as possible without dropping frames "
+             "(every frame at full scale, for reproducible benchmarks) (default: original)."
+    )
+    parser.add_argument(
+        '--video_file',
+        type=str,
+        default=None,
+        help="The recorded video to process in video mode."
+    )
+    parser.add_argument(
+        '--sample_fps',
+        type=float,
+        default=OFFLINE_SAMPLE_FPS,
+        help="In video mode, frames per second of video to process (default: every frame)."
+    )
+    parser.add_argument(
+        '--chunk_seconds',
+        type=float,
+        default=OFFLINE_CHUNK_SECONDS,
+        help=f"In video mode, length of the chunks decoded in parallel (default: {OFFLINE_CHUNK_SECONDS:g})."
+    )
+    parser.add_argument(
+        '--raw_detections',
+        action='store_true',
+        help="In webcam and video mode, write every detection of every frame "
+             "instead of one record per confirmed or refined target."
+    )
+    parser.add_argument(
+        '--metrics_port',
+        type=int,
+        default=METRICS_PORT,
+        help="Serve Prometheus metrics at http://<host>:<port>/metrics."
+    )
+    parser.add_argument(
+        '--metrics_file',
+        type=str,
+        default=METRICS_FILE,
+        help="Periodically rewrite the metrics (Prometheus text format) into this file."
+    )
     args = parser.parse_args()
 
     print("="*50)
     print(f"Starting System in '{args.mod.upper()}' Mode...")
     print("="*50)
+
+    if args.metrics_port or args.metrics_file:
+        start_metrics(args.metrics_port, args.metrics_file)
     
     if args.mod == 'folder':
         prepare_system()
-        worker_thread = threading.Thread(target=image_processing_worker, daemon=True)
+        sinks = open_sinks(args.outputs)
+        journal = open_journal(sinks)
+        writer = DetectionWriter(sinks, journal, fsync_policy=args.fsync).start()
+        job_queue.configure(args.schedule, args.max_age, args.on_stale)
+        worker_thread = threading.Thread(
+            target=image_processing_worker,
+            args=(writer, args.workers, args.io_threads, args.ordered),
+            daemon=True
+        )
         worker_thread.start()
         print("[INFO] Background image processor (worker) started.")
         try:
-            folder_watcher()
+            folder_watcher(journal, args.watch_folders, not args.no_recursive)
         except KeyboardInterrupt:
             print("\n[STOPPING] User interruption detected...")
-            job_queue.put(None)
+            stop_pipeline()
             worker_thread.join(timeout=5)
+            writer.close(timeout=5)
+            journal.close()
             print("[SHUTDOWN] Program terminated successfully.")
         
     elif args.mod == 'webcam':
-        pipeline = None
-        if args.rtsp_url:
-            print(f"[INFO] Using RTSP stream: {args.rtsp_url}")
-            pipeline = create_rtsp_pipeline(args.rtsp_url)
+        try:
+            geometry = FrameGeometry(args.sensor_size, args.process_size, args.crop)
+        except ValueError as e:
+            parser.error(str(e))
+        width, height = args.sensor_size
+        if args.replay:
+            sources = args.replay
+        elif args.sources:
+            sources = args.sources
+        elif args.test_source is not None:
+            sources = [(None, args.test_source or "videotestsrc")]
+        elif args.rtsp_url:
+            sources = [(None, args.rtsp_url)]
         else:
-            print(f"[INFO] Using local camera index: {args.camera_index}")
-            pipeline = create_gstreamer_pipeline(camera_index=args.camera_index)
+            sources = [(None, str(args.camera_index))]
+
+        streams = []
+        for number, (name, source) in enumerate(sources, 1):
+            if len(sources) == 1 and name is None:
+                # A single unnamed source keeps the names of the single-stream mode
+                name, record_name = "video", "live_video"
+            else:
+                name = name or f"stream{number}"
+                record_name = name
+            print(f"[INFO] Source '{name}': {source}")
+            if args.replay:
+                pipeline, capture = None, ReplayCapture(source, paced=args.replay_speed == 'original')
+            else:
+                pipeline = create_source_pipeline(source, width, height, geometry=geometry, pixel_format=args.pixel_format)
+                capture = None
+            record_path = args.record_frames
+            if record_path and len(sources) > 1:
+                root, extension = os.path.splitext(record_path)
+                record_path = f"{root}.{name}{extension}"
+            streams.append(LiveStream(
+                name, pipeline, geometry=geometry, pixel_format=args.pixel_format, target_fps=args.target_fps,
+                target_latency=args.target_latency, min_scale=args.min_scale, record_name=record_name,
+                capture=capture, record_path=record_path, record_encoding=args.record_encoding,
+                reuse_buffers=args.reuse_buffers
+            ))
+        if len({stream.name for stream in streams}) < len(streams):
+            parser.error("--sources names must be unique")
         
+        prepare_system()
+        writer = DetectionWriter(open_sinks(args.outputs), fsync_policy=args.fsync).start()
+        previews = []
+        if args.preview_port:
+            previews.append(MjpegPreview(args.preview_port, args.host).start())
+        if args.record:
+            previews.append(RecordingPreview(args.record).start())
+        try:
+            start_video_stream(
+                streams=streams, writer=writer, workers=args.workers, headless=args.headless,
+                previews=previews, aggregate=not args.raw_detections, processes=args.detect_processes
+            )
+        except KeyboardInterrupt:
+            print("\n[STOPPING] User interruption detected...")
+            print("[SHUTDOWN] Program terminated successfully.")
+        finally:
+            writer.close(timeout=5)
+
+    elif args.mod == 'service':
+        try:
+            run_service(args.host, args.port, args.unix_socket, args.workers, args.max_pending)
+        except KeyboardInterrupt:
+            print("\n[STOPPING] User interruption detected...")
+            print("[SHUTDOWN] Program terminated successfully.")
+
+    elif args.mod == 'video':
+        if not args.video_file:
+            parser.error("--mod video requires --video_file")
+        prepare_system()
+        writer = DetectionWriter(open_sinks(args.outputs), fsync_policy=args.fsync).start()
         try:
-            start_video_stream(pipeline=pipeline)
+            process_video_file(
+                args.video_file, writer, (SIMULATED_DRONE_LAT, SIMULATED_DRONE_LON, SIMULATED_DRONE_ALT),
+                args.workers, args.sample_fps, args.chunk_seconds, aggregate=not args.raw_detections
+            )
         except KeyboardInterrupt:
             print("\n[STOPPING] User interruption detected...")
             print("[SHUTDOWN] Program terminated successfully.")
+        finally:
+            writer.close()
 
     print("="*50)
 
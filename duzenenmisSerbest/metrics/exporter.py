@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+Exports the metrics registry over HTTP (Prometheus text format) and/or by
+periodically rewriting a metrics file (e.g. for the node_exporter textfile
+collector, or simply to 'cat' on a headless companion computer).
+"""
+
+import os
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import METRICS_HOST, METRICS_FILE_INTERVAL
+from metrics.registry import registry
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+def _sampler():
+    while True:
+        registry.sample()
+        time.sleep(1.0)
+
+def _file_writer(path, interval):
+    temp_path = path + ".tmp"
+    while True:
+        time.sleep(interval)
+        try:
+            with open(temp_path, "w", encoding='utf-8') as f:
+                f.write(registry.render())
+            # Readers never see a half-written file
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"[WARNING] Could not write metrics file {path}: {e}")
+
+def start_metrics(port=None, path=None, host=METRICS_HOST, interval=METRICS_FILE_INTERVAL):
+    """
+    Starts the metrics sampler and the requested exporters in daemon threads.
+    Args:
+        port (int): Serve http://host:port/metrics if given.
+        path (str): Rewrite this file every 'interval' seconds if given.
+    """
+    threading.Thread(target=_sampler, daemon=True).start()
+    if port:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[INFO] Metrics available at http://{host}:{port}/metrics")
+    if path:
+        threading.Thread(target=_file_writer, args=(path, interval), daemon=True).start()
+        print(f"[INFO] Metrics written to {path} every {interval:g}s")
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight, always-on operational metrics.
+
+Counters, gauges and histograms are plain Python objects updated with a
+single uncontended lock, cheap enough to stay enabled in the detection loops.
+Rates (images/s, frames/s, ...) and recent latency percentiles are not
+computed on the hot path: a sampler thread (see metrics.exporter) records
+a snapshot of every counter and histogram once per second, and the values
+are derived from these snapshots when the metrics are exported.
+
+Metrics are registered once, by name and labels, in the global 'registry'.
+Registering the same name and labels again returns the existing metric.
+"""
+
+import time
+import bisect
+import threading
+from collections import deque
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Number of one-second snapshots kept for rates and recent percentiles
+SAMPLE_HISTORY = 61
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+class Counter:
+    """A monotonically increasing value."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=SAMPLE_HISTORY)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def value(self):
+        return self._value
+
+    def sample(self, now):
+        self._samples.append((now, self._value))
+
+    def rate(self, window=10.0):
+        """Average increase per second over the last 'window' seconds of samples."""
+        if len(self._samples) < 2:
+            return 0.0
+        now, latest = self._samples[-1]
+        for then, earlier in self._samples:
+            if now - then <= window:
+                break
+        return (latest - earlier) / (now - then) if now > then else 0.0
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels)} {self._value}"]
+
+class Gauge:
+    """A value that goes up and down, set directly or read from a function."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels, function=None):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self._function() if self._function is not None else self._value
+
+    def sample(self, now):
+        pass
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels)} {self.value()}"]
+
+class Histogram:
+    """Counts observations in fixed buckets; supports recent percentiles."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=SAMPLE_HISTORY)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def sample(self, now):
+        with self._lock:
+            self._samples.append((now, list(self._counts)))
+
+    def quantile(self, q, window=60.0):
+        """
+        Estimates the q-quantile (0..1) of the observations of the last 'window'
+        seconds by linear interpolation inside the buckets.
+        Returns:
+            float: The estimate, or None if there were no observations.
+        """
+        if not self._samples:
+            return None
+        now, latest = self._samples[-1]
+        earlier = [0] * len(latest)
+        for then, counts in self._samples:
+            if now - then <= window:
+                earlier = counts
+                break
+        counts = [a - b for a, b in zip(latest, earlier)]
+        total = sum(counts)
+        if total == 0:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower  # In the +Inf bucket; the best estimate is its lower bound
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self):
+        labels = self.labels
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self._counts):
+            cumulative += count
+            le = "+Inf" if bound == float('inf') else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=le))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {self._sum}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """Holds all metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = cls(name, help_text, dict(labels or {}), **kwargs)
+                self._metrics[key] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=None):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=None, function=None):
+        return self._register(Gauge, name, help_text, labels, function=function)
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def sample(self):
+        """Takes the once-per-second snapshot used for rates and percentiles."""
+        now = time.monotonic()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.sample(now)
+
+    def render(self):
+        """
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        last_name = None
+        for (name, _), metric in metrics:
+            if name != last_name:
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                last_name = name
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {name} could not be read: {e}")
+        return "\n".join(lines) + "\n"
+
+# The process-wide registry
+registry = Registry()
+
+def rate_gauge(counter, name, help_text, window=10.0):
+    """Registers a gauge reporting the recent per-second rate of a counter."""
+    return registry.gauge(name, help_text, counter.labels, lambda: counter.rate(window))
+
+def latency_quantile_gauges(histogram, name, help_text, quantiles=(0.5, 0.9, 0.99)):
+    """Registers gauges with recent percentiles of a histogram, one per quantile label."""
+    for q in quantiles:
+        registry.gauge(
+            name, help_text, dict(histogram.labels, quantile=str(q)),
+            lambda q=q: histogram.quantile(q) or 0.0
+        )
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+
+"""
+Output sinks used by the detection writer.
+
+A sink receives detection records in batches and stores them in one output.
+Records are tuples:
+    (timestamp, filename, shape, color, latitude, longitude)
+where timestamp is a time.time() value and latitude/longitude are floats.
+Formatting happens here, in the writer thread, not on the detection path.
+
+Available sinks (see SINK_TYPES):
+- 'csv':     The original CSV file.
+- 'sqlite':  SQLite database with an R-tree index on latitude/longitude and
+             an index on time, for "what was found near X" queries
+             (see find_detections_near).
+- 'parquet': Columnar Parquet part files, one row group per commit,
+             partitioned by day (date=YYYY-MM-DD folders). Requires pyarrow.
+- 'ndjson':  One JSON object per line.
+
+Every sink has:
+- name:              Key of the sink in the journal's saved positions.
+- tell():            Current end position of the output (None if unsupported).
+- rollback(pos):     Cuts the output back to a position returned by tell(),
+                     and drops records written but not flushed yet
+                     (pos None: only the latter).
+- write(records):    Buffers or writes a batch of records.
+- flush(fsync):      Pushes the written records to the OS (and to disk if fsync).
+- close()
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import sqlite3
+from math import radians, cos, pi, sqrt
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    OUTPUT_CSV, OUTPUT_SQLITE, OUTPUT_PARQUET_DIR, OUTPUT_NDJSON, EARTH_RADIUS,
+    PARQUET_PART_ROWS, PARQUET_PART_SECONDS
+)
+
+class _TimestampFormatter:
+    """
+    Formats time.time() values with strftime, once per second.
+    Most records of a batch share the same second.
+    """
+
+    def __init__(self, fmt):
+        self._fmt = fmt
+        self._second = None
+        self._text = ""
+
+    def __call__(self, timestamp):
+        second = int(timestamp)
+        if second != self._second:
+            self._second = second
+            self._text = time.strftime(self._fmt, time.localtime(second))
+        return self._text
+
+class CsvSink:
+    """
+    Appends detection records to a CSV file, creating the header if needed.
+    """
+    name = 'csv'
+    HEADER = ["timestamp", "filename", "type", "color", "latitude", "longitude"]
+
+    def __init__(self, path=OUTPUT_CSV):
+        self.path = path
+        self._file = open(path, "a", newline="", encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(self.HEADER)
+            self._file.flush()
+            print(f"[INFO] Output file created with header: {path}")
+        self._format_timestamp = _TimestampFormatter("%Y-%m-%d %H:%M:%S")
+
+    def tell(self):
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def rollback(self, position):
+        self._file.flush()
+        if position is not None and os.fstat(self._file.fileno()).st_size > position:
+            os.ftruncate(self._file.fileno(), position)
+
+    def write(self, records):
+        self._writer.writerows(
+            (self._format_timestamp(timestamp), filename, shape, color, f"{latitude:.7f}", f"{longitude:.7f}")
+            for timestamp, filename, shape, color, latitude, longitude in records
+        )
+
+    def flush(self, fsync):
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+class NdjsonSink:
+    """
+    Appends detection records to a newline-delimited JSON file.
+    """
+    name = 'ndjson'
+
+    def __init__(self, path=OUTPUT_NDJSON):
+        self.path = path
+        self._file = open(path, "a", encoding='utf-8')
+        self._format_timestamp = _TimestampFormatter("%Y-%m-%dT%H:%M:%S")
+
+    def tell(self):
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def rollback(self, position):
+        self._file.flush()
+        if position is not None and os.fstat(self._file.fileno()).st_size > position:
+            os.ftruncate(self._file.fileno(), position)
+
+    def write(self, records):
+        self._file.writelines(
+            json.dumps({
+                'timestamp': self._format_timestamp(timestamp),
+                'filename': filename,
+                'type': shape,
+                'color': color,
+                'latitude': round(latitude, 7),
+                'longitude': round(longitude, 7),
+            }) + "\n"
+            for timestamp, filename, shape, color, latitude, longitude in records
+        )
+
+    def flush(self, fsync):
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+class SqliteSink:
+    """
+    Stores detection records in SQLite with a spatial (R-tree) index,
+    so nearby detections can be found without scanning the whole history.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path=OUTPUT_SQLITE):
+        self.path = path
+        # Autocommit mode; write() opens the transaction that flush() commits
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS detections ("
+            "id INTEGER PRIMARY KEY, timestamp REAL NOT NULL, filename TEXT NOT NULL, "
+            "type TEXT NOT NULL, color TEXT NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS detections_timestamp ON detections (timestamp)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS detections_rtree "
+            "USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+        )
+
+    def tell(self):
+        return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM detections").fetchone()[0]
+
+    def rollback(self, position):
+        if self._conn.in_transaction:
+            # Rows of the current write() that were not committed yet
+            self._conn.execute("ROLLBACK")
+        if position is None:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.execute("DELETE FROM detections WHERE id > ?", (position,))
+        self._conn.execute("DELETE FROM detections_rtree WHERE id > ?", (position,))
+        self._conn.execute("COMMIT")
+
+    def write(self, records):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+        for timestamp, filename, shape, color, latitude, longitude in records:
+            row_id = self._conn.execute(
+                "INSERT INTO detections (timestamp, filename, type, color, latitude, longitude) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (timestamp, filename, shape, color, latitude, longitude)
+            ).lastrowid
+            self._conn.execute(
+                "INSERT INTO detections_rtree VALUES (?, ?, ?, ?, ?)",
+                (row_id, latitude, latitude, longitude, longitude)
+            )
+
+    def flush(self, fsync):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        if fsync:
+            # Copies the WAL into the database file and syncs it to disk
+            self._conn.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._conn.close()
+
+class ParquetSink:
+    """
+    Appends detection records to Parquet part files under date=YYYY-MM-DD
+    folders, so a day of flights can be read without touching the others.
+
+    Every commit adds a row group to the open part. A part only becomes
+    readable once it is closed: when it holds part_rows rows, at the first
+    commit part_seconds after it was started, at midnight and at shutdown.
+    Until then it is named '_part-*.parquet', which Parquet readers skip, and
+    if the program is killed its rows are lost (the unfinished file is removed
+    at the next start).
+
+    Parts are named by the number of rows written before them
+    (part-<first row>.parquet). tell() returns that row count, so rollback()
+    can cut rows of an unfinished commit out of the closed parts, and images
+    processed again after journal recovery are not written twice.
+    """
+    name = 'parquet'
+
+    def __init__(self, directory=OUTPUT_PARQUET_DIR, part_rows=PARQUET_PART_ROWS,
+                 part_seconds=PARQUET_PART_SECONDS):
+        if pa is None:
+            raise RuntimeError("The Parquet output requires pyarrow: pip install pyarrow")
+        self.directory = directory
+        self.part_rows = part_rows
+        self.part_seconds = part_seconds
+        self._schema = pa.schema([
+            ('timestamp', pa.timestamp('ms')),
+            ('filename', pa.string()),
+            ('type', pa.string()),
+            ('color', pa.string()),
+            ('latitude', pa.float64()),
+            ('longitude', pa.float64()),
+        ])
+        self._writer = None
+        self._file = None
+        self._path = None         # Unfinished file of the open part
+        self._day = None
+        self._part_count = 0      # Rows in the open part
+        self._opened_at = None
+        self._pending = []
+
+        for path in glob.glob(os.path.join(directory, "date=*", "_part-*.parquet")):
+            print(f"[WARNING] Removing unfinished Parquet part of an interrupted run: {path}")
+            os.remove(path)
+        # Rows written so far, by this and earlier runs
+        parts = self._parts()
+        if parts:
+            first_row, path = parts[-1]
+            self._rows = first_row + pq.ParquetFile(path).metadata.num_rows
+        else:
+            self._rows = 0
+
+    def _parts(self):
+        """Returns the closed parts as (first_row, path) tuples, in order."""
+        parts = []
+        for path in glob.glob(os.path.join(self.directory, "date=*", "part-*.parquet")):
+            first_row = int(os.path.basename(path)[len("part-"):-len(".parquet")])
+            parts.append((first_row, path))
+        parts.sort()
+        return parts
+
+    def tell(self):
+        return self._rows
+
+    def rollback(self, position):
+        self._pending = []
+        if position is None or position >= self._rows:
+            return
+        # Row groups cannot be removed from an open file, so the part is closed and cut like the others
+        self._close_part()
+        for first_row, path in reversed(self._parts()):
+            if first_row >= position:
+                os.remove(path)
+                continue
+            table = pq.read_table(path)
+            if first_row + table.num_rows > position:
+                unfinished = os.path.join(os.path.dirname(path), "_" + os.path.basename(path))
+                pq.write_table(table.slice(0, position - first_row), unfinished)
+                os.replace(unfinished, path)
+            break
+        self._rows = position
+
+    def _open_part(self, day):
+        day_directory = os.path.join(self.directory, f"date={day}")
+        os.makedirs(day_directory, exist_ok=True)
+        self._path = os.path.join(day_directory, f"_part-{self._rows:012d}.parquet")
+        self._file = open(self._path, "wb")
+        self._writer = pq.ParquetWriter(self._file, self._schema)
+        self._day = day
+        self._part_count = 0
+        self._opened_at = time.monotonic()
+
+    def _close_part(self):
+        """Writes the open part's footer and gives it its final name."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._path, os.path.join(os.path.dirname(self._path), os.path.basename(self._path)[1:]))
+        self._writer = self._file = None
+
+    def write(self, records):
+        self._pending.extend(records)
+
+    def flush(self, fsync):
+        if self._pending:
+            day = time.strftime("%Y-%m-%d")
+            if day != self._day:
+                self._close_part()
+            if self._writer is None:
+                self._open_part(day)
+
+            timestamps, filenames, shapes, colors, latitudes, longitudes = zip(*self._pending)
+            table = pa.table([
+                pa.array([int(t * 1000) for t in timestamps], type=pa.timestamp('ms')),
+                pa.array(filenames, type=pa.string()),
+                pa.array(shapes, type=pa.string()),
+                pa.array(colors, type=pa.string()),
+                pa.array(latitudes, type=pa.float64()),
+                pa.array(longitudes, type=pa.float64()),
+            ], schema=self._schema)
+            self._writer.write_table(table)
+            self._rows += len(self._pending)
+            self._part_count += len(self._pending)
+            self._pending = []
+
+        if self._writer is None:
+            return
+        if self._part_count >= self.part_rows or time.monotonic() - self._opened_at >= self.part_seconds:
+            self._close_part()
+        elif fsync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush(True)
+        self._close_part()
+
+SINK_TYPES = {
+    'csv': CsvSink,
+    'sqlite': SqliteSink,
+    'parquet': ParquetSink,
+    'ndjson': NdjsonSink,
+}
+
+def open_sinks(names):
+    """
+    Opens the output sinks with the given names at their configured paths.
+    Args:
+        names (list): Keys of SINK_TYPES.
+    Returns:
+        list: The opened sinks.
+    """
+    return [SINK_TYPES[name]() for name in names]
+
+def find_detections_near(db_path, latitude, longitude, radius_m, since=None, until=None):
+    """
+    Finds the detections within a radius of a point using the SQLite sink's R-tree.
+    Args:
+        db_path (str): Path of the SQLite output.
+        latitude (float), longitude (float): The center point in decimal degrees.
+        radius_m (float): The search radius in meters.
+        since (float), until (float): Optional time.time() bounds.
+    Returns:
+        list: (timestamp, filename, type, color, latitude, longitude, distance_m)
+              tuples, nearest first.
+    """
+    dlat = radius_m / EARTH_RADIUS * (180 / pi)
+    dlon = dlat / cos(radians(latitude))
+
+    query = (
+        "SELECT d.timestamp, d.filename, d.type, d.color, d.latitude, d.longitude "
+        "FROM detections_rtree r JOIN detections d ON d.id = r.id "
+        "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?"
+    )
+    params = [latitude - dlat, latitude + dlat, longitude - dlon, longitude + dlon]
+    if since is not None:
+        query += " AND d.timestamp >= ?"
+        params.append(since)
+    if until is not None:
+        query += " AND d.timestamp < ?"
+        params.append(until)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    # The R-tree returns a bounding box; keep the points inside the circle
+    results = []
+    for row in rows:
+        north = (row[4] - latitude) * pi / 180 * EARTH_RADIUS
+        east = (row[5] - longitude) * pi / 180 * EARTH_RADIUS * cos(radians(latitude))
+        distance = sqrt(north * north + east * east)
+        if distance <= radius_m:
+            results.append(row + (distance,))
+    results.sort(key=lambda r: r[-1])
+    return results
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+A single, batched writer for detection results.
+
+Producers (the folder mode pipeline, the live video loop) never open the
+output files themselves. They hand their records to DetectionWriter.submit(),
+which only puts them on a queue. A background thread collects the records
+and commits them as a group when WRITER_BATCH_ROWS records are buffered or
+the oldest one has waited WRITER_MAX_DELAY seconds. Many producers therefore
+never contend for the file, and the file is opened, flushed and synced once
+per group instead of once per image or frame.
+
+A commit follows the journal's write-ahead protocol (see file_watcher.journal):
+the output positions are saved, the records are written and flushed, and
+only then are the files of the group marked as processed. If writing fails,
+the outputs are cut back to the saved positions and the files stay
+unprocessed, so a retry does not duplicate rows.
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    WRITER_QUEUE_SIZE, WRITER_BATCH_ROWS, WRITER_MAX_DELAY,
+    FSYNC_POLICY, FSYNC_INTERVAL
+)
+
+FSYNC_POLICIES = ('commit', 'interval', 'never')
+
+# Shutdown signal for the writer thread
+_STOP = object()
+
+class DetectionWriter:
+    """
+    Background writer with group commit. Safe to call submit() from any thread.
+    """
+
+    def __init__(self, sinks, journal=None, batch_rows=WRITER_BATCH_ROWS,
+                 max_delay=WRITER_MAX_DELAY, fsync_policy=FSYNC_POLICY):
+        """
+        Args:
+            sinks (list): Output sinks (see result_writer.sinks) to write to.
+            journal (ProcessedFileJournal): Journal to record completed files in, or None.
+            batch_rows (int): Commit as soon as this many records are buffered.
+            max_delay (float): Commit at the latest this many seconds after the
+                               first buffered submission.
+            fsync_policy (str): 'commit' syncs every commit to disk, 'interval'
+                                at most every FSYNC_INTERVAL seconds, 'never'
+                                leaves it to the OS. Commits with journal
+                                entries are always synced, since the journal
+                                must not count files as processed whose rows
+                                could still be lost.
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.sinks = sinks
+        self.journal = journal
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay
+        self.fsync_policy = fsync_policy
+
+        self._queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._last_fsync = time.monotonic()
+
+    def start(self):
+        """Starts the writer thread."""
+        self._thread.start()
+        return self
+
+    def submit(self, records, journal_entries=None, on_commit=None):
+        """
+        Queues records for writing. Blocks only if the writer is far behind.
+        Args:
+            records (list): Detection records (see result_writer.sinks).
+            journal_entries (list): Files to mark as processed with this commit.
+            on_commit (callable): Called without arguments in the writer thread
+                                  after the commit (also if it failed).
+        """
+        self._queue.put((records, journal_entries or [], on_commit))
+
+    def close(self, timeout=None):
+        """Commits everything still queued, stops the thread and closes the sinks."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        for sink in self.sinks:
+            sink.close()
+
+    def _run(self):
+        records, entries, callbacks = [], [], []
+        first_at = None
+        while True:
+            timeout = None if first_at is None else max(0.0, first_at + self.max_delay - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._commit(records, entries, callbacks)
+                break
+
+            if item is not None:
+                new_records, new_entries, on_commit = item
+                records.extend(new_records)
+                entries.extend(new_entries)
+                if on_commit is not None:
+                    callbacks.append(on_commit)
+                if first_at is None:
+                    first_at = time.monotonic()
+
+            if first_at is not None and (
+                len(records) >= self.batch_rows or time.monotonic() - first_at >= self.max_delay
+            ):
+                self._commit(records, entries, callbacks)
+                records, entries, callbacks = [], [], []
+                first_at = None
+
+    def _should_fsync(self):
+        if self.fsync_policy == 'commit':
+            return True
+        if self.fsync_policy == 'interval' and time.monotonic() - self._last_fsync >= FSYNC_INTERVAL:
+            return True
+        return False
+
+    def _commit(self, records, entries, callbacks):
+        """Writes one group to all sinks and records its files in the journal."""
+        positions = None
+        try:
+            if records:
+                if self.journal is not None and entries:
+                    positions = {}
+                    for sink in self.sinks:
+                        position = sink.tell()
+                        if position is not None:
+                            positions[sink.name] = position
+                    self.journal.begin(entries, positions)
+
+                # The journal is written durably, so the rows must be on disk before complete()
+                fsync = self._should_fsync() or (self.journal is not None and bool(entries))
+                for sink in self.sinks:
+                    sink.write(records)
+                    sink.flush(fsync)
+                if fsync:
+                    self._last_fsync = time.monotonic()
+
+            if self.journal is not None and entries:
+                self.journal.complete(entries)
+        except Exception as e:
+            print(f"[CRITICAL ERROR] Could not write {len(records)} detection(s): {e}")
+            if positions is not None:
+                self._abort(entries, positions)
+        finally:
+            for callback in callbacks:
+                callback()
+
+    def _abort(self, entries, positions):
+        """
+        Undoes a failed commit: cuts the outputs back to the positions saved
+        before it and drops the files' pending journal entries, so the files
+        are processed again without duplicating rows.
+        """
+        for sink in self.sinks:
+            try:
+                sink.rollback(positions.get(sink.name))
+            except Exception as e:
+                print(f"[CRITICAL ERROR] Could not roll back the {sink.name} output: {e}")
+        try:
+            self.journal.abort(entries)
+        except Exception as e:
+            print(f"[CRITICAL ERROR] Could not clear the pending journal entries: {e}")
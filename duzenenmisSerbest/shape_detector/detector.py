@@ -4,9 +4,16 @@
 """
 This module contains classes for performing color-based shape detection in images.
 - It finds red triangles and blue hexagons.
+- Frames in I420 or NV12 layout (as delivered by a GStreamer appsink without
+  videoconvert) can be processed directly: the HSV ranges are translated once
+  into a (luma, U, V) lookup table and the color masks are built at chroma
+  resolution, a quarter of the pixels, without any color conversion.
+- With reuse_buffers, the intermediate images (HSV image, masks, morphology
+  results) are written into arrays that are allocated once per resolution
+  through OpenCV's dst= parameters, instead of new ones for every image.
 """
 
-import cv2
+import cv2 as cv
 import numpy as np
 import sys
 import os
@@ -20,34 +27,122 @@ from config import (
     BLUE_LOWER, BLUE_UPPER, MORPHOLOGICAL_KERNEL,
     MIN_TRIANGLE_AREA, MIN_HEXAGON_AREA,
     TRIANGLE_EPSILON_FACTOR, HEXAGON_EPSILON_FACTOR,
-    MIN_SOLIDITY, MIN_ASPECT_RATIO, MAX_ASPECT_RATIO
+    MIN_SOLIDITY, MIN_ASPECT_RATIO, MAX_ASPECT_RATIO,
+    YUV_LUMA_LEVELS, YUV_MORPHOLOGICAL_KERNEL
 )
 
+# Frame layouts accepted by yuv_sekilleri_bul()
+YUV_LAYOUTS = ('I420', 'NV12')
+
+# Values of the YUV lookup table
+_YUV_RED = 1
+_YUV_BLUE = 2
+_yuv_table = None
+
+def _build_yuv_table():
+    """
+    Classifies every (luma level, U, V) combination with the HSV ranges of
+    the config, using the same YUV to BGR conversion as OpenCV's I420 decoder.
+    Returns:
+        numpy.ndarray: Flat uint8 table, indexed by (level << 16) | (U << 8) | V.
+    """
+    levels = YUV_LUMA_LEVELS
+    step = 256 // levels
+    # An I420 image whose 2x2 blocks run through all combinations:
+    # chroma row = level * 256 + U, chroma column = V
+    luma = np.repeat((np.arange(levels) * step + step // 2).astype(np.uint8), 2 * 256)
+    luma = np.broadcast_to(luma[:, None], (levels * 512, 512))
+    u = np.repeat(np.tile(np.arange(256, dtype=np.uint8), levels)[:, None], 256, axis=1)
+    v = np.broadcast_to(np.arange(256, dtype=np.uint8)[None, :], (levels * 256, 256))
+    i420 = np.concatenate([luma.ravel(), u.ravel(), v.ravel()]).reshape(levels * 768, 512)
+
+    hsv = cv.cvtColor(cv.cvtColor(i420, cv.COLOR_YUV2BGR_I420), cv.COLOR_BGR2HSV)[::2, ::2]
+    red = cv.inRange(hsv, RED_LOWER_1, RED_UPPER_1) | cv.inRange(hsv, RED_LOWER_2, RED_UPPER_2)
+    blue = cv.inRange(hsv, BLUE_LOWER, BLUE_UPPER)
+    table = np.zeros(hsv.shape[:2], np.uint8)
+    table[red > 0] = _YUV_RED
+    table[blue > 0] = _YUV_BLUE
+    return table.ravel()
+
+def _yuv_planes(frame, layout):
+    """
+    Splits an I420/NV12 frame of shape (height * 3 / 2, width) into its planes.
+    Returns:
+        tuple: (luma, u, v); u and v have half the width and height.
+    """
+    height = frame.shape[0] * 2 // 3
+    width = frame.shape[1]
+    luma = frame[:height]
+    if layout == 'I420':
+        chroma = frame[height:].reshape(-1)
+        u = chroma[:chroma.size // 2].reshape(height // 2, width // 2)
+        v = chroma[chroma.size // 2:].reshape(height // 2, width // 2)
+    elif layout == 'NV12':
+        uv = frame[height:].reshape(height // 2, width // 2, 2)
+        u, v = uv[..., 0], uv[..., 1]
+    else:
+        raise ValueError(f"Unsupported YUV layout: {layout}")
+    return luma, u, v
+
 class SekilTespitEdici:
     """
     Main class containing methods for detecting geometric shapes of specific colors.
     """
 
+    def __init__(self, reuse_buffers=False):
+        """
+        Args:
+            reuse_buffers (bool): Reuse preallocated arrays for the intermediate
+                                  images. The detector must then only be used by
+                                  one thread at a time.
+        """
+        # Factor applied to the minimum contour areas; set to scale**2 when
+        # the images are downscaled before detection
+        self.area_scale = 1.0
+        self._buffers = {} if reuse_buffers else None
+
+    def _buffer(self, name, shape, dtype=np.uint8):
+        """
+        Returns the reusable array 'name', reallocated only when the shape changes,
+        or None (let OpenCV/NumPy allocate) if buffers are not reused.
+        """
+        if self._buffers is None:
+            return None
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._buffers[name] = np.empty(shape, dtype)
+        return buffer
+
     def _create_color_mask(self, image, color):
         """
         Creates a binary mask for the specified color in the HSV space and
         cleans up noise using morphological operations.
         """
-        hsv = cv2.cvtColor(image, cv.COLOR_BGR2HSV)
+        hsv = cv.cvtColor(image, cv.COLOR_BGR2HSV, dst=self._buffer('hsv', image.shape))
+        mask_shape = image.shape[:2]
         
         if color == 'kirmizi':
-            mask1 = cv.inRange(hsv, RED_LOWER_1, RED_UPPER_1)
-            mask2 = cv.inRange(hsv, RED_LOWER_2, RED_UPPER_2)
-            mask = cv.bitwise_or(mask1, mask2)
+            mask1 = cv.inRange(hsv, RED_LOWER_1, RED_UPPER_1, dst=self._buffer('mask1', mask_shape))
+            mask2 = cv.inRange(hsv, RED_LOWER_2, RED_UPPER_2, dst=self._buffer('mask2', mask_shape))
+            mask = cv.bitwise_or(mask1, mask2, dst=self._buffer('mask', mask_shape))
         elif color == 'mavi':
-            mask = cv.inRange(hsv, BLUE_LOWER, BLUE_UPPER)
+            mask = cv.inRange(hsv, BLUE_LOWER, BLUE_UPPER, dst=self._buffer('mask', mask_shape))
         else:
             return np.zeros(image.shape[:2], dtype="uint8")
         
-        mask = cv.morphologyEx(mask, cv.MORPH_OPEN, MORPHOLOGICAL_KERNEL)
-        mask = cv.morphologyEx(mask, cv.MORPH_CLOSE, MORPHOLOGICAL_KERNEL)
+        mask = cv.morphologyEx(mask, cv.MORPH_OPEN, MORPHOLOGICAL_KERNEL, dst=self._buffer('opened', mask_shape))
+        mask = cv.morphologyEx(mask, cv.MORPH_CLOSE, MORPHOLOGICAL_KERNEL, dst=self._buffer('closed', mask_shape))
         return mask
 
+    def hedef_renk_maskesi(self, image):
+        """
+        Returns the mask of all target colors (red or blue), e.g. to find the
+        regions of an image that are worth a closer look.
+        """
+        # Copied, as the blue mask may be written into the same buffer
+        red_mask = self._create_color_mask(image, 'kirmizi').copy()
+        return cv.bitwise_or(red_mask, self._create_color_mask(image, 'mavi'))
+
     def _is_contour_valid(self, contour):
         """
         Checks if a contour is a valid shape based on solidity and aspect ratio.
@@ -70,64 +165,93 @@ class SekilTespitEdici:
             
         return True
 
-    def kirmizi_ucgenleri_bul(self, image):
+    def _find_polygons(self, mask, min_area, epsilon_factor, vertices, shape, color, coordinate_scale=1):
         """
-        Detects red triangles in a given image.
+        Finds the convex polygons with the given number of vertices in a color mask.
+        Args:
+            coordinate_scale (int): Factor from mask to image coordinates.
         """
-        mask = self._create_color_mask(image, 'kirmizi')
         contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        
-        detected_triangles = []
+
+        detected = []
         for contour in contours:
-            if cv.contourArea(contour) < MIN_TRIANGLE_AREA:
+            if cv.contourArea(contour) < min_area:
                 continue
-            
+
             if not self._is_contour_valid(contour):
                 continue
 
-            epsilon = TRIANGLE_EPSILON_FACTOR * cv.arcLength(contour, True)
+            epsilon = epsilon_factor * cv.arcLength(contour, True)
             approx_contour = cv.approxPolyDP(contour, epsilon, True)
 
-            if len(approx_contour) == 3 and cv.isContourConvex(approx_contour):
+            if len(approx_contour) == vertices and cv.isContourConvex(approx_contour):
                 M = cv.moments(contour)
                 if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                    detected_triangles.append({
-                        'sekil': 'ucgen', 
-                        'renk': 'kirmizi', 
+                    cx = int(M["m10"] / M["m00"] * coordinate_scale)
+                    cy = int(M["m01"] / M["m00"] * coordinate_scale)
+                    detected.append({
+                        'sekil': shape,
+                        'renk': color,
                         'merkez': (cx, cy)
                     })
-        
-        return detected_triangles
+
+        return detected
+
+    def kirmizi_ucgenleri_bul(self, image):
+        """
+        Detects red triangles in a given image.
+        """
+        mask = self._create_color_mask(image, 'kirmizi')
+        return self._find_polygons(
+            mask, MIN_TRIANGLE_AREA * self.area_scale, TRIANGLE_EPSILON_FACTOR, 3, 'ucgen', 'kirmizi'
+        )
 
     def mavi_altigenleri_bul(self, image):
         """
         Detects blue hexagons in a given image.
         """
         mask = self._create_color_mask(image, 'mavi')
-        contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        
-        detected_hexagons = []
-        for contour in contours:
-            if cv.contourArea(contour) < MIN_HEXAGON_AREA:
-                continue
-
-            if not self._is_contour_valid(contour):
-                continue
+        return self._find_polygons(
+            mask, MIN_HEXAGON_AREA * self.area_scale, HEXAGON_EPSILON_FACTOR, 6, 'altigen', 'mavi'
+        )
 
-            epsilon = HEXAGON_EPSILON_FACTOR * cv.arcLength(contour, True)
-            approx_contour = cv.approxPolyDP(contour, epsilon, True)
+    def yuv_sekilleri_bul(self, frame, layout='I420'):
+        """
+        Detects red triangles and blue hexagons in an I420 or NV12 frame.
+        The colors are classified per chroma sample (2x2 pixels), with the
+        top-left luma sample of each block.
+        Args:
+            frame (numpy.ndarray): The frame, shape (height * 3 / 2, width).
+            layout (str): 'I420' or 'NV12'.
+        Returns:
+            list: The detections, with their centers in full-resolution pixels.
+        """
+        global _yuv_table
+        if _yuv_table is None:
+            _yuv_table = _build_yuv_table()
 
-            if len(approx_contour) == 6 and cv.isContourConvex(approx_contour):
-                M = cv.moments(contour)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                    detected_hexagons.append({
-                        'sekil': 'altigen', 
-                        'renk': 'mavi', 
-                        'merkez': (cx, cy)
-                    })
+        luma, u, v = _yuv_planes(frame, layout)
+        chroma_shape = u.shape
+        index = np.floor_divide(
+            luma[::2, ::2], 256 // YUV_LUMA_LEVELS, out=self._buffer('yuv_index', chroma_shape, np.intp), dtype=np.intp
+        )
+        index <<= 16
+        index |= np.left_shift(u, 8, out=self._buffer('yuv_u', chroma_shape, np.intp), dtype=np.intp)
+        index |= v
+        classes = _yuv_table.take(index, out=self._buffer('yuv_classes', chroma_shape), mode='clip')
 
-        return detected_hexagons
+        detections = []
+        # Areas in the masks are a quarter of the full-resolution areas
+        for value, min_area, epsilon_factor, vertices, shape, color in (
+            (_YUV_RED, MIN_TRIANGLE_AREA, TRIANGLE_EPSILON_FACTOR, 3, 'ucgen', 'kirmizi'),
+            (_YUV_BLUE, MIN_HEXAGON_AREA, HEXAGON_EPSILON_FACTOR, 6, 'altigen', 'mavi'),
+        ):
+            mask = cv.compare(classes, value, cv.CMP_EQ, dst=self._buffer('yuv_mask', chroma_shape))
+            mask = cv.morphologyEx(mask, cv.MORPH_OPEN, YUV_MORPHOLOGICAL_KERNEL,
+                                   dst=self._buffer('yuv_opened', chroma_shape))
+            mask = cv.morphologyEx(mask, cv.MORPH_CLOSE, YUV_MORPHOLOGICAL_KERNEL,
+                                   dst=self._buffer('yuv_closed', chroma_shape))
+            detections += self._find_polygons(
+                mask, min_area * self.area_scale / 4, epsilon_factor, vertices, shape, color, coordinate_scale=2
+            )
+        return detections
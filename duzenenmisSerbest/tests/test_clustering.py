@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the target aggregator."""
+
+from gps.clustering import TargetAggregator
+
+def _sightings(source, count, start=0.0, latitude=39.9):
+    return [(start + i, source, 'kare', 'kirmizi', latitude, 32.8) for i in range(count)]
+
+def test_target_records_name_the_sources():
+    aggregator = TargetAggregator(min_sightings=2, refine_m=1.0, tag_sources=True)
+    confirmed = aggregator.add(_sightings('nadir', 2))
+    assert [record[1] for record in confirmed] == ['target-1@nadir']
+
+    # The oblique camera sees the same target about 3 m further north, which moves its mean
+    refined = aggregator.add(_sightings('oblique', 2, start=2.0, latitude=39.90003))
+    assert refined
+    assert {record[1] for record in refined} == {'target-1@nadir+oblique'}
+
+def test_untagged_target_records_keep_the_plain_name():
+    aggregator = TargetAggregator(min_sightings=2)
+    records = aggregator.add(_sightings('live_video', 2))
+    assert [record[1] for record in records] == ['target-1']
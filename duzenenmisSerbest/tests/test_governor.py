@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the adaptive FrameGovernor, driven with synthetic timings."""
+
+from video_stream.governor import FrameGovernor, ADJUST_EVERY
+
+def _run(governor, frames, processing_seconds, start_seq=0, source_fps=30.0):
+    """Offers frames at source_fps and reports the given processing time for every processed one."""
+    processed = 0
+    for seq in range(start_seq, start_seq + frames):
+        if governor.should_process(seq, seq / source_fps):
+            governor.update(processing_seconds)
+            processed += 1
+    return processed, start_seq + frames
+
+def test_overloaded_detector_raises_the_stride_at_the_minimum_scale():
+    governor = FrameGovernor(target_fps=10, min_scale=0.5, max_scale=1.0, max_stride=16, stream="test-load")
+    # 250 ms per frame against a 100 ms budget, whatever the scale
+    _, seq = _run(governor, 3000, 0.25)
+    assert governor.scale == 0.5
+    # 30 fps source / 10 fps target = 3, times the overload of 2.5 rounded up
+    assert governor.stride == 9
+    # The processed frames fit the measured processing time: 30 / 9 fps * 0.25 s < 1
+    processed, seq = _run(governor, 300, 0.25, seq)
+    assert processed * 0.25 <= 300 / 30.0
+
+    # The load goes away: first the stride comes back, then the scale
+    _run(governor, 3000, 0.03, seq)
+    assert governor.stride == 3
+    assert governor.scale == 1.0
+
+def test_stride_is_capped():
+    governor = FrameGovernor(target_fps=10, min_scale=0.5, max_scale=1.0, max_stride=4, stream="test-cap")
+    _run(governor, 3000, 1.0)
+    assert governor.stride == 4
+
+def test_scale_is_lowered_before_frames_are_skipped():
+    governor = FrameGovernor(target_fps=10, min_scale=0.25, max_scale=1.0, max_stride=16, stream="test-scale")
+    _run(governor, 3 * ADJUST_EVERY * 3, 0.15)
+    assert 0.25 < governor.scale < 1.0
+    assert governor.stride == 3
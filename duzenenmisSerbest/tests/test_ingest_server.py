@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the ingest service's HTTP handling."""
+
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from config import SERVICE_MAX_REQUEST_BYTES
+from file_watcher.pool import init_pool_worker
+from ingest_service.server import IngestServer
+
+def _image():
+    _, encoded = cv2.imencode('.jpg', np.full((240, 320, 3), 128, np.uint8))
+    return encoded.tobytes()
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, value = line.decode('latin-1').split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), body
+
+async def _post_with_expect(server, length, body=None):
+    """
+    Sends a POST /detect with 'Expect: 100-continue' and sends the body only
+    after the server answered 100 Continue.
+    Returns:
+        tuple: (interim status or None, final status, seconds until the first answer)
+    """
+    listener = await asyncio.start_server(server.handle_client, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        start = time.perf_counter()
+        writer.write((
+            "POST /detect?lat=41.0&lon=29.0&alt=122.0 HTTP/1.1\r\n"
+            f"Content-Length: {length}\r\nExpect: 100-continue\r\n\r\n"
+        ).encode('latin-1'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), 0.5)
+        waited = time.perf_counter() - start
+        if int(status_line.split()[1]) != 100:
+            # Rejected before the body was sent
+            await reader.readuntil(b"\r\n\r\n")
+            return None, int(status_line.split()[1]), waited
+        await reader.readline()
+        writer.write(body)
+        await writer.drain()
+        status, payload = await asyncio.wait_for(_read_response(reader), 10)
+        assert json.loads(payload)['detections'] == []
+        return 100, status, waited
+    finally:
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+
+def _run(server, length, body=None):
+    async def main():
+        server._slots = asyncio.Semaphore(server.workers)
+        return await _post_with_expect(server, length, body)
+    return asyncio.run(main())
+
+def _server(max_pending=4):
+    # Threads instead of processes; the detector is created in this process
+    init_pool_worker()
+    server = IngestServer(workers=1, max_pending=max_pending)
+    server._executor = ThreadPoolExecutor(1)
+    return server
+
+def test_expect_100_continue_is_answered_right_away():
+    body = _image()
+    interim, status, waited = _run(_server(), len(body), body)
+    assert (interim, status) == (100, 200)
+    assert waited < 0.5
+
+def test_expect_100_continue_is_rejected_when_overloaded():
+    interim, status, _ = _run(_server(max_pending=0), 1000)
+    assert (interim, status) == (None, 503)
+
+def test_expect_100_continue_is_rejected_when_too_large():
+    interim, status, _ = _run(_server(), SERVICE_MAX_REQUEST_BYTES + 1)
+    assert (interim, status) == (None, 413)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the folder mode pipeline with the processed-file journal."""
+
+import os
+import time
+import signal
+import threading
+
+import cv2
+import numpy as np
+import piexif
+import pytest
+
+from file_watcher import pipeline, pool
+from file_watcher.journal import ProcessedFileJournal, file_signature
+from file_watcher.watcher import job_queue, queued_files
+from result_writer.sinks import CsvSink
+from result_writer.writer import DetectionWriter
+
+# Appended to an image to make _detect_or_fail() fail on it or kill its process; JPEG decoders ignore it
+_FAIL = b"FAIL"
+_KILL = b"KILL"
+
+def _detect_or_fail(data):
+    # Runs in the worker process
+    if data.endswith(_FAIL):
+        raise RuntimeError("detection failed")
+    if data.endswith(_KILL):
+        os.kill(os.getpid(), signal.SIGKILL)
+    return pool.detect_encoded_image(data)
+
+def _make_image(path, fail=None):
+    """Writes a JPEG with a red triangle and a GPS position 50 m above home."""
+    image = np.full((480, 640, 3), (40, 120, 40), np.uint8)
+    cv2.fillPoly(image, [np.array([[300, 150], [380, 300], [220, 300]])], (0, 0, 255))
+    _, encoded = cv2.imencode('.jpg', image)
+    with open(path, 'wb') as f:
+        f.write(encoded.tobytes())
+    gps = {
+        piexif.GPSIFD.GPSLatitude: ((41, 1), (0, 1), (0, 100)),
+        piexif.GPSIFD.GPSLatitudeRef: b'N',
+        piexif.GPSIFD.GPSLongitude: ((29, 1), (0, 1), (0, 100)),
+        piexif.GPSIFD.GPSLongitudeRef: b'E',
+        piexif.GPSIFD.GPSAltitude: (12200, 100),
+    }
+    piexif.insert(piexif.dump({'GPS': gps}), path)
+    if fail:
+        with open(path, 'ab') as f:
+            f.write(fail)
+
+def _run_pipeline(journal, csv_path, paths):
+    """Processes the images that are not completed in the journal yet, as the watcher would queue them."""
+    pipeline.stop_event.clear()
+    writer = DetectionWriter([CsvSink(str(csv_path))], journal, batch_rows=1).start()
+    thread = threading.Thread(target=pipeline.image_processing_worker, args=(writer, 1, 1), daemon=True)
+    thread.start()
+    for path in paths:
+        job = file_signature(path)
+        if journal.is_processed(job):
+            continue
+        job['name'] = os.path.basename(path)
+        queued_files.add(path)
+        job_queue.put(job)
+    deadline = time.monotonic() + 30
+    while job_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job_queue.unfinished_tasks == 0
+    pipeline.stop_pipeline()
+    thread.join(timeout=30)
+    writer.close(timeout=5)
+    assert not thread.is_alive()
+
+def _csv_filenames(path):
+    with open(path, encoding='utf-8') as f:
+        return sorted(line.split(',')[1] for line in f.read().splitlines()[1:])
+
+@pytest.mark.parametrize("stage", ["read", "detect"])
+def test_failed_image_is_processed_again_at_the_next_start(tmp_path, monkeypatch, stage):
+    paths = [str(tmp_path / f"IMG_{i}.jpg") for i in range(2)]
+    _make_image(paths[0], fail=_FAIL if stage == "detect" else None)
+    _make_image(paths[1])
+    journal = ProcessedFileJournal(str(tmp_path / "journal.sqlite3"))
+    csv_path = tmp_path / "detections.csv"
+
+    # The first image fails once, in the given stage
+    if stage == "read":
+        read_telemetry = pipeline._read_telemetry
+        def failing_read(image_path, data):
+            if image_path == paths[0]:
+                raise OSError("I/O error")
+            return read_telemetry(image_path, data)
+        monkeypatch.setattr(pipeline, "_read_telemetry", failing_read)
+    else:
+        monkeypatch.setattr(pipeline, "detect_encoded_image", _detect_or_fail)
+    _run_pipeline(journal, csv_path, paths)
+
+    assert not journal.is_processed(file_signature(paths[0]))
+    assert journal.is_processed(file_signature(paths[1]))
+    assert _csv_filenames(csv_path) == ["IMG_1.jpg"]
+
+    monkeypatch.undo()
+    _run_pipeline(journal, csv_path, paths)
+    assert journal.is_processed(file_signature(paths[0]))
+    assert _csv_filenames(csv_path) == ["IMG_0.jpg", "IMG_1.jpg"]
+    journal.close()
+
+def test_killed_worker_process_is_replaced(tmp_path, monkeypatch):
+    paths = [str(tmp_path / f"IMG_{i}.jpg") for i in range(6)]
+    _make_image(paths[0], fail=_KILL)
+    for path in paths[1:]:
+        _make_image(path)
+    journal = ProcessedFileJournal(str(tmp_path / "journal.sqlite3"))
+    csv_path = tmp_path / "detections.csv"
+
+    monkeypatch.setattr(pipeline, "detect_encoded_image", _detect_or_fail)
+    _run_pipeline(journal, csv_path, paths)
+
+    # The images in work when the process died failed; the later ones ran in a new pool
+    processed = [path for path in paths if journal.is_processed(file_signature(path))]
+    assert paths[0] not in processed
+    assert paths[-1] in processed
+    assert _csv_filenames(csv_path) == sorted(os.path.basename(path) for path in processed)
+
+    monkeypatch.undo()
+    _run_pipeline(journal, csv_path, paths)
+    assert _csv_filenames(csv_path) == sorted(os.path.basename(path) for path in paths)
+    journal.close()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the incremental DirectoryScanner."""
+
+import os
+import time
+
+from file_watcher import scanner
+from file_watcher.scanner import DirectoryScanner
+
+_scandir = os.scandir
+
+class _CountingEntry:
+    """Wraps an os.DirEntry and counts its stat() calls."""
+
+    def __init__(self, entry, counter):
+        self._entry = entry
+        self._counter = counter
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def stat(self):
+        self._counter.append(self.name)
+        return self._entry.stat()
+
+class _CountingScandir:
+    def __init__(self, path, counter):
+        self._iterator = _scandir(path)
+        self._counter = counter
+
+    def __enter__(self):
+        return (_CountingEntry(entry, self._counter) for entry in self._iterator)
+
+    def __exit__(self, *exc):
+        self._iterator.close()
+
+def _touch(path, age=60):
+    with open(path, "wb") as f:
+        f.write(b"x")
+    past = time.time() - age
+    os.utime(path, (past, past))
+
+def _bump_mtime(directory):
+    # The directory's mtime changes with every new file; make sure the change is visible
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+def test_only_new_files_are_stated(tmp_path, monkeypatch):
+    stated = []
+    monkeypatch.setattr(scanner.os, "scandir", lambda path: _CountingScandir(path, stated))
+    for i in range(50):
+        _touch(tmp_path / f"IMG_{i:04d}.JPG")
+    dir_scanner = DirectoryScanner([str(tmp_path)], settle_seconds=1)
+
+    assert len(dir_scanner.scan()) == 50
+    assert len(stated) == 50
+
+    stated.clear()
+    _touch(tmp_path / "IMG_0050.JPG")
+    _bump_mtime(tmp_path)
+    assert [f['name'] for f in dir_scanner.scan()] == ["IMG_0050.JPG"]
+    assert stated == ["IMG_0050.JPG"]
+
+def test_unsettled_and_recreated_files(tmp_path):
+    _touch(tmp_path / "a.jpg")
+    dir_scanner = DirectoryScanner([str(tmp_path)], settle_seconds=5)
+    assert [f['name'] for f in dir_scanner.scan()] == ["a.jpg"]
+
+    # Still being written: reported once it has settled
+    _touch(tmp_path / "b.jpg", age=0)
+    assert dir_scanner.scan() == []
+    past = time.time() - 60
+    os.utime(tmp_path / "b.jpg", (past, past))
+    assert [f['name'] for f in dir_scanner.scan()] == ["b.jpg"]
+
+    # Removed and created again under the same name
+    os.remove(tmp_path / "a.jpg")
+    _bump_mtime(tmp_path)
+    assert dir_scanner.scan() == []
+    _touch(tmp_path / "a.jpg")
+    _bump_mtime(tmp_path)
+    assert [f['name'] for f in dir_scanner.scan()] == ["a.jpg"]
+
+def test_remembered_names_stay_bounded(tmp_path, monkeypatch):
+    stated = []
+    monkeypatch.setattr(scanner.os, "scandir", lambda path: _CountingScandir(path, stated))
+    dir_scanner = DirectoryScanner([str(tmp_path)], settle_seconds=1, known_limit=20, forget_seconds=3600)
+    directory = dir_scanner._directories
+
+    reported = []
+    for scan in range(100):
+        stated.clear()
+        remembered = len(directory[str(tmp_path)]['known']) if scan else 0
+        new = [f"IMG_{scan:03d}_{i}.JPG" for i in range(5)]
+        for name in new:
+            # Every scan's files are newer than the ones before
+            _touch(tmp_path / name, age=10000 - scan * 10)
+        _bump_mtime(tmp_path)
+        found = [f['name'] for f in dir_scanner.scan()]
+        assert found == new
+        reported.extend(found)
+        assert len(directory[str(tmp_path)]['known']) <= 20
+        # Only the names that are not remembered are read; the forgotten ones are not reported again
+        assert len(stated) == (scan + 1) * 5 - remembered
+    assert len(reported) == len(set(reported)) == 500
+
+def test_unchanged_directory_forgets_its_names(tmp_path, monkeypatch):
+    for i in range(10):
+        _touch(tmp_path / f"IMG_{i}.JPG", age=100 - i)
+    past = time.time() - 60
+    os.utime(tmp_path, (past, past))
+    dir_scanner = DirectoryScanner([str(tmp_path)], settle_seconds=1, forget_seconds=0)
+    assert len(dir_scanner.scan()) == 10
+    assert dir_scanner.scan() == []
+    assert dir_scanner._directories[str(tmp_path)]['known'] == {}
+
+    # The next change costs a stat() of the old names, but only the new file is reported
+    stated = []
+    monkeypatch.setattr(scanner.os, "scandir", lambda path: _CountingScandir(path, stated))
+    _touch(tmp_path / "IMG_10.JPG", age=50)
+    _bump_mtime(tmp_path)
+    assert [f['name'] for f in dir_scanner.scan()] == ["IMG_10.JPG"]
+    assert len(stated) == 11
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the shared memory frame ring."""
+
+import numpy as np
+
+from video_stream import shared_ring
+from video_stream.shared_ring import SharedFrameRing, attach_frame, detach_all
+
+def test_new_ring_of_an_owner_closes_the_old_mapping():
+    first = SharedFrameRing(2, (4, 6, 3))
+    second = SharedFrameRing(2, (8, 6, 3))
+    try:
+        first.write(1, np.full((4, 6, 3), 7, np.uint8))
+        frame = attach_frame(first.name, 1, first.shape, first.dtype.str, owner='nadir')
+        assert (frame == 7).all()
+        old_mapping = shared_ring._attached['nadir']
+        del frame
+
+        attach_frame(second.name, 0, second.shape, second.dtype.str, owner='nadir')
+        assert list(shared_ring._attached) == ['nadir']
+        assert shared_ring._attached['nadir'].name == second.name
+        assert old_mapping.buf is None
+
+        detach_all()
+        assert not shared_ring._attached
+    finally:
+        detach_all()
+        first.close()
+        second.close()
+
+def test_replacing_a_ring_while_its_frame_is_referenced():
+    first = SharedFrameRing(1, (2, 2))
+    second = SharedFrameRing(1, (2, 2))
+    try:
+        frame = attach_frame(first.name, 0, first.shape, first.dtype.str, owner='oblique')
+        # The old mapping cannot be closed yet, but the frame stays usable
+        attach_frame(second.name, 0, second.shape, second.dtype.str, owner='oblique')
+        assert frame.sum() == 0
+        assert shared_ring._attached['oblique'].name == second.name
+    finally:
+        detach_all()
+        first.close()
+        second.close()
+
+def test_idle_ring():
+    ring = SharedFrameRing(2, (2, 2))
+    try:
+        assert ring.idle()
+        slot = ring.acquire()
+        assert not ring.idle()
+        ring.release(slot)
+        assert ring.idle()
+    finally:
+        ring.close()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the output sinks."""
+
+import os
+import glob
+import time
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from result_writer.sinks import ParquetSink
+
+def _records(*filenames):
+    return [(time.time(), filename, 'ucgen', 'kirmizi', 41.0, 29.0) for filename in filenames]
+
+def _commit(sink, *filenames):
+    sink.write(_records(*filenames))
+    sink.flush(True)
+
+def _read_filenames(directory):
+    if not glob.glob(os.path.join(directory, "date=*", "part-*.parquet")):
+        return []
+    return pq.read_table(directory).column('filename').to_pylist()
+
+def test_parts_become_readable_while_running(tmp_path):
+    directory = str(tmp_path)
+    sink = ParquetSink(directory, part_rows=3, part_seconds=3600)
+    _commit(sink, "a.jpg", "b.jpg")
+    # The open part is not visible to readers yet
+    assert _read_filenames(directory) == []
+
+    _commit(sink, "c.jpg", "d.jpg")
+    assert _read_filenames(directory) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+
+    _commit(sink, "e.jpg")
+    sink.close()
+    assert _read_filenames(directory) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg"]
+    parts = sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, "date=*", "*.parquet")))
+    assert parts == ["part-000000000000.parquet", "part-000000000004.parquet"]
+
+def test_parts_are_closed_after_part_seconds(tmp_path):
+    directory = str(tmp_path)
+    sink = ParquetSink(directory, part_rows=1000, part_seconds=0)
+    _commit(sink, "a.jpg")
+    assert _read_filenames(directory) == ["a.jpg"]
+    sink.close()
+
+def test_unfinished_part_of_a_killed_run_is_removed(tmp_path):
+    directory = str(tmp_path)
+    sink = ParquetSink(directory, part_rows=2, part_seconds=3600)
+    _commit(sink, "a.jpg", "b.jpg")
+    _commit(sink, "c.jpg")
+    # Killed: the open part never gets its footer
+
+    sink = ParquetSink(directory, part_rows=2, part_seconds=3600)
+    assert not glob.glob(os.path.join(directory, "date=*", "_part-*"))
+    assert sink.tell() == 2
+    _commit(sink, "d.jpg", "e.jpg")
+    sink.close()
+    assert _read_filenames(directory) == ["a.jpg", "b.jpg", "d.jpg", "e.jpg"]
+
+def test_rollback_after_recovery_does_not_duplicate_rows(tmp_path):
+    directory = str(tmp_path)
+    sink = ParquetSink(directory, part_rows=2, part_seconds=3600)
+    _commit(sink, "a.jpg")
+    # The journal saves the position, the group is written, and the program dies before complete()
+    position = sink.tell()
+    _commit(sink, "b.jpg", "c.jpg", "d.jpg")
+    sink.close()
+
+    # At the next start, recover() cuts the group off and the images are processed again
+    sink = ParquetSink(directory, part_rows=2, part_seconds=3600)
+    sink.rollback(position)
+    assert _read_filenames(directory) == ["a.jpg"]
+    _commit(sink, "b.jpg", "c.jpg", "d.jpg")
+    sink.close()
+    assert _read_filenames(directory) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+
+def test_rollback_of_a_failed_commit_cuts_the_open_part(tmp_path):
+    directory = str(tmp_path)
+    sink = ParquetSink(directory, part_rows=1000, part_seconds=3600)
+    _commit(sink, "a.jpg")
+    position = sink.tell()
+    _commit(sink, "b.jpg")
+    # Another sink of the same group failed
+    sink.rollback(position)
+    _commit(sink, "c.jpg")
+    sink.close()
+    assert _read_filenames(directory) == ["a.jpg", "c.jpg"]
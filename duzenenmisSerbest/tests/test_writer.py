@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the group commit of DetectionWriter with the processed-file journal."""
+
+import csv
+import time
+import sqlite3
+
+from file_watcher.journal import ProcessedFileJournal
+from result_writer.sinks import CsvSink, SqliteSink
+from result_writer.writer import DetectionWriter
+
+class FailingSink:
+    """A sink whose first write() fails."""
+    name = 'failing'
+
+    def __init__(self):
+        self.failures = 1
+
+    def tell(self):
+        return None
+
+    def rollback(self, position):
+        pass
+
+    def write(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+
+    def flush(self, fsync):
+        pass
+
+    def close(self):
+        pass
+
+def _entry(path):
+    return {'path': path, 'size': 1, 'mtime_ns': 1}
+
+def _record(filename):
+    return (time.time(), filename, 'ucgen', 'kirmizi', 41.0, 29.0)
+
+def _csv_filenames(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row[1] for row in csv.reader(f)][1:]
+
+def _sqlite_filenames(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return [row[0] for row in conn.execute("SELECT filename FROM detections ORDER BY id")]
+    finally:
+        conn.close()
+
+def _pending_count(journal):
+    return journal._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+def test_failed_commit_is_rolled_back(tmp_path):
+    journal = ProcessedFileJournal(str(tmp_path / "journal.sqlite3"))
+    csv_sink = CsvSink(str(tmp_path / "out.csv"))
+    sqlite_sink = SqliteSink(str(tmp_path / "out.sqlite3"))
+    # The CSV and SQLite sinks write before the failing one
+    writer = DetectionWriter([csv_sink, sqlite_sink, FailingSink()], journal, batch_rows=1).start()
+
+    committed = []
+    writer.submit([_record("a.jpg")], [_entry("a.jpg")], lambda: committed.append("a"))
+    writer.submit([_record("b.jpg")], [_entry("b.jpg")], lambda: committed.append("b"))
+    writer.close(timeout=5)
+
+    # The jobs are released either way, but only the successful one is processed
+    assert committed == ["a", "b"]
+    assert not journal.is_processed(_entry("a.jpg"))
+    assert journal.is_processed(_entry("b.jpg"))
+    assert _pending_count(journal) == 0
+    assert _csv_filenames(tmp_path / "out.csv") == ["b.jpg"]
+    assert _sqlite_filenames(tmp_path / "out.sqlite3") == ["b.jpg"]
+
+    # Nothing is left for recover() to cut off at the next start
+    assert journal.recover(lambda positions: None) == 0
+    journal.close()
+
+def test_retry_after_failure_does_not_duplicate_rows(tmp_path):
+    journal = ProcessedFileJournal(str(tmp_path / "journal.sqlite3"))
+    writer = DetectionWriter([CsvSink(str(tmp_path / "out.csv")), FailingSink()], journal, batch_rows=1).start()
+
+    writer.submit([_record("a.jpg"), _record("a.jpg")], [_entry("a.jpg")])
+    # The file is processed again, as the pipeline does after a restart
+    writer.submit([_record("a.jpg"), _record("a.jpg")], [_entry("a.jpg")])
+    writer.close(timeout=5)
+
+    assert journal.is_processed(_entry("a.jpg"))
+    assert _csv_filenames(tmp_path / "out.csv") == ["a.jpg", "a.jpg"]
+    journal.close()
+
+class RecordingSink(FailingSink):
+    """A sink that records the fsync argument of every flush()."""
+
+    def __init__(self):
+        self.failures = 0
+        self.fsyncs = []
+
+    def flush(self, fsync):
+        self.fsyncs.append(fsync)
+
+def test_journaled_commits_are_synced(tmp_path):
+    journal = ProcessedFileJournal(str(tmp_path / "journal.sqlite3"))
+    sink = RecordingSink()
+    writer = DetectionWriter([sink], journal, batch_rows=1, fsync_policy='never').start()
+
+    writer.submit([_record("live")])
+    writer.submit([_record("a.jpg")], [_entry("a.jpg")])
+    writer.close(timeout=5)
+
+    assert sink.fsyncs == [False, True]
+    journal.close()
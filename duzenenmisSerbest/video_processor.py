@@ -1,23 +1,61 @@
 # -*- coding: utf-8 -*- 
 
 """
-This module handles the live video stream. It detects shapes, calculates
+This module handles the live video streams. It detects shapes, calculates
 their GPS coordinates using simulated drone telemetry, and saves the results
 to a CSV file in real-time.
+
+Several sources (e.g. a nadir and an oblique camera) can be processed at
+once. Every source is a LiveStream with its own LatestFrameReader thread,
+so the detection always works on its newest frame and skips the ones it
+was too slow for. A FrameGovernor per stream picks the frame stride and the
+processing scale that meet the frame rate and latency target on the
+current hardware. All streams share one pool of detection threads, which
+take the frames of the streams in turn (see video_stream.scheduler).
+
+Drawing is optional: in headless mode nothing is rendered by the detection
+threads, and the annotated frames can instead be handed to preview outputs
+(MJPEG stream, MP4 recording) that run in their own threads.
+
+With a YUV pixel format (I420/NV12) the frames are detected on directly,
+without any color conversion; they are only converted to BGR when they are
+displayed or previewed.
+
+With detection processes, the detection runs in a pool of worker processes
+instead of threads, so it is not limited to one core by the GIL. The frames
+reach the workers through a shared-memory ring (see video_stream.shared_ring)
+rather than being pickled, and the results of every stream are handled in
+frame order.
 """
 
 import cv2
 import sys
 import os
 import time
-import csv
+import threading
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.util import Finalize
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from shape_detector.detector import SekilTespitEdici
 from gps.calculator import pixel_to_gps
-from config import OUTPUT_CSV, HOME_ALTITUDE
+from gps.clustering import TargetAggregator
+from config import (
+    HOME_ALTITUDE, LIVE_TARGET_FPS, LIVE_TARGET_LATENCY, LIVE_MIN_SCALE, LIVE_REUSE_BUFFERS, LIVE_PROCESS_QUEUE,
+    RECORD_ENCODING
+)
+from metrics.registry import registry, rate_gauge, latency_quantile_gauges
+from video_stream.capture import LatestFrameReader
+from video_stream.governor import FrameGovernor
+from video_stream.preview import visualize_results
+from video_stream.scheduler import StreamScheduler
+from video_stream.recording import FrameRecorder
+from video_stream.shared_ring import SharedFrameRing, attach_frame, detach_all
+from file_watcher.pool import init_pool_worker, worker_detector
 
 # --- SIMULATED DRONE TELEMETRY ---
 # In a real application, this data would come from a MAVLink connection.
@@ -25,101 +63,565 @@ SIMULATED_DRONE_LAT = 41.0082  # Example: Istanbul latitude
 SIMULATED_DRONE_LON = 28.9784  # Example: Istanbul longitude
 SIMULATED_DRONE_ALT = 150.0    # Example: Altitude in meters
 
-def visualize_results(frame, detections):
+video_busy = registry.counter('detector_worker_busy_seconds_total', "Time the detection workers spent working.", {'stage': 'video'})
+
+# Conversions of the YUV frames for display
+_YUV_TO_BGR = {'I420': cv2.COLOR_YUV2BGR_I420, 'NV12': cv2.COLOR_YUV2BGR_NV12}
+
+def detect_scaled(shape_detector, frame, scale, area_scale=1.0):
     """
-    Draws the detected shapes onto the video frame.
+    Detects the shapes on a downscaled copy of the frame.
+    Args:
+        scale (float): Downscaling factor applied here.
+        area_scale (float): Pixel area of the frame relative to the sensor image,
+                            if it was already scaled in the pipeline.
+    Returns:
+        list: The detections, with their centers in the coordinates of the full frame.
     """
-    if not detections:
-        return frame
+    if scale >= 1.0:
+        shape_detector.area_scale = area_scale
+        return shape_detector.kirmizi_ucgenleri_bul(frame) + shape_detector.mavi_altigenleri_bul(frame)
 
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    shape_detector.area_scale = area_scale * scale * scale
+    detections = shape_detector.kirmizi_ucgenleri_bul(small) + shape_detector.mavi_altigenleri_bul(small)
     for detection in detections:
-        center = detection['merkez']
-        color_str = detection['renk']
-        shape_str = detection['sekil']
-        
-        draw_color = (255, 0, 0) if color_str == 'mavi' else (0, 0, 255)
-
-        cv2.circle(frame, center, 10, draw_color, 2)
-        
-        text = f"{color_str.upper()} {shape_str.upper()}"
-        cv2.putText(frame, text, (center[0] - 40, center[1] - 15), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, draw_color, 2)
-    
-    return frame
-
-def start_video_stream(pipeline):
+        center_x, center_y = detection['merkez']
+        detection['merkez'] = (int(center_x / scale), int(center_y / scale))
+    return detections
+
+def _detect(shape_detector, frame, pixel_format, scale, area_scale):
+    """Detects the shapes in a BGR frame at the given scale, or in a YUV frame at full scale."""
+    if pixel_format != 'BGR':
+        shape_detector.area_scale = area_scale
+        return shape_detector.yuv_sekilleri_bul(frame, pixel_format)
+    return detect_scaled(shape_detector, frame, scale, area_scale)
+
+def _init_detect_process():
+    init_pool_worker(reuse_buffers=True, single_threaded=True)
+    # The worker exits through multiprocessing, which runs its finalizers but not atexit
+    Finalize(None, detach_all, exitpriority=0)
+
+def _detect_in_process(stream_name, ring_name, slot, shape, dtype, pixel_format, scale, area_scale):
+    """
+    Detects the shapes in a frame of a SharedFrameRing. Runs in a detection process.
+    Returns:
+        tuple: (detections, busy_seconds)
+    """
+    start = time.perf_counter()
+    frame = attach_frame(ring_name, slot, shape, dtype, owner=stream_name)
+    detections = _detect(worker_detector(), frame, pixel_format, scale, area_scale)
+    return detections, time.perf_counter() - start
+
+class LiveStream:
+    """
+    One video source of the live mode, with its own capture thread, governor,
+    detector and metrics (labelled with the stream name).
+    """
+
+    def __init__(self, name, pipeline, geometry=None, pixel_format='BGR', target_fps=LIVE_TARGET_FPS,
+                 target_latency=LIVE_TARGET_LATENCY, min_scale=LIVE_MIN_SCALE, record_name=None,
+                 capture=None, record_path=None, record_encoding=RECORD_ENCODING, reuse_buffers=LIVE_REUSE_BUFFERS):
+        """
+        Args:
+            name (str): Name of the stream in the metrics and messages.
+            pipeline (str): The GStreamer pipeline of the video source.
+            geometry (FrameGeometry): How the delivered frames were cropped and scaled
+                                      in the pipeline; None if they are full sensor frames.
+            pixel_format (str): Format the pipeline delivers ('BGR', 'I420' or 'NV12').
+                                YUV frames are always processed at full scale; the
+                                governor then only adjusts the stride.
+            target_fps (float): Frames per second to process.
+            target_latency (float): Max. processing seconds per frame (default: 1 / target_fps).
+            min_scale (float): Smallest processing scale the governor may choose.
+            record_name (str): Filename column of the detection records; the stream name if None.
+            capture: An opened capture to read instead of the pipeline, e.g. a
+                     ReplayCapture. If it replays without dropping frames, every
+                     frame is processed at full scale, so the results do not
+                     depend on the timing.
+            record_path (str): Record the captured frames and telemetry to this
+                               file (see video_stream.recording).
+            record_encoding (str): 'raw', 'png' or 'jpg'.
+            reuse_buffers (bool): Read the frames into a ring of preallocated arrays
+                                  and let the detector reuse its intermediate images,
+                                  instead of allocating them for every frame.
+        """
+        self.name = name
+        self.pipeline = pipeline
+        self.capture = capture
+        self.record_path = record_path
+        self.record_encoding = record_encoding
+        self.reuse_buffers = reuse_buffers
+        self.geometry = geometry
+        self.pixel_format = pixel_format
+        self.yuv = pixel_format != 'BGR'
+        self.record_name = record_name or name
+        self.reader = None
+        # A stream processes one frame at a time, so its detector's buffers are never shared
+        self.shape_detector = SekilTespitEdici(reuse_buffers=reuse_buffers)
+        if getattr(capture, 'lossless', False):
+            self.governor = FrameGovernor(target_fps, target_latency, min_scale=1.0, max_scale=1.0,
+                                          max_stride=1, stream=name)
+        elif self.yuv:
+            self.governor = FrameGovernor(target_fps, target_latency, min_scale=1.0, max_scale=1.0, stream=name)
+        else:
+            self.governor = FrameGovernor(target_fps, target_latency, min_scale, stream=name)
+
+        labels = {'stream': name}
+        self.frames_done = registry.counter('detector_frames_total', "Video frames processed.", labels)
+        self.detections_found = registry.counter(
+            'detector_detections_total', "Shapes detected.", dict(labels, mode='video')
+        )
+        self.latency = registry.histogram(
+            'detector_latency_seconds',
+            "Time from discovery (folder) or capture (video) until the results are committed.",
+            dict(labels, mode='video')
+        )
+        rate_gauge(self.frames_done, 'detector_frames_per_second', "Video frames processed per second (last 10 s).")
+        rate_gauge(self.detections_found, 'detector_detections_per_second', "Shapes detected per second (last 10 s).")
+        latency_quantile_gauges(self.latency, 'detector_latency_quantile_seconds', "Latency percentiles of the last minute.")
+
+    def open(self, condition=None):
+        """
+        Opens the pipeline and starts the capture thread.
+        Args:
+            condition (threading.Condition): Condition shared with the other streams' readers.
+        Returns:
+            bool: False if the pipeline could not be opened.
+        """
+        if self.capture is not None:
+            cap = self.capture
+            if not cap.isOpened():
+                return False
+        else:
+            print(f"[INFO] Using GStreamer pipeline ({self.name}): {self.pipeline}")
+            cap = cv2.VideoCapture(self.pipeline, cv2.CAP_GSTREAMER)
+            if not cap.isOpened():
+                print(f"[ERROR] Could not open video source '{self.name}' with the provided GStreamer pipeline.")
+                return False
+            if self.yuv:
+                # Hand over the YUV planes as they are instead of converting them to BGR
+                cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        recorder = None
+        if self.record_path:
+            recorder = FrameRecorder(
+                self.record_path, self.record_encoding, telemetry=self.telemetry, stream=self.name
+            ).start()
+        self.reader = LatestFrameReader(
+            cap, stream=self.name, condition=condition, recorder=recorder, reuse_buffers=self.reuse_buffers
+        ).start()
+        return True
+
+    def telemetry(self):
+        """
+        Returns:
+            tuple: (latitude, longitude, altitude) of the drone; altitude above sea level.
+        """
+        return SIMULATED_DRONE_LAT, SIMULATED_DRONE_LON, SIMULATED_DRONE_ALT
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.stop()
+
+    @property
+    def area_scale(self):
+        """Pixel area of the delivered frames relative to the sensor image."""
+        return self.geometry.area_scale if self.geometry is not None else 1.0
+
+    def process(self, captured_at, frame, info=None):
+        """
+        Detects the shapes in a frame and calculates their GPS coordinates.
+        Args:
+            info (tuple): Recorded (capture time, telemetry) of a replayed frame;
+                          used instead of the current time and telemetry.
+        Returns:
+            tuple: (detections, records); the records carry the capture time of the frame.
+        """
+        # Detect shapes at the scale chosen by the governor
+        detections = _detect(self.shape_detector, frame, self.pixel_format, self.governor.scale, self.area_scale)
+        return detections, self.georeference(detections, captured_at, frame.shape, info)
+
+    def georeference(self, detections, captured_at, frame_shape, info=None):
+        """
+        Calculates the GPS coordinates of the shapes detected in a frame and counts the frame.
+        Args:
+            frame_shape (tuple): Shape of the frame the shapes were detected in.
+            info (tuple): See process().
+        Returns:
+            list: The detection records.
+        """
+        record_time, telemetry = captured_at, None
+        if info is not None:
+            record_time, telemetry = info
+        drone_lat, drone_lon, drone_alt = telemetry or self.telemetry()
+
+        geometry = self.geometry
+        if geometry is not None:
+            image_width, image_height = geometry.sensor_width, geometry.sensor_height
+        elif self.yuv:
+            image_height, image_width = frame_shape[0] * 2 // 3, frame_shape[1]
+        else:
+            image_height, image_width = frame_shape[:2]
+
+        # Calculate flight altitude relative to home
+        flight_altitude = drone_alt - HOME_ALTITUDE
+
+        records = []
+        for detection in detections:
+            center_x, center_y = detection['merkez']
+            if geometry is not None:
+                # The frame may be a cropped and scaled part of the sensor image
+                center_x, center_y = geometry.to_sensor(center_x, center_y)
+
+            # Calculate GPS coordinate for the detected shape
+            latitude, longitude = pixel_to_gps(
+                center_x, center_y, image_width, image_height,
+                drone_lat, drone_lon, flight_altitude
+            )
+            records.append((record_time, self.record_name, detection['sekil'], detection['renk'], latitude, longitude))
+
+        self.frames_done.inc()
+        self.detections_found.inc(len(records))
+        return records
+
+    def display_frame(self, frame, copy=False):
+        """
+        Returns the frame as BGR, for the window and the previews; a copy if
+        the reader reuses the frame's buffer.
+        Args:
+            copy (bool): Copy the frame anyway, because its buffer is reused elsewhere.
+        """
+        if self.yuv:
+            return cv2.cvtColor(frame, _YUV_TO_BGR[self.pixel_format])
+        return frame.copy() if copy or self.reuse_buffers else frame
+
+class _LatestDisplay:
+    """The newest annotated frame of every stream, for the windows of the main thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = {}
+
+    def put(self, name, frame, detections):
+        with self._lock:
+            self._frames[name] = (frame, detections)
+
+    def take_all(self):
+        with self._lock:
+            frames, self._frames = self._frames, {}
+        return frames.items()
+
+class _Outputs:
+    """
+    Where the results of the processed frames go: the target aggregator and
+    the writer, the previews (first stream only) and the windows.
     """
-    Initializes and processes the video stream, performs detection,
+
+    def __init__(self, writer, aggregator, previews, preview_stream, display):
+        self.writer = writer
+        self.aggregator = aggregator
+        # The aggregator is shared by all workers
+        self.aggregator_lock = threading.Lock()
+        self.previews = previews
+        self.preview_stream = preview_stream
+        self.display = display
+
+    def publish(self, stream, captured_at, detections, records, frame, copy=False):
+        """
+        Args:
+            frame (numpy.ndarray): The processed frame, for the previews and the window.
+            copy (bool): The frame's buffer is reused afterwards (see LiveStream.display_frame()).
+        """
+        # If shapes are detected, save them
+        if records:
+            if self.aggregator is not None:
+                # Only new or refined targets are written, not every sighting.
+                # The aggregator is shared, so a target seen by several cameras is one target;
+                # its records name the cameras that saw it.
+                with self.aggregator_lock:
+                    records = self.aggregator.add(records)
+
+            # The writer commits them in groups, so the workers never wait for the disk
+            if records:
+                def committed(stream=stream, captured_at=captured_at):
+                    stream.latency.observe(time.time() - captured_at)
+                self.writer.submit(records, on_commit=committed)
+
+        previewed = self.previews and stream is self.preview_stream
+        if previewed or self.display is not None:
+            frame = stream.display_frame(frame, copy)
+        # The previews draw in their own threads and skip frames if they fall behind
+        if previewed:
+            for preview in self.previews:
+                preview.offer(frame, detections)
+        if self.display is not None:
+            self.display.put(stream.name, frame, detections)
+
+def _detection_worker(scheduler, outputs):
+    """
+    Processes frames of any stream until the scheduler is stopped.
+    Runs in the shared pool of detection threads.
+    """
+    while True:
+        item = scheduler.next_frame()
+        if item is None:
+            break
+        stream, _, captured_at, frame, info = item
+        try:
+            work_started = time.perf_counter()
+            detections, records = stream.process(captured_at, frame, info)
+            outputs.publish(stream, captured_at, detections, records, frame)
+            processing_seconds = time.perf_counter() - work_started
+            video_busy.inc(processing_seconds)
+            stream.governor.update(processing_seconds)
+        except Exception as e:
+            print(f"[ERROR] Processing a frame of '{stream.name}' failed: {e}")
+        finally:
+            scheduler.done(stream)
+
+class _ProcessDetection:
+    """
+    Detects the frames of all streams in a pool of worker processes.
+
+    A dispatcher thread copies every frame handed out by the scheduler into
+    a SharedFrameRing of its stream and sends the slot index to a worker.
+    Several frames of a stream may be in work at once; a collector thread
+    georeferences and publishes their results in frame order and releases
+    the slots.
+    """
+
+    def __init__(self, scheduler, outputs, processes):
+        self.scheduler = scheduler
+        self.outputs = outputs
+        self.processes = processes
+        # Frames dispatched and not yet published; every ring has a slot for each of them
+        self.capacity = processes * LIVE_PROCESS_QUEUE
+        self._capacity = threading.Semaphore(self.capacity)
+        self._rings = {}
+        self._old_rings = []
+        self._pending = {stream.name: collections.deque() for stream in scheduler.streams}
+        self._in_work = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads = []
+        # The processes are started right away, so they are forked before any capture thread runs.
+        # The resource tracker is started first, so the processes share it and do not free the rings themselves.
+        resource_tracker.ensure_running()
+        self._executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_detect_process)
+        self._executor.submit(os.getpid).result()
+
+    def start(self):
+        """Starts dispatching the frames; call once the streams are open."""
+        self._threads = [
+            threading.Thread(target=self._dispatch, daemon=True),
+            threading.Thread(target=self._collect, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def idle(self):
+        """Returns True if no frame is in work."""
+        with self._condition:
+            return self._in_work == 0
+
+    def _ring(self, stream, frame):
+        ring = self._rings.get(stream.name)
+        if ring is None or not ring.fits(frame):
+            if ring is not None:
+                # The source changed its resolution; frames of the old ring may still be in work
+                with self._condition:
+                    if ring.idle():
+                        ring.close()
+                    else:
+                        self._old_rings.append(ring)
+            ring = SharedFrameRing(self.capacity, frame.shape, frame.dtype)
+            self._rings[stream.name] = ring
+        return ring
+
+    def _dispatch(self):
+        while True:
+            # Take a frame only once it can be sent; until then the reader keeps replacing it by newer ones
+            self._capacity.acquire()
+            item = self.scheduler.next_frame()
+            if item is None:
+                break
+            stream, _, captured_at, frame, info = item
+            try:
+                ring = self._ring(stream, frame)
+                slot = ring.acquire()
+                ring.write(slot, frame)
+                with self._condition:
+                    self._in_work += 1
+            except Exception as e:
+                print(f"[ERROR] Passing a frame of '{stream.name}' to the detection processes failed: {e}")
+                self._capacity.release()
+                continue
+            finally:
+                # The frame was copied, so the stream's next one can be taken
+                self.scheduler.done(stream)
+
+            future = self._executor.submit(
+                _detect_in_process, stream.name, ring.name, slot, ring.shape, ring.dtype.str,
+                stream.pixel_format, stream.governor.scale, stream.area_scale
+            )
+            with self._condition:
+                self._pending[stream.name].append((future, ring, slot, captured_at, info))
+            future.add_done_callback(self._completed)
+
+    def _completed(self, future):
+        with self._condition:
+            self._condition.notify_all()
+
+    def _ready(self):
+        """Takes the finished frames that are next in their stream's order."""
+        ready = []
+        for stream in self.scheduler.streams:
+            pending = self._pending[stream.name]
+            while pending and pending[0][0].done():
+                ready.append((stream, pending.popleft()))
+        return ready
+
+    def _free_old_ring(self, ring):
+        """
+        Closes a replaced ring once none of its frames is in work anymore.
+        Call with self._condition held.
+        """
+        if ring in self._old_rings and ring.idle():
+            self._old_rings.remove(ring)
+            ring.close()
+
+    def _collect(self):
+        while True:
+            with self._condition:
+                ready = self._ready()
+                while not ready:
+                    if self._stopped and self._in_work == 0:
+                        return
+                    self._condition.wait()
+                    ready = self._ready()
+            for stream, (future, ring, slot, captured_at, info) in ready:
+                try:
+                    detections, busy_seconds = future.result()
+                    records = stream.georeference(detections, captured_at, ring.shape, info)
+                    self.outputs.publish(stream, captured_at, detections, records, ring.array(slot), copy=True)
+                    video_busy.inc(busy_seconds)
+                    stream.governor.update(busy_seconds)
+                except Exception as e:
+                    print(f"[ERROR] Processing a frame of '{stream.name}' failed: {e}")
+                finally:
+                    ring.release(slot)
+                    with self._condition:
+                        self._free_old_ring(ring)
+                        self._in_work -= 1
+                        self._condition.notify_all()
+                    self._capacity.release()
+
+    def stop(self):
+        """
+        Stops dispatching, publishes the results of the frames still in work
+        and frees the processes and the shared memory. Call after scheduler.stop().
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        # Wakes up the dispatcher if it waits for a free slot
+        self._capacity.release()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._executor.shutdown(cancel_futures=True)
+        for ring in list(self._rings.values()) + self._old_rings:
+            ring.close()
+
+def start_video_stream(streams, writer, workers=1, headless=False, previews=(), aggregate=True, processes=0):
+    """
+    Initializes and processes the video streams, performs detection,
     calculates GPS, and saves results.
+    Args:
+        streams (list): The LiveStream objects of the sources.
+        writer (DetectionWriter): The shared writer the detections are submitted to.
+        workers (int): Number of detection threads shared by all streams.
+        headless (bool): If True, no window is opened and nothing is drawn here.
+        previews (list): Started preview outputs (see video_stream.preview)
+                         that receive every processed frame of the first
+                         stream; closed on exit.
+        aggregate (bool): If True, sightings are merged into targets and only
+                          confirmed or refined targets are written (see
+                          gps.clustering); otherwise every detection is written.
+        processes (int): If > 0, detect in this many worker processes that read
+                         the frames from shared memory, instead of in threads.
     """
-    print(f"[INFO] Using GStreamer pipeline: {pipeline}")
-    cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
-    
-    if not cap.isOpened():
-        print("[ERROR] Could not open video source with the provided GStreamer pipeline.")
-        return
-
-    print("[INFO] Video stream started. Press 'q' to exit.")
-    
-    shape_detector = SekilTespitEdici()
-    
-    # Open the CSV file for writing
-    csv_file = None
+    scheduler = StreamScheduler(streams)
+    opened = []
+    threads = []
+    detection = None
+    started = None
     try:
-        csv_file = open(OUTPUT_CSV, "a", newline="", encoding='utf-8')
-        csv_writer = csv.writer(csv_file)
-        
+        aggregator = TargetAggregator(tag_sources=len(streams) > 1) if aggregate else None
+        display = None if headless else _LatestDisplay()
+        outputs = _Outputs(writer, aggregator, previews, streams[0], display)
+        if processes > 0:
+            # Created before the streams are opened, see _ProcessDetection.__init__()
+            detection = _ProcessDetection(scheduler, outputs, processes)
+            workers = processes
+
+        for stream in streams:
+            if not stream.open(scheduler.condition):
+                return
+            opened.append(stream)
+
+        if headless:
+            print(f"[INFO] {len(streams)} video stream(s) started in headless mode. Press Ctrl+C to exit.")
+        else:
+            print(f"[INFO] {len(streams)} video stream(s) started. Press 'q' to exit.")
+
+        registry.gauge(
+            'detector_worker_utilization', "Share of time the detection workers were busy (last 10 s, 0..1).",
+            {'stage': 'video'}, lambda: video_busy.rate() / workers
+        )
+        if detection is not None:
+            detection.start()
+        else:
+            threads = [
+                threading.Thread(target=_detection_worker, args=(scheduler, outputs), daemon=True)
+                for _ in range(workers)
+            ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+
         while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("[WARNING] Failed to grab frame.")
-                time.sleep(0.5)
+            if scheduler.finished() and (detection is None or detection.idle()):
+                print("[INFO] All sources have ended.")
+                break
+            if headless:
+                time.sleep(0.1)
                 continue
-
-            image_height, image_width, _ = frame.shape
-            
-            # Calculate flight altitude relative to home
-            flight_altitude = SIMULATED_DRONE_ALT - HOME_ALTITUDE
-
-            # Detect shapes
-            red_triangles = shape_detector.kirmizi_ucgenleri_bul(frame)
-            blue_hexagons = shape_detector.mavi_altigenleri_bul(frame)
-            all_detections = red_triangles + blue_hexagons
-
-            # If shapes are detected, process and save them
-            if all_detections:
-                for detection in all_detections:
-                    center_x, center_y = detection['merkez']
-                    
-                    # Calculate GPS coordinate for the detected shape
-                    latitude, longitude = pixel_to_gps(
-                        center_x, center_y, image_width, image_height,
-                        SIMULATED_DRONE_LAT, SIMULATED_DRONE_LON, flight_altitude
-                    )
-                    
-                    # Write the result to the CSV file
-                    csv_writer.writerow([
-                        time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "live_video",  # Filename placeholder
-                        detection['sekil'],
-                        detection['renk'],
-                        f"{latitude:.7f}",
-                        f"{longitude:.7f}"
-                    ])
-                
-                # Ensure data is written to disk immediately
-                csv_file.flush()
-
-            # Visualize the results on the frame
-            visualized_frame = visualize_results(frame, all_detections)
-            cv2.imshow("Live Detection System", visualized_frame)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            for name, (frame, detections) in display.take_all():
+                # Visualize the results on the frame; the previews draw on their own copies
+                title = "Live Detection System" if len(streams) == 1 else f"Live Detection System - {name}"
+                cv2.imshow(title, visualize_results(frame.copy() if previews else frame, detections))
+            if cv2.waitKey(10) & 0xFF == ord('q'):
                 break
     finally:
             # Release resources
-            if csv_file:
-                csv_file.close()
-            cap.release()
-            cv2.destroyAllWindows()
+            scheduler.stop()
+            for thread in threads:
+                thread.join(timeout=2)
+            if detection is not None:
+                detection.stop()
+            for stream in opened:
+                stream.close()
+            if started is not None:
+                # Throughput per stream, e.g. to compare replays of the same recording
+                elapsed = time.monotonic() - started
+                for stream in opened:
+                    frames = int(stream.frames_done.value())
+                    print(f"[INFO] {stream.name}: {frames} frames processed in {elapsed:.1f}s "
+                          f"({frames / elapsed:.1f} fps), {stream.reader.dropped} dropped, "
+                          f"{(stream.governor.processing_time or 0.0) * 1000:.1f} ms per frame")
+            for preview in previews:
+                preview.close()
+            if not headless:
+                cv2.destroyAllWindows()
             print("\n[INFO] Video stream and resources closed.")
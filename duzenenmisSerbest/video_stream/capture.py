@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+Latest-frame capture reader for the live video mode.
+
+When detection is slower than the camera, reading frames inline lets them
+pile up in the GStreamer/RTSP buffers, and every processed frame is older
+than the one before. LatestFrameReader reads the camera in its own thread
+and keeps only the most recent frame; frames that are replaced before the
+detection loop takes them are counted as dropped. The latency from capture
+to result therefore stays at about one detection time.
+
+Several readers can share one condition, so that the detection workers of
+the multi-stream mode can wait for a new frame of any stream at once.
+
+With reuse_buffers, frames are read with cap.read(image) into a ring of
+POOL_FRAMES preallocated arrays instead of a new array per frame. A frame
+handed out is then only valid until the consumer takes the next one, so
+anything that keeps a frame longer (previews, the recorder) gets a copy.
+
+Every captured frame can also be handed to a FrameRecorder. A capture that
+sets 'lossless' (a ReplayCapture replaying as fast as possible) is only
+read once the previous frame was taken, so no frame is dropped.
+"""
+
+import os
+import sys
+import time
+import threading
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics.registry import registry, rate_gauge
+
+# Frames of the ring: the one being processed, the newest waiting one and the one being read
+POOL_FRAMES = 3
+
+class LatestFrameReader:
+    """
+    Reads a cv2.VideoCapture in a background thread and hands out only the newest frame.
+    """
+
+    def __init__(self, cap, retry_delay=0.5, stream="video", condition=None, recorder=None, reuse_buffers=False):
+        """
+        Args:
+            cap (cv2.VideoCapture): An opened capture; released by stop().
+            retry_delay (float): Seconds to wait after a failed grab.
+            stream (str): Label of the stream in the metrics and messages.
+            condition (threading.Condition): Condition notified on every new frame,
+                                             shared with other readers; a private
+                                             one if None.
+            recorder (FrameRecorder): Records every captured frame; closed by stop().
+            reuse_buffers (bool): Read into a ring of preallocated frames. A returned
+                                  frame is then only valid until the next read()/take().
+        """
+        self.cap = cap
+        self.retry_delay = retry_delay
+        self.stream = stream
+        self.recorder = recorder
+        self.lossless = getattr(cap, 'lossless', False)
+        self.dropped = 0
+        self.ended = False       # Set when a capture with an end (a replay) has no more frames
+        self._condition = condition or threading.Condition()
+        self._frame = None
+        self._info = None
+        self._pool = [None] * POOL_FRAMES if reuse_buffers else None
+        self._latest_slot = None   # Ring slot of the newest frame
+        self._handed_slot = None   # Ring slot of the frame handed out last
+        self._seq = 0            # Sequence number of the newest frame
+        self._timestamp = None
+        self._consumed_seq = 0   # Sequence number of the last frame handed out
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+        labels = {'stream': stream}
+        self._frames_captured = registry.counter(
+            'detector_frames_captured_total', "Frames read from the video source.", labels
+        )
+        self._frames_dropped = registry.counter(
+            'detector_frames_dropped_total', "Frames replaced by a newer one before they were processed.", labels
+        )
+        rate_gauge(self._frames_dropped, 'detector_frames_dropped_per_second', "Frames dropped per second (last 10 s).")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped:
+            if self.lossless:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._consumed_seq >= self._seq or self._stopped)
+            if self._pool is None:
+                ret, frame = self.cap.read()
+            else:
+                with self._condition:
+                    slot = next(index for index in range(POOL_FRAMES)
+                                if index not in (self._latest_slot, self._handed_slot))
+                # The capture reallocates the array only if the resolution changed
+                ret, frame = self.cap.read(self._pool[slot]) if self._pool[slot] is not None else self.cap.read()
+                if ret:
+                    self._pool[slot] = frame
+            if not ret:
+                if getattr(self.cap, 'end_of_stream', False):
+                    with self._condition:
+                        self.ended = True
+                        self._condition.notify_all()
+                    break
+                print(f"[WARNING] Failed to grab frame ({self.stream}).")
+                time.sleep(self.retry_delay)
+                continue
+
+            timestamp = time.time()
+            self._frames_captured.inc()
+            if self.recorder is not None:
+                self.recorder.add(timestamp, frame if self._pool is None else frame.copy())
+            with self._condition:
+                if self._frame is not None and self._consumed_seq < self._seq:
+                    self.dropped += 1
+                    self._frames_dropped.inc()
+                self._seq += 1
+                self._frame = frame
+                if self._pool is not None:
+                    self._latest_slot = slot
+                self._timestamp = timestamp
+                # Recorded capture time and telemetry, if the capture replays a recording
+                self._info = getattr(self.cap, 'frame_info', None)
+                self._condition.notify_all()
+
+    def read(self, timeout=None):
+        """
+        Waits for a frame newer than the last one returned.
+        Args:
+            timeout (float): Max. seconds to wait, None to wait until a frame arrives.
+        Returns:
+            tuple: (seq, timestamp, frame, info) of the newest frame, where seq
+                   counts all captured frames (gaps are dropped frames), timestamp
+                   is the time.time() of its capture and info the recorded
+                   (capture time, telemetry) of a replayed frame, otherwise None;
+                   None on timeout or after stop().
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > self._consumed_seq or self._stopped, timeout)
+            return self.take()
+
+    def take(self):
+        """
+        Like read(), but returns None at once if there is no new frame.
+        """
+        with self._condition:
+            if self._seq <= self._consumed_seq or self._stopped:
+                return None
+            self._consumed_seq = self._seq
+            self._handed_slot = self._latest_slot
+            self._condition.notify_all()
+            return self._seq, self._timestamp, self._frame, self._info
+
+    def pending(self):
+        """Returns True if there is a frame that was not returned yet."""
+        with self._condition:
+            return self._seq > self._consumed_seq
+
+    def stop(self):
+        """Stops the capture thread and releases the capture."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(timeout=2)
+        self.cap.release()
+        if self.recorder is not None:
+            self.recorder.close()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Adaptive frame-rate and resolution governor for the live video mode.
+
+The same program runs on a Raspberry Pi and on a laptop, so fixed settings
+are either too slow for one or wasteful on the other. FrameGovernor measures
+how long each frame takes to process and adjusts two knobs:
+
+- scale:  Frames are downscaled by this factor before detection. It is
+          lowered when the processing time exceeds the per-frame budget and
+          raised again when there is plenty of headroom.
+- stride: Only every Nth captured frame is processed, so that no more than
+          the target frame rate is processed when the camera delivers more.
+          Once the scale is at its minimum and a frame still takes longer
+          than the budget, the stride is multiplied by the overload
+          (processing time / budget, rounded up), so the detector keeps up
+          with the frames it takes instead of falling behind. The factor
+          shrinks again with the processing time, before the scale is raised.
+
+The current settings are reported in the metrics.
+"""
+
+import os
+import sys
+import math
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LIVE_TARGET_FPS, LIVE_TARGET_LATENCY, LIVE_MIN_SCALE, LIVE_MAX_SCALE, LIVE_MAX_STRIDE
+from metrics.registry import registry
+
+# Smoothing factor of the moving averages
+SMOOTHING = 0.2
+# Processed frames between two scale changes, so the effect of one is measured before the next
+ADJUST_EVERY = 10
+# Factor of a single scale step
+SCALE_STEP = 0.85
+# The scale is raised only if the processing time is below this share of the budget
+HEADROOM = 0.6
+
+class FrameGovernor:
+    """
+    Chooses which frames to process and at which scale, to meet a frame rate
+    and latency target.
+    """
+
+    def __init__(self, target_fps=LIVE_TARGET_FPS, target_latency=LIVE_TARGET_LATENCY,
+                 min_scale=LIVE_MIN_SCALE, max_scale=LIVE_MAX_SCALE, max_stride=LIVE_MAX_STRIDE,
+                 stream="video"):
+        """
+        Args:
+            target_fps (float): Frames per second to process.
+            target_latency (float): Max. processing seconds per frame; defaults
+                                    to 1 / target_fps.
+            min_scale (float), max_scale (float): Limits of the processing scale.
+            max_stride (int): Largest stride.
+            stream (str): Label of the stream in the metrics.
+        """
+        self.target_fps = target_fps
+        self.budget = target_latency if target_latency else 1.0 / target_fps
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.max_stride = max_stride
+        self.scale = max_scale
+        self.stride = 1
+        self._rate_stride = 1        # Stride from the source and target frame rates
+        self._load_stride = 1        # Factor for a detector too slow even at min_scale
+        self.processing_time = None  # Moving average of the processing seconds per frame
+        self.source_fps = None       # Moving average of the frame rate of the source
+        self._last_seen = None       # (seq, timestamp) of the last frame offered
+        self._next_seq = 0
+        self._since_adjust = 0
+
+        labels = {'stream': stream}
+        registry.gauge('detector_governor_scale', "Processing scale chosen by the governor.",
+                       labels, lambda: self.scale)
+        registry.gauge('detector_governor_stride', "Only every Nth frame is processed.",
+                       labels, lambda: self.stride)
+        registry.gauge('detector_governor_processing_seconds', "Average processing time per frame.",
+                       labels, lambda: self.processing_time or 0.0)
+        registry.gauge('detector_governor_budget_seconds', "Processing time target per frame.",
+                       labels, lambda: self.budget)
+
+    def should_process(self, seq, timestamp):
+        """
+        Called for every frame taken from the reader.
+        Args:
+            seq (int), timestamp (float): Sequence number and capture time of the frame.
+        Returns:
+            bool: True if the frame should be processed, False if it is skipped by the stride.
+        """
+        if self._last_seen is not None:
+            last_seq, last_timestamp = self._last_seen
+            if seq > last_seq and timestamp > last_timestamp:
+                fps = (seq - last_seq) / (timestamp - last_timestamp)
+                self.source_fps = fps if self.source_fps is None else (
+                    self.source_fps + SMOOTHING * (fps - self.source_fps)
+                )
+                self._rate_stride = max(1, math.floor(self.source_fps / self.target_fps + 0.05))
+                self._update_stride()
+        self._last_seen = (seq, timestamp)
+
+        if seq < self._next_seq:
+            return False
+        self._next_seq = seq + self.stride
+        return True
+
+    def _update_stride(self):
+        self.stride = min(self.max_stride, self._rate_stride * self._load_stride)
+
+    def update(self, processing_seconds):
+        """
+        Records the processing time of a frame and adjusts the scale, or the
+        stride if the scale is at its minimum, if needed.
+        """
+        if self.processing_time is None:
+            self.processing_time = processing_seconds
+        else:
+            self.processing_time += SMOOTHING * (processing_seconds - self.processing_time)
+
+        self._since_adjust += 1
+        if self._since_adjust < ADJUST_EVERY:
+            return
+
+        if self.processing_time > self.budget and self.scale > self.min_scale:
+            self._set_scale(self.scale * SCALE_STEP)
+        elif self._load_stride > 1 or (self.processing_time > self.budget and self.scale <= self.min_scale):
+            # Smaller frames are not allowed; process fewer of them
+            self._set_load_stride(max(1, math.ceil(self.processing_time / self.budget)))
+        elif self.processing_time < self.budget * HEADROOM and self.scale < self.max_scale:
+            self._set_scale(self.scale / SCALE_STEP)
+
+    def _set_load_stride(self, load_stride):
+        if load_stride != self._load_stride:
+            print(f"[INFO] Governor: {self.processing_time * 1000:.0f} ms per frame at the minimum scale "
+                  f"(budget {self.budget * 1000:.0f} ms), load stride {self._load_stride} -> {load_stride}")
+            self._load_stride = load_stride
+            self._update_stride()
+        self._since_adjust = 0
+
+    def _set_scale(self, scale):
+        scale = round(max(self.min_scale, min(self.max_scale, scale)), 3)
+        if scale != self.scale:
+            print(f"[INFO] Governor: {self.processing_time * 1000:.0f} ms per frame "
+                  f"(budget {self.budget * 1000:.0f} ms), processing scale {self.scale:g} -> {scale:g}")
+            self.scale = scale
+        self._since_adjust = 0
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+GStreamer pipeline builders for the live video mode.
+
+Cropping and downscaling are done inside the pipeline (videocrop and
+videoscale run in GStreamer's own threads), so Python only receives the
+pixels it actually processes. The appsink keeps at most one buffer and
+drops older ones, so a slow consumer never builds up a backlog.
+
+FrameGeometry describes how the delivered frames relate to the sensor
+image, and maps detections back to sensor coordinates for georeferencing.
+
+The frames are delivered as BGR by default. With pixel_format 'I420' or
+'NV12' they are handed over in the decoder's own YUV layout instead;
+videoconvert then passes them through unchanged when the decoder already
+produces that layout, and the detector works on the YUV planes directly.
+"""
+
+# Pixel formats the pipelines can deliver
+PIXEL_FORMATS = ('BGR', 'I420', 'NV12')
+
+class FrameGeometry:
+    """
+    Relation between the frames delivered to Python and the full sensor image.
+    """
+
+    def __init__(self, sensor_size, process_size=None, crop=None):
+        """
+        Args:
+            sensor_size (tuple): (width, height) of the image the source delivers.
+            process_size (tuple): (width, height) the (cropped) image is scaled
+                                  to, or None to keep its size.
+            crop (tuple): (left, top, width, height) region of interest in sensor
+                          pixels, or None for the whole image.
+        Raises:
+            ValueError: If the crop region is not inside the sensor image.
+        """
+        self.sensor_width, self.sensor_height = sensor_size
+        self.crop = crop or (0, 0, self.sensor_width, self.sensor_height)
+        left, top, width, height = self.crop
+        if left < 0 or top < 0 or width <= 0 or height <= 0 \
+                or left + width > self.sensor_width or top + height > self.sensor_height:
+            raise ValueError(f"Crop region {self.crop} is outside the {self.sensor_width}x{self.sensor_height} image")
+        self.process_width, self.process_height = process_size or (width, height)
+        # Pixel area of the delivered frames relative to the sensor image, for the detector's thresholds
+        self.area_scale = (self.process_width * self.process_height) / (width * height)
+
+    def gst_elements(self):
+        """
+        Returns:
+            str: The videocrop/videoscale part of a pipeline (ending with ' ! '),
+                 or an empty string if the frames are delivered unchanged.
+        """
+        left, top, width, height = self.crop
+        elements = ""
+        if (left, top, width, height) != (0, 0, self.sensor_width, self.sensor_height):
+            elements += (
+                f"videocrop left={left} top={top} "
+                f"right={self.sensor_width - left - width} bottom={self.sensor_height - top - height} ! "
+            )
+        if (self.process_width, self.process_height) != (width, height):
+            elements += f"videoscale ! video/x-raw, width={self.process_width}, height={self.process_height} ! "
+        return elements
+
+    def to_sensor(self, x, y):
+        """
+        Maps a pixel of a delivered frame to the sensor image.
+        Returns:
+            tuple: (x, y) in sensor pixels.
+        """
+        left, top, width, height = self.crop
+        return (left + x * width / self.process_width, top + y * height / self.process_height)
+
+def _convert(pixel_format):
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(f"Unsupported pixel format: {pixel_format}")
+    return f"videoconvert ! video/x-raw, format={pixel_format} ! "
+
+def _appsink(drop_frames, sync=False):
+    sink = f"appsink sync={'true' if sync else 'false'}"
+    if drop_frames:
+        # Keep only the newest frame; older ones are dropped inside GStreamer
+        sink += " max-buffers=1 drop=true"
+    return sink
+
+def create_gstreamer_pipeline(camera_index=0, width=1280, height=720, framerate=30, geometry=None, drop_frames=True,
+                              pixel_format='BGR'):
+    """
+    Creates a GStreamer pipeline string for capturing video from a V4L2 device.
+    Args:
+        geometry (FrameGeometry): Crop and processing size, or None for full frames.
+        drop_frames (bool): Let the appsink drop frames the application has not taken yet.
+        pixel_format (str): Format of the delivered frames, one of PIXEL_FORMATS.
+    """
+    return (
+        f"v4l2src device=/dev/video{camera_index} ! "
+        f"video/x-raw, width={width}, height={height}, framerate={framerate}/1 ! "
+        f"{geometry.gst_elements() if geometry else ''}"
+        f"{_convert(pixel_format)}"
+        f"{_appsink(drop_frames)}"
+    )
+
+def create_rtsp_pipeline(url, geometry=None, drop_frames=True, pixel_format='BGR'):
+    """
+    Creates a GStreamer pipeline string for capturing video from an RTSP stream.
+    This is based on the user-provided working pipeline.
+    Args:
+        geometry (FrameGeometry): Crop and processing size, or None for full frames.
+        drop_frames (bool): Let the appsink drop frames the application has not taken yet.
+        pixel_format (str): Format of the delivered frames, one of PIXEL_FORMATS.
+    """
+    return (
+        f"rtspsrc location={url} latency=41 udp-reconnect=1 timeout=0 do-retransmission=false ! "
+        f"application/x-rtp ! "
+        f"decodebin3 ! "
+        f"queue max-size-buffers=1 leaky=2 ! "
+        f"{geometry.gst_elements() if geometry else ''}"
+        f"{_convert(pixel_format)}"
+        f"{_appsink(drop_frames)}"
+    )
+
+def create_test_pipeline(source_file=None, width=1280, height=720, framerate=30, geometry=None, drop_frames=True,
+                         pixel_format='BGR'):
+    """
+    Creates a pipeline from a test source, to try the live mode without a camera.
+    Args:
+        source_file (str): Video file to play through filesrc, or None for a
+                           moving test pattern from videotestsrc.
+        geometry (FrameGeometry): Crop and processing size, or None for full frames.
+        drop_frames (bool): Let the appsink drop frames the application has not taken yet.
+        pixel_format (str): Format of the delivered frames, one of PIXEL_FORMATS.
+    """
+    if source_file:
+        source = (
+            f'filesrc location="{source_file}" ! decodebin ! videoconvert ! videoscale ! '
+            f"video/x-raw, width={width}, height={height} ! "
+        )
+    else:
+        source = (
+            "videotestsrc is-live=true pattern=ball ! "
+            f"video/x-raw, width={width}, height={height}, framerate={framerate}/1 ! "
+        )
+    return (
+        source
+        + (geometry.gst_elements() if geometry else "")
+        + _convert(pixel_format)
+        # A file is played at its own speed, like a camera would deliver it
+        + _appsink(drop_frames, sync=bool(source_file))
+    )
+
+def create_source_pipeline(source, width=1280, height=720, geometry=None, drop_frames=True, pixel_format='BGR'):
+    """
+    Creates the pipeline of a source given on the command line.
+    Args:
+        source (str): A camera index (e.g. '0'), an RTSP URL, 'videotestsrc' for
+                      a test pattern, or the path of a video file played in real time.
+        geometry (FrameGeometry): Crop and processing size, or None for full frames.
+        drop_frames (bool): Let the appsink drop frames the application has not taken yet.
+        pixel_format (str): Format of the delivered frames, one of PIXEL_FORMATS.
+    """
+    if source.isdigit():
+        return create_gstreamer_pipeline(int(source), width, height, geometry=geometry,
+                                         drop_frames=drop_frames, pixel_format=pixel_format)
+    if source.startswith(("rtsp://", "rtsps://")):
+        return create_rtsp_pipeline(source, geometry=geometry, drop_frames=drop_frames, pixel_format=pixel_format)
+    return create_test_pipeline(None if source == "videotestsrc" else source, width, height, geometry=geometry,
+                                drop_frames=drop_frames, pixel_format=pixel_format)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+Offline processing of recorded flight videos, faster than real time.
+
+The video is split into time chunks that are decoded and processed in
+parallel worker processes; each worker opens the file itself and seeks to
+the start of its chunk. Frames that are not sampled (see sample_fps) are
+only grabbed, not converted. The results of the chunks are collected in
+chunk order, so the detections reach the target aggregator and the writer
+in timestamp order.
+
+The timestamps of the records are the recording time of their frame,
+estimated as the file's modification time minus the video duration plus
+the frame's position.
+"""
+
+import os
+import sys
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import HOME_ALTITUDE, OFFLINE_CHUNK_SECONDS
+from gps.calculator import pixel_to_gps
+from gps.clustering import TargetAggregator
+from file_watcher.pool import init_pool_worker, worker_detector
+from metrics.registry import registry
+
+frames_done = registry.counter('detector_frames_total', "Video frames processed.")
+detections_found = registry.counter('detector_detections_total', "Shapes detected.", {'mode': 'offline'})
+
+def _process_chunk(path, start, end, step, base_time, fps, position):
+    """
+    Decodes and processes the frames [start, end) of a video. Runs in a worker process.
+    Args:
+        path (str): The video file.
+        start (int), end (int): Frame range; end None means until the end of the file.
+        step (int): Only frames whose index is a multiple of step are processed.
+        base_time (float): time.time() of the first frame.
+        fps (float): Frame rate of the video.
+        position (tuple): (latitude, longitude, flight_altitude) of the drone.
+    Returns:
+        tuple: (records, processed_frames)
+    """
+    shape_detector = worker_detector()
+    cap = cv2.VideoCapture(path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        # Some containers cannot seek; read up to the chunk instead
+        skip = start - int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if skip < 0:
+            cap.release()
+            cap = cv2.VideoCapture(path)
+            skip = start
+        for _ in range(skip):
+            cap.grab()
+
+    drone_lat, drone_lon, flight_altitude = position
+    name = os.path.basename(path)
+    records = []
+    processed = 0
+    index = start
+    frame = None
+    try:
+        while end is None or index < end:
+            if index % step:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+
+            # Decode into the previous frame's array
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            image_height, image_width, _ = frame.shape
+            detections = shape_detector.kirmizi_ucgenleri_bul(frame) + shape_detector.mavi_altigenleri_bul(frame)
+            processed += 1
+
+            timestamp = base_time + index / fps
+            for detection in detections:
+                center_x, center_y = detection['merkez']
+                latitude, longitude = pixel_to_gps(
+                    center_x, center_y, image_width, image_height,
+                    drone_lat, drone_lon, flight_altitude
+                )
+                records.append((timestamp, f"{name}#{index}", detection['sekil'], detection['renk'], latitude, longitude))
+            index += 1
+    finally:
+        cap.release()
+    return records, processed
+
+def plan_chunks(frame_count, fps, workers, chunk_seconds=OFFLINE_CHUNK_SECONDS):
+    """
+    Splits a video into frame ranges.
+    Args:
+        frame_count (int): Number of frames reported by the container (0 if unknown).
+        fps (float): Frame rate of the video.
+        workers (int): Number of worker processes.
+        chunk_seconds (float): Preferred length of a chunk.
+    Returns:
+        list: (start, end) frame ranges; the end of the last one is None, so
+              frames beyond an underestimated frame count are not lost.
+    """
+    if frame_count <= 0:
+        return [(0, None)]
+    chunk_frames = max(1, int(chunk_seconds * fps))
+    # At least two chunks per worker, so a slow chunk does not leave the others idle
+    chunk_frames = min(chunk_frames, max(1, math.ceil(frame_count / (workers * 2))))
+    starts = list(range(0, frame_count, chunk_frames))
+    return [(start, next_start) for start, next_start in zip(starts, starts[1:])] + [(starts[-1], None)]
+
+def process_video_file(path, writer, position, workers=1, sample_fps=None, chunk_seconds=OFFLINE_CHUNK_SECONDS,
+                       aggregate=True):
+    """
+    Processes a recorded video file and submits the detections in timestamp order.
+    Args:
+        path (str): The video file.
+        writer (DetectionWriter): The writer the detections are submitted to.
+        position (tuple): (latitude, longitude, altitude) of the drone; altitude
+                          above sea level like EXIF.
+        workers (int): Number of decode/detection processes.
+        sample_fps (float): Frames per second of video to process; None for every frame.
+        chunk_seconds (float): Preferred length of the chunks in seconds of video.
+        aggregate (bool): If True, only confirmed or refined targets are written
+                          (see gps.clustering); otherwise every detection.
+    Returns:
+        bool: False if the video could not be opened.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"[ERROR] Could not open video file: {path}")
+        return False
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    duration = frame_count / fps if frame_count > 0 else 0.0
+    base_time = os.path.getmtime(path) - duration
+    step = max(1, round(fps / sample_fps)) if sample_fps else 1
+    chunks = plan_chunks(frame_count, fps, workers, chunk_seconds)
+    drone_lat, drone_lon, drone_alt = position
+    telemetry = (drone_lat, drone_lon, drone_alt - HOME_ALTITUDE)
+
+    print(f"[INFO] {os.path.basename(path)}: {frame_count} frames at {fps:.2f} fps ({duration:.0f}s), "
+          f"processing 1 of every {step} frames in {len(chunks)} chunks with {workers} processes.")
+
+    aggregator = TargetAggregator() if aggregate else None
+    started = time.monotonic()
+    processed_total = 0
+    # The chunks keep every core busy, and each process decodes its frames one after another
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_pool_worker, initargs=(True, True)) as executor:
+        futures = [
+            executor.submit(_process_chunk, path, start, end, step, base_time, fps, telemetry)
+            for start, end in chunks
+        ]
+        # Chunks are consecutive, so collecting them in order keeps the records in timestamp order
+        for number, future in enumerate(futures, 1):
+            records, processed = future.result()
+            processed_total += processed
+            frames_done.inc(processed)
+            detections_found.inc(len(records))
+            detection_count = len(records)
+            if aggregator is not None:
+                records = aggregator.add(records)
+            if records:
+                writer.submit(records)
+            elapsed = time.monotonic() - started
+            print(f"[PROCESSING] Chunk {number}/{len(chunks)}: {processed} frames, {detection_count} detections, "
+                  f"{len(records)} rows ({elapsed:.1f}s elapsed)")
+
+    elapsed = time.monotonic() - started
+    speed = f", {duration / elapsed:.1f}x real time" if duration and elapsed else ""
+    print(f"[INFO] Video processed: {processed_total} frames in {elapsed:.1f}s{speed}.")
+    return True
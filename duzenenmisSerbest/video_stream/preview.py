@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+Preview outputs of the live video mode that run off the detection thread.
+
+Drawing, JPEG/MP4 encoding and network or disk I/O happen in each preview's
+own thread. The detection loop only hands over its latest frame with
+offer(), which never blocks: a frame that has not been picked up yet is
+simply replaced, so a slow client or disk makes the preview skip frames
+instead of stalling detection.
+
+- MjpegPreview:     Serves the annotated frames as an MJPEG stream over HTTP,
+                    viewable in any browser (http://<host>:<port>/).
+- RecordingPreview: Writes the annotated frames to an MP4 file.
+"""
+
+import os
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PREVIEW_MAX_FPS, PREVIEW_JPEG_QUALITY
+from metrics.registry import registry
+
+def visualize_results(frame, detections):
+    """
+    Draws the detected shapes onto the video frame.
+    """
+    if not detections:
+        return frame
+
+    for detection in detections:
+        center = detection['merkez']
+        color_str = detection['renk']
+        shape_str = detection['sekil']
+
+        draw_color = (255, 0, 0) if color_str == 'mavi' else (0, 0, 255)
+
+        cv2.circle(frame, center, 10, draw_color, 2)
+
+        text = f"{color_str.upper()} {shape_str.upper()}"
+        cv2.putText(frame, text, (center[0] - 40, center[1] - 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, draw_color, 2)
+
+    return frame
+
+class _PreviewSink:
+    """
+    Base class: a one-frame slot filled by the detection loop and emptied by
+    the preview thread at no more than max_fps.
+    """
+    name = None
+
+    def __init__(self, max_fps=PREVIEW_MAX_FPS):
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self._condition = threading.Condition()
+        self._item = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._skipped = registry.counter(
+            'detector_preview_frames_skipped_total',
+            "Frames not shown by a preview because it was busy or rate limited.",
+            {'preview': self.name}
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def offer(self, frame, detections):
+        """
+        Hands a frame and its detections to the preview without waiting.
+        The frame must not be modified in place by the caller afterwards.
+        """
+        with self._condition:
+            if self._item is not None:
+                self._skipped.inc()
+            self._item = (frame, detections)
+            self._condition.notify()
+
+    def _run(self):
+        next_time = 0.0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._item is not None or self._stopped)
+                if self._stopped:
+                    break
+                frame, detections = self._item
+                self._item = None
+
+            try:
+                # Draw on a copy: the frame is shared with the other previews and the window
+                self._emit(visualize_results(frame.copy(), detections))
+            except Exception as e:
+                print(f"[WARNING] {self.name} preview failed: {e}")
+
+            # Frames offered while waiting replace each other in the slot
+            next_time = max(next_time + self.interval, time.monotonic())
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self._finish()
+
+    def _emit(self, frame):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+    def close(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+
+class MjpegPreview(_PreviewSink):
+    """
+    Serves the annotated frames as multipart/x-mixed-replace JPEG stream.
+    Every frame is encoded once, however many clients are connected.
+    """
+    name = 'mjpeg'
+
+    def __init__(self, port, host="0.0.0.0", max_fps=PREVIEW_MAX_FPS, quality=PREVIEW_JPEG_QUALITY):
+        super().__init__(max_fps)
+        self.quality = quality
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._jpeg_condition = threading.Condition()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self.address = f"http://{host}:{port}/"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"[INFO] Live preview available at {self.address}")
+        return super().start()
+
+    def _emit(self, frame):
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._jpeg_condition:
+            self._jpeg = encoded.tobytes()
+            self._jpeg_seq += 1
+            self._jpeg_condition.notify_all()
+
+    def _next_jpeg(self, last_seq):
+        """Waits for a frame newer than last_seq; returns (seq, jpeg) or None when closed."""
+        with self._jpeg_condition:
+            self._jpeg_condition.wait_for(lambda: self._jpeg_seq > last_seq or self._stopped, timeout=5)
+            if self._stopped:
+                return None
+            return self._jpeg_seq, self._jpeg
+
+    def _make_handler(self):
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                last_seq = 0
+                try:
+                    while True:
+                        item = preview._next_jpeg(last_seq)
+                        if item is None:
+                            break
+                        seq, jpeg = item
+                        if seq == last_seq:
+                            continue  # No new frame within the timeout
+                        last_seq = seq
+                        self.wfile.write(
+                            b"--frame\r\nContent-Type: image/jpeg\r\n"
+                            + f"Content-Length: {len(jpeg)}\r\n\r\n".encode('ascii')
+                            + jpeg + b"\r\n"
+                        )
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def close(self):
+        super().close()
+        with self._jpeg_condition:
+            self._jpeg_condition.notify_all()
+        self._server.shutdown()
+
+class RecordingPreview(_PreviewSink):
+    """
+    Records the annotated frames to an MP4 file at max_fps.
+    Skipped frames are not filled in, so the recording runs faster than real
+    time when the preview could not keep up.
+    """
+    name = 'record'
+
+    def __init__(self, path, max_fps=PREVIEW_MAX_FPS):
+        super().__init__(max_fps)
+        self.path = path
+        self.fps = max_fps
+        self._writer = None
+        self._failed = False
+
+    def _emit(self, frame):
+        if self._failed:
+            return
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+            if not self._writer.isOpened():
+                self._failed = True
+                raise RuntimeError(f"Could not open {self.path} for writing")
+            print(f"[INFO] Recording annotated video to {self.path}")
+        self._writer.write(frame)
+
+    def _finish(self):
+        if self._writer is not None:
+            self._writer.release()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+Recording of live frames with their telemetry, and replay of such recordings.
+
+FrameRecorder writes every captured frame of a stream to a single file,
+together with its capture time and the drone telemetry at that moment.
+The frames are stored raw, as lossless PNG or as JPEG; encoding and disk
+I/O happen in the recorder's own thread, and frames are not recorded
+(and counted) rather than slowing down the capture when it falls behind.
+
+ReplayCapture reads such a file like a cv2.VideoCapture, so a recording can
+be fed back through the live mode, either at its original pace (to
+reproduce field conditions, including dropped frames and the governor's
+reactions) or as fast as possible, without dropping frames, to benchmark
+the detection deterministically.
+
+File layout: the MAGIC line, then one entry per frame, made of a 4-byte
+little-endian length, a JSON header of that length and the frame data:
+
+    {"t": capture time, "telemetry": [latitude, longitude, altitude],
+     "encoding": "raw" | "png" | "jpg", "shape": [...], "size": data bytes}
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import RECORD_ENCODING, RECORD_JPEG_QUALITY, RECORD_QUEUE_FRAMES
+from metrics.registry import registry
+
+MAGIC = b"FRAMEREC1\n"
+RECORD_ENCODINGS = ('raw', 'png', 'jpg')
+
+_LENGTH = struct.Struct("<I")
+
+class FrameRecorder:
+    """
+    Writes frames, capture times and telemetry to a recording file in a background thread.
+    """
+
+    def __init__(self, path, encoding=RECORD_ENCODING, telemetry=None, quality=RECORD_JPEG_QUALITY,
+                 max_queued=RECORD_QUEUE_FRAMES, stream="video"):
+        """
+        Args:
+            path (str): The recording file; overwritten if it exists.
+            encoding (str): 'raw', 'png' (lossless) or 'jpg'.
+            telemetry (callable): Returns the (latitude, longitude, altitude) of
+                                  the drone; called when a frame is added.
+            quality (int): JPEG quality.
+            max_queued (int): Frames waiting for encoding before new ones are not recorded.
+            stream (str): Label of the stream in the metrics.
+        """
+        if encoding not in RECORD_ENCODINGS:
+            raise ValueError(f"Unsupported recording encoding: {encoding}")
+        self.path = path
+        self.encoding = encoding
+        self.telemetry = telemetry
+        self.quality = quality
+        self.recorded = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._skipped = registry.counter(
+            'detector_recording_frames_skipped_total', "Frames not recorded because the recorder fell behind.",
+            {'stream': stream}
+        )
+
+    def start(self):
+        self._thread.start()
+        print(f"[INFO] Recording frames ({self.encoding}) to {self.path}")
+        return self
+
+    def add(self, timestamp, frame):
+        """
+        Queues a frame for recording without waiting. The frame must not be
+        modified by the caller afterwards.
+        """
+        telemetry = self.telemetry() if self.telemetry else None
+        try:
+            self._queue.put_nowait((timestamp, telemetry, frame))
+        except queue.Full:
+            self._skipped.inc()
+
+    def _encode(self, frame):
+        if self.encoding == 'raw':
+            return frame.tobytes()
+        if self.encoding == 'png':
+            ok, data = cv2.imencode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        else:
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise RuntimeError(f"Could not encode frame as {self.encoding}")
+        return data.tobytes()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            timestamp, telemetry, frame = item
+            try:
+                data = self._encode(frame)
+                header = json.dumps({
+                    "t": timestamp, "telemetry": telemetry, "encoding": self.encoding,
+                    "shape": list(frame.shape), "size": len(data)
+                }).encode("utf-8")
+                self._file.write(_LENGTH.pack(len(header)) + header)
+                self._file.write(data)
+                self.recorded += 1
+            except Exception as e:
+                print(f"[WARNING] Recording a frame to {self.path} failed: {e}")
+
+    def close(self):
+        """Writes the queued frames and closes the file."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        print(f"[INFO] Recorded {self.recorded} frames to {self.path}")
+
+class ReplayCapture:
+    """
+    Reads a recording like a cv2.VideoCapture.
+    After every read(), frame_info holds the recorded (capture time, telemetry)
+    of the frame.
+    """
+
+    def __init__(self, path, paced=True):
+        """
+        Args:
+            path (str): The recording file.
+            paced (bool): If True, frames are delivered at the pace they were
+                          recorded; otherwise as fast as they are taken, and the
+                          reader must not drop any (see lossless).
+        """
+        self.path = path
+        self.paced = paced
+        # Tells LatestFrameReader to wait until each frame was taken before reading the next
+        self.lossless = not paced
+        self.end_of_stream = False
+        self.frame_info = None
+        self._start = None  # (monotonic time, recorded time) of the first frame
+        self._file = None
+        try:
+            source = open(path, "rb")
+        except OSError as e:
+            print(f"[ERROR] Could not open recording {path}: {e}")
+            return
+        if source.read(len(MAGIC)) != MAGIC:
+            print(f"[ERROR] {path} is not a frame recording.")
+            source.close()
+            return
+        self._file = source
+
+    def isOpened(self):
+        return self._file is not None
+
+    def set(self, property_id, value):
+        return False
+
+    def read(self, image=None):
+        """
+        Args:
+            image (numpy.ndarray): Ignored; accepted like cv2.VideoCapture.read(image).
+        Returns:
+            tuple: (True, frame), or (False, None) at the end of the recording.
+        """
+        if self._file is None:
+            return False, None
+        length = self._file.read(_LENGTH.size)
+        if len(length) < _LENGTH.size:
+            self.end_of_stream = True
+            return False, None
+        header = json.loads(self._file.read(_LENGTH.unpack(length)[0]))
+        data = self._file.read(header["size"])
+        if len(data) < header["size"]:
+            # Recording cut off, e.g. by a crash
+            self.end_of_stream = True
+            return False, None
+
+        if header["encoding"] == 'raw':
+            frame = np.frombuffer(data, np.uint8).reshape(header["shape"]).copy()
+        else:
+            flags = cv2.IMREAD_COLOR if len(header["shape"]) == 3 else cv2.IMREAD_GRAYSCALE
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+        if self.paced:
+            now = time.monotonic()
+            if self._start is None:
+                self._start = (now, header["t"])
+            delay = self._start[0] + (header["t"] - self._start[1]) - now
+            if delay > 0:
+                time.sleep(delay)
+
+        telemetry = header.get("telemetry")
+        self.frame_info = (header["t"], tuple(telemetry) if telemetry else None)
+        return True, frame
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
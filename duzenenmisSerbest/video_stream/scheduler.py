@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fair scheduling of several live streams onto a shared pool of detection workers.
+
+Every stream has its own capture thread (LatestFrameReader), and all readers
+notify one shared condition. A free worker takes the newest frame of the
+next stream in round-robin order, so a camera with a higher frame rate
+cannot starve the others. A stream has at most one frame in work at a time:
+its frames are processed in order, and its detector, governor and metrics
+are never used by two workers at once. (The process detection of
+video_processor copies a frame into shared memory and marks it done right
+away, so that several frames of a stream can be in work there.)
+"""
+
+import threading
+import time
+
+class StreamScheduler:
+    """
+    Hands out the frames of several streams to the detection workers.
+    """
+
+    def __init__(self, streams):
+        """
+        Args:
+            streams (list): The streams; each has a 'reader' (LatestFrameReader
+                            created with this scheduler's condition) and a
+                            'governor' (FrameGovernor).
+        """
+        self.streams = list(streams)
+        self.condition = threading.Condition()
+        self._busy = set()
+        self._next = 0
+        self._stopped = False
+
+    def next_frame(self, timeout=None):
+        """
+        Waits for a frame of a stream that no other worker is working on.
+        Frames skipped by the stream's governor are consumed here.
+        Args:
+            timeout (float): Max. seconds to wait, None to wait until a frame arrives.
+        Returns:
+            tuple: (stream, seq, captured_at, frame, info) (see LatestFrameReader.read()),
+                   or None on timeout or after stop().
+                   done(stream) must be called once the frame is processed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while not self._stopped:
+                count = len(self.streams)
+                for offset in range(count):
+                    index = (self._next + offset) % count
+                    stream = self.streams[index]
+                    if index in self._busy:
+                        continue
+                    item = stream.reader.take()
+                    if item is None:
+                        continue
+                    seq, captured_at, frame, info = item
+                    if not stream.governor.should_process(seq, captured_at):
+                        continue
+                    self._busy.add(index)
+                    # The next search starts after this stream
+                    self._next = index + 1
+                    return stream, seq, captured_at, frame, info
+
+                if deadline is None:
+                    self.condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self.condition.wait(remaining)
+        return None
+
+    def done(self, stream):
+        """Marks the frame of a stream returned by next_frame() as processed."""
+        with self.condition:
+            self._busy.discard(self.streams.index(stream))
+            self.condition.notify_all()
+
+    def finished(self):
+        """
+        Returns:
+            bool: True if every stream has ended (e.g. a replay) and all its frames were processed.
+        """
+        with self.condition:
+            return not self._busy and all(
+                stream.reader.ended and not stream.reader.pending() for stream in self.streams
+            )
+
+    def stop(self):
+        """Wakes up all waiting workers; next_frame() returns None from now on."""
+        with self.condition:
+            self._stopped = True
+            self.condition.notify_all()
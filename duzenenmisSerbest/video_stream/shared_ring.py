@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ring of frame slots in shared memory, for detection in worker processes.
+
+Sending a frame to another process normally means pickling it: about 25 MB
+per 4K BGR frame, copied several times on the way. A SharedFrameRing is one
+multiprocessing.shared_memory block divided into equally sized frame slots.
+The capturing process writes a frame into a free slot and sends only the
+ring's name and the slot index; the worker process maps the same memory and
+detects on the slot as a numpy array, without copying it (attach_frame()).
+The slot is released by the capturing process once the worker's result has
+been collected, so it is never overwritten while a worker reads it.
+
+A worker keeps one mapping per owner (the stream the ring belongs to). When
+the owner's ring is replaced, e.g. because the source changed its
+resolution, the mapping of the old ring is closed as soon as a frame of the
+new one arrives; detach_all() closes the rest when the worker exits.
+"""
+
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+class SharedFrameRing:
+    """
+    Frame slots of one shape and dtype in a shared memory block, owned by the
+    process that created it.
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8):
+        """
+        Args:
+            slots (int): Number of frames the ring holds.
+            shape (tuple): Shape of the frames, e.g. (height, width, 3).
+            dtype: Element type of the frames.
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._memory = shared_memory.SharedMemory(create=True, size=slots * self.frame_bytes)
+        self.name = self._memory.name
+        self._arrays = [
+            np.ndarray(self.shape, self.dtype, buffer=self._memory.buf, offset=slot * self.frame_bytes)
+            for slot in range(slots)
+        ]
+        self.slots = slots
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+
+    def fits(self, frame):
+        """Returns True if the frame has the shape and dtype of the slots."""
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def acquire(self):
+        """
+        Returns:
+            int: Index of a free slot, now reserved for the caller; None if all are in use.
+        """
+        with self._lock:
+            return self._free.pop() if self._free else None
+
+    def release(self, slot):
+        """Makes a slot returned by acquire() available again."""
+        with self._lock:
+            self._free.append(slot)
+
+    def idle(self):
+        """Returns True if no slot is in use."""
+        with self._lock:
+            return len(self._free) == self.slots
+
+    def write(self, slot, frame):
+        """Copies a frame into a slot."""
+        np.copyto(self._arrays[slot], frame)
+
+    def array(self, slot):
+        """Returns the slot as a numpy array (no copy)."""
+        return self._arrays[slot]
+
+    def close(self):
+        """Frees the shared memory; the slots' arrays must not be used anymore."""
+        self._arrays = []
+        try:
+            self._memory.close()
+        except BufferError:
+            # A view of a slot is still referenced somewhere; the block is freed with the process
+            pass
+        self._memory.unlink()
+
+# Rings the current (worker) process has attached to: owner -> SharedMemory
+_attached = {}
+
+def _detach(memory):
+    try:
+        memory.close()
+    except BufferError:
+        # A frame of the ring is still referenced; the mapping is freed together with it
+        pass
+
+def attach_frame(name, slot, shape, dtype, owner=None):
+    """
+    Returns a slot of a SharedFrameRing created by another process, as a
+    numpy array (no copy). Runs in a worker process; the ring stays mapped
+    for the following frames of its owner.
+    Args:
+        name (str): SharedFrameRing.name.
+        slot (int): Index of the slot.
+        shape (tuple), dtype: Shape and dtype of the ring's frames.
+        owner: Who the ring belongs to, e.g. the stream name. A ring with another
+               name for the same owner replaces the mapped one, which is closed.
+               Default: the ring's name (never replaced).
+    """
+    key = name if owner is None else owner
+    memory = _attached.get(key)
+    if memory is None or memory.name != name:
+        if memory is not None:
+            _detach(memory)
+        memory = shared_memory.SharedMemory(name=name)
+        _attached[key] = memory
+    dtype = np.dtype(dtype)
+    frame_bytes = int(np.prod(shape)) * dtype.itemsize
+    return np.ndarray(shape, dtype, buffer=memory.buf, offset=slot * frame_bytes)
+
+def detach_all():
+    """Closes all mappings of attach_frame(), e.g. when the worker process exits."""
+    while _attached:
+        _detach(_attached.popitem()[1])
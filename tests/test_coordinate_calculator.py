@@ -0,0 +1,152 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The model frameworks (ultralytics, onnxruntime) and scipy are only imported when used
+import coordinate_calculator as cc
+
+
+# ==== TILE GRID ====
+
+@pytest.mark.parametrize("altitude, grid", [
+    (20, (2, 2)),     # Large objects: few big tiles
+    (50, (4, 5)),
+    (100, (8, 11)),
+    (300, (9, 12)),   # Tiles would be smaller than MIN_TILE_SIZE
+])
+def test_tile_grid_follows_the_ground_sample_distance(altitude, grid):
+    assert cc.tile_grid(4000, 3000, altitude) == grid
+
+
+def test_tile_grid_without_altitude(monkeypatch):
+    assert cc.tile_grid(4000, 3000, 0) == (cc.ROWS, cc.COLS)
+    monkeypatch.setattr(cc, "ADAPTIVE_TILING", False)
+    assert cc.tile_grid(4000, 3000, 50) == (cc.ROWS, cc.COLS)
+
+
+# ==== TILES ====
+
+@pytest.mark.parametrize("width, height, rows, cols", [
+    (4000, 3000, 8, 11),   # Not divisible: the last column takes the rest
+    (4000, 3000, 2, 2),
+    (1001, 777, 3, 7),
+    (640, 480, 1, 1),
+])
+def test_tiles_cover_the_whole_image(width, height, rows, cols):
+    covered = np.zeros((height, width), bool)
+    for _, _, x0, y0, x1, y1 in cc.make_tiles(width, height, rows, cols, 0.2):
+        assert 0 <= x0 < x1 <= width and 0 <= y0 < y1 <= height
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+
+
+def test_neighbouring_tiles_overlap():
+    tiles = {(row, col): (x0, y0, x1, y1) for row, col, x0, y0, x1, y1 in cc.make_tiles(1000, 600, 2, 4, 0.2)}
+    pad_x, pad_y = int(250 * 0.2 / 2), int(300 * 0.2 / 2)
+    for col in range(3):
+        assert tiles[(0, col)][2] - tiles[(0, col + 1)][0] == 2 * pad_x
+    assert tiles[(0, 0)][3] - tiles[(1, 0)][1] == 2 * pad_y
+
+
+def test_tiles_without_overlap_partition_the_image():
+    tiles = cc.make_tiles(1001, 777, 3, 7, 0)
+    assert sum((x1 - x0) * (y1 - y0) for _, _, x0, y0, x1, y1 in tiles) == 1001 * 777
+
+
+# ==== MERGING ====
+
+def test_object_cut_at_a_tile_edge_is_merged():
+    boxes = np.array([
+        [100, 100, 160, 150, 0.9, 0],   # Whole object, from one tile
+        [130, 100, 160, 150, 0.6, 0],   # Its right part, cut off at the edge of the neighbouring tile
+        [128, 102, 161, 149, 0.5, 0],   # The same object seen in the overlap of another tile
+    ])
+    assert cc.merge_boxes(boxes, cc.MERGE_THRESHOLD) == [0]
+
+
+def test_different_objects_are_kept():
+    boxes = np.array([
+        [100, 100, 160, 150, 0.9, 0],
+        [130, 100, 160, 150, 0.8, 2],   # Other class at the same place
+        [150, 100, 210, 150, 0.7, 0],   # Same class, overlapping less than the threshold
+        [900, 900, 950, 950, 0.95, 0],
+    ])
+    assert sorted(cc.merge_boxes(boxes, cc.MERGE_THRESHOLD)) == [0, 1, 2, 3]
+
+
+# ==== CASCADE ====
+
+def _cascade_image():
+    # 2x4 tiles of 200x200: a red square in tile (1, 2), a checkerboard in tile (0, 0)
+    img = np.zeros((400, 800, 3), np.uint8)
+    img[280:320, 480:520] = (0, 0, 255)
+    checker = (np.indices((200, 200)) // 16).sum(axis=0) % 2
+    img[:200, :200] = (checker * 255).astype(np.uint8)[:, :, None]
+    return img, cc.make_tiles(800, 400, 2, 4, 0)
+
+
+def test_cascade_selects_tiles_with_target_colors(monkeypatch):
+    monkeypatch.setattr(cc, "CASCADE_EDGE_SHARE", None)
+    img, tiles = _cascade_image()
+    assert [tile[:2] for tile in cc.select_tiles(img, tiles)] == [(1, 2)]
+
+
+def test_cascade_selects_tiles_with_edges(monkeypatch):
+    monkeypatch.setattr(cc, "CASCADE_EDGE_SHARE", 0.04)
+    img, tiles = _cascade_image()
+    assert [tile[:2] for tile in cc.select_tiles(img, tiles)] == [(0, 0), (1, 2)]
+
+
+# ==== ONNX POSTPROCESS ====
+
+def test_onnx_postprocess_maps_boxes_back_to_the_tile():
+    backend = object.__new__(cc.OnnxBackend)
+    # Two overlapping anchors of class 1 and one below the confidence threshold, as (4 + classes, anchors)
+    prediction = np.array([
+        [100, 102, 300],   # center x
+        [200, 200, 300],   # center y
+        [40, 40, 10],      # width
+        [20, 20, 10],      # height
+        [0.0, 0.1, 0.1],   # class 0
+        [0.9, 0.8, 0.2],   # class 1
+    ], np.float32)
+    # The tile was scaled by 0.5 and padded by 10 pixels at the top
+    boxes = backend.postprocess(prediction, (0.5, 0, 10))
+    assert boxes.shape == (1, 6)
+    np.testing.assert_allclose(boxes[0], [160, 360, 240, 400, 0.9, 1], rtol=1e-6)
+
+
+class _FixedBatchSession:
+    # Stands in for an ONNX Runtime session of a model exported with a fixed batch size
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.batches = []
+
+    def run(self, outputs, feed):
+        batch = feed["images"]
+        if batch.shape[0] != self.batch_size:
+            raise ValueError(f"Got batch of {batch.shape[0]}, expected {self.batch_size}")
+        self.batches.append(batch)
+        # No anchor above the confidence threshold
+        return [np.zeros((len(batch), 6, 10), np.float32)]
+
+
+@pytest.mark.parametrize("tiles", [1, 3, 4, 6])
+def test_onnx_predict_pads_batches_to_a_fixed_size(tiles):
+    backend = object.__new__(cc.OnnxBackend)
+    backend.session = _FixedBatchSession(4)
+    backend.input_name = "images"
+    backend.batch_size = 4
+    backend.input_size = (64, 64)
+    results = backend.predict([np.full((100, 80, 3), 255, np.uint8)] * tiles)
+    assert len(results) == tiles
+    assert len(backend.session.batches) == -(-tiles // 4)
+    # The last batch is filled up with blank tiles
+    filled = tiles % 4
+    if filled:
+        assert backend.session.batches[-1][:filled].any()
+        assert not backend.session.batches[-1][filled:].any()